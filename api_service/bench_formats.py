@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import numpy as np
+import pandas as pd
+
+# Payload size and serialization time of the timeseries response formats, on a
+# synthetic pivoted energy_flow result frame (as influx_reader returns it).
+#   python bench_formats.py --rows 1000 --rows 100000
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import encoding  # noqa: E402
+from bench_reader import clean_influx_data  # noqa: E402
+
+
+def make_frame(rows):
+    rng = np.random.default_rng(0)
+    t = pd.date_range("2026-01-01", periods=rows, freq="15min", tz="UTC")
+    return pd.DataFrame({
+        "_time": t,
+        "_measurement": "energy_flow", "source": "file_pv",
+        "pv_power_kw": rng.uniform(0, 10, rows).round(4),
+        "consumption_power_kw": rng.uniform(0.2, 2, rows).round(4),
+    })
+
+
+def legacy(df):
+    # What the endpoint did: one dict per row (record.values), cleaned per key, then JSON
+    records = df.to_dict("records")
+    return json.dumps([clean_influx_data(r) for r in records]).encode()
+
+
+def time_it(fn, runs):
+    fn()
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare timeseries response formats")
+    parser.add_argument("--rows", type=int, action="append", help="Rows per response (repeatable)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    candidates = [("records (legacy)", legacy)]
+    candidates += [(media_type, media_type) for media_type in encoding.available_formats()]
+
+    for rows in args.rows or [1000, 100000]:
+        df = make_frame(rows)
+        print(f"\n{rows} rows")
+        print(f"{'format':<40}{'encode ms':>10}{'bytes':>11}{'gzip':>10}{'br':>10}{'gzip ms':>9}")
+        for name, target in candidates:
+            if target is legacy:
+                fn = lambda: legacy(df)
+            else:
+                fn = lambda target=target: encoding.encode_frame(df, target)
+            ms, body = time_it(fn, args.runs)
+            gz_ms, (gz, _) = time_it(lambda: encoding.compress(body, "gzip"), args.runs)
+            br = encoding.compress(body, "br")[0] if encoding.brotli is not None else b""
+            print(f"{name:<40}{ms:>10.2f}{len(body):>11}{len(gz):>10}{len(br) or '-':>10}{gz_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import argparse
+import statistics
+import aiohttp
+
+# Load test for a running api_service: N concurrent "dashboards" hitting the data
+# endpoints. Reports p50/p99 latency and throughput per endpoint.
+# Run it against the stack before and after a change to compare, e.g.
+#   python bench_load.py --username admin --password password123 --concurrency 50
+
+DEFAULT_ENDPOINTS = ["/data/current_status", "/data/flow/timeseries", "/data/soc/timeseries"]
+
+
+async def get_token(session, auth_url, username, password):
+    async with session.post(f"{auth_url}/token", data={"username": username, "password": password}) as r:
+        r.raise_for_status()
+        return (await r.json())["access_token"]
+
+
+async def worker(session, url, headers, endpoints, requests_per_worker, latencies, errors):
+    for i in range(requests_per_worker):
+        endpoint = endpoints[i % len(endpoints)]
+        t0 = time.perf_counter()
+        try:
+            async with session.get(f"{url}{endpoint}", headers=headers) as r:
+                await r.read()
+                if r.status != 200:
+                    errors[endpoint] = errors.get(endpoint, 0) + 1
+                    continue
+        except aiohttp.ClientError:
+            errors[endpoint] = errors.get(endpoint, 0) + 1
+            continue
+        latencies.setdefault(endpoint, []).append((time.perf_counter() - t0) * 1000)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for api_service")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--auth-url", default="http://localhost:8003")
+    parser.add_argument("--token", help="JWT to use instead of logging in")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=30, help="Requests per concurrent client")
+    parser.add_argument("--endpoint", action="append", dest="endpoints", help="Endpoint path (repeatable)")
+    args = parser.parse_args()
+    endpoints = args.endpoints or DEFAULT_ENDPOINTS
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = args.token or await get_token(session, args.auth_url, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies, errors = {}, {}
+        t0 = time.perf_counter()
+        await asyncio.gather(*[
+            worker(session, args.url, headers, endpoints, args.requests, latencies, errors)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - t0
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{args.concurrency} clients x {args.requests} requests in {elapsed:.2f}s -> {total / elapsed:.1f} req/s")
+    for endpoint in endpoints:
+        values = latencies.get(endpoint, [])
+        if not values:
+            print(f"{endpoint:<28} no successful requests ({errors.get(endpoint, 0)} errors)")
+            continue
+        print(f"{endpoint:<28} n={len(values):<5} p50 {statistics.median(values):8.2f} ms  "
+              f"p99 {percentile(values, 99):8.2f} ms  errors {errors.get(endpoint, 0)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from influxdb_client.client.flux_csv_parser import FluxCsvParser, FluxSerializationMode
+
+# Time and peak memory of turning a pivoted energy_flow query result (annotated
+# CSV, as InfluxDB sends it) into the API response, old record path vs frame path.
+# Uses the client's own CSV parser on a generated response, no InfluxDB needed.
+#   python bench_reader.py --rows 10000 --rows 100000
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoding  # noqa: E402
+from common.storage import read_annotated_csv  # noqa: E402
+
+HEADER = [
+    "#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,string,string,double,double",
+    "#group,false,false,true,true,false,true,true,false,false",
+    "#default,_result,,,,,,,,",
+    ",result,table,_start,_stop,_time,_measurement,source,consumption_power_kw,pv_power_kw",
+]
+
+
+def csv_lines(rows, annotations=3):
+    """Annotated CSV lines as InfluxDB sends them (the reader asks for the datatype annotation only)."""
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    start, stop = t0.strftime("%Y-%m-%dT%H:%M:%SZ"), (t0 + timedelta(minutes=15 * rows)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    for line in HEADER[:annotations] + HEADER[3:]:
+        yield line + "\r\n"
+    for i in range(rows):
+        t = (t0 + timedelta(minutes=15 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        yield f",,0,{start},{stop},{t},energy_flow,file_pv,{0.5 + i % 7 * 0.1:.3f},{i % 11 * 0.7:.3f}\r\n"
+
+
+class FakeResponse:
+    """Streams prepared annotated CSV lines like urllib3's HTTPResponse."""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+
+def clean_influx_data(record):
+    # The per-record cleanup the endpoints used to run
+    clean = {}
+    for k, v in record.items():
+        if not k.startswith("_") and k not in ["result", "table"]:
+            clean[k] = v
+        elif k == "_time":
+            clean["timestamp"] = v.isoformat() if hasattr(v, 'isoformat') else v
+    return clean
+
+
+def records_path(data):
+    parser = FluxCsvParser(response=FakeResponse(data["lines"]), serialization_mode=FluxSerializationMode.tables)
+    list(parser.generator())
+    results = []
+    for table in parser.tables:
+        for record in table.records:
+            results.append(record.values)
+    return encoding._json_bytes([clean_influx_data(r) for r in results])
+
+
+def client_frame_path(data):
+    # The client's own DataFrame mode, for comparison (still parses row by row)
+    parser = FluxCsvParser(response=FakeResponse(data["lines"]), serialization_mode=FluxSerializationMode.dataFrame)
+    return encoding.encode_frame(next(parser.generator()), encoding.JSON)
+
+
+def frame_path(data, media_type=encoding.JSON):
+    # query_raw returns the whole body as one str
+    text = data["raw"].decode()
+    return encoding.encode_frame(read_annotated_csv(text), media_type)
+
+
+def columns_path(data):
+    return frame_path(data, encoding.COLUMNS_JSON)
+
+
+def measure(fn, data):
+    # Peak includes the response body as the client holds it (records: streamed lines, frame: one str)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    body = fn(data)
+    ms = (time.perf_counter() - t0) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms, peak, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the record and DataFrame query paths")
+    parser.add_argument("--rows", type=int, action="append", help="Rows per result (repeatable)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'path':<10}{'ms':>10}{'peak MB':>10}{'bytes/row':>11}")
+    for rows in args.rows or [1000, 10000, 100000]:
+        data = {"lines": [line.encode() for line in csv_lines(rows)],
+                "raw": "".join(csv_lines(rows, annotations=1)).encode()}
+        bodies = {}
+        for name, fn in (("records", records_path), ("client df", client_frame_path),
+                         ("frame", frame_path), ("columns", columns_path)):
+            ms, peak, bodies[name] = measure(fn, data)
+            print(f"{rows:>8}  {name:<10}{ms:>10.1f}{peak / 1e6:>10.1f}{peak / rows:>11.0f}")
+        if not bodies["records"] == bodies["client df"] == bodies["frame"]:
+            print("  record responses differ!")
+
+
+if __name__ == "__main__":
+    main()
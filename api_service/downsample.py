@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def lttb_indices(x, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the
+    visual shape of the series. x is 1-D, ys is (n,) or (n, k); with several
+    columns the triangle areas of the (range-normalized) columns are added up,
+    so a peak in any of them is kept. First and last point are always kept.
+    """
+    x = np.asarray(x, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    if ys.ndim == 1:
+        ys = ys[:, None]
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=int)
+
+    # Normalize so columns with large values do not dominate; gaps count as 0
+    span = np.nanmax(ys, axis=0) - np.nanmin(ys, axis=0)
+    ys = np.nan_to_num((ys - np.nanmin(ys, axis=0)) / np.where(span > 0, span, 1.0))
+
+    # Bucket edges for the n-2 inner points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle corner
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), ys[nlo:nhi].mean(axis=0)
+        bx, by = x[lo:hi], ys[lo:hi]
+        area = np.abs((x[a] - cx) * (by - ys[a]) - (x[a] - bx)[:, None] * (cy - ys[a])).sum(axis=1)
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_frame(df, max_points, fields=None):
+    """Reduces a pivoted result frame (sorted by _time) to at most max_points rows with LTTB."""
+    if not max_points or len(df) <= max_points:
+        return df
+    fields = list(fields) if fields else [c for c in df.columns if not c.startswith("_")
+                                          and c not in ("result", "table") and df[c].dtype.kind in "fiu"]
+    x = df["_time"].to_numpy("datetime64[ns]").astype("int64") / 1e9
+    ys = df[fields].to_numpy(dtype=float) if fields else np.zeros(len(df))
+    return df.iloc[lttb_indices(x, ys, max_points)]
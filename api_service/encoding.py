@@ -0,0 +1,185 @@
+import os
+import io
+import json
+import gzip
+import importlib.util
+import numpy as np
+from fastapi import Response
+
+# Optional encoders, each format is offered only if its package is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+# pyarrow takes ~60 ms to import, so it is only loaded for the first Arrow response
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"                          # list of records (original format)
+COLUMNS_JSON = "application/vnd.hems.columns+json"  # {"timestamps": [...], field: [...]}
+MSGPACK = "application/x-msgpack"                  # same columns, MessagePack encoded
+ARROW = "application/vnd.apache.arrow.stream"      # Arrow IPC stream, one record batch
+
+# Other names clients use for MessagePack in Accept
+MEDIA_ALIASES = {"application/msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+# ?format= shortcuts for clients that cannot set Accept (browsers, curl one-liners)
+FORMAT_ALIASES = {"records": JSON, "json": JSON, "columns": COLUMNS_JSON, "msgpack": MSGPACK, "arrow": ARROW}
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+# Influx bookkeeping columns that are not part of the data
+META_COLUMNS = {"result", "table"}
+
+
+class NotAcceptable(ValueError):
+    pass
+
+
+def available_formats():
+    formats = [JSON, COLUMNS_JSON]
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    if HAS_ARROW:
+        formats.append(ARROW)
+    return formats
+
+
+def _parse_header(value):
+    """[(token, q)] of an Accept / Accept-Encoding header, highest q first."""
+    items = []
+    for part in (value or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        items.append((token.strip().lower(), q))
+    return sorted(items, key=lambda i: -i[1])
+
+
+def negotiate(accept=None, fmt=None):
+    """Media type for a response: explicit ?format= wins, then the Accept header, default JSON records."""
+    formats = available_formats()
+    if fmt:
+        media_type = FORMAT_ALIASES.get(fmt.lower())
+        if media_type not in formats:
+            raise NotAcceptable(f"Unsupported format '{fmt}', available: {sorted(k for k, v in FORMAT_ALIASES.items() if v in formats)}")
+        return media_type
+    accepted = _parse_header(accept)
+    if not accepted:
+        return JSON
+    for token, q in accepted:
+        if q <= 0:
+            continue
+        token = MEDIA_ALIASES.get(token, token)
+        if token in formats:
+            return token
+        if token in ("*/*", "application/*"):
+            return JSON
+    raise NotAcceptable(f"None of the requested types is available: {formats}")
+
+
+def data_columns(df):
+    return [c for c in df.columns if not c.startswith("_") and c not in META_COLUMNS]
+
+
+def frame_to_columns(df):
+    """Column dict straight from a pivoted Influx frame: epoch-ms timestamps plus one list per column."""
+    columns = {"timestamps": df["_time"].to_numpy("datetime64[ms]").astype("int64").tolist() if len(df) else []}
+    for name in data_columns(df):
+        col = df[name]
+        if col.dtype.kind == "f":
+            values = col.to_numpy()
+            # NaN is not valid JSON; gaps become null
+            columns[name] = np.where(np.isnan(values), None, values).tolist() if np.isnan(values).any() else values.tolist()
+        else:
+            columns[name] = col.astype(object).where(col.notna(), None).tolist()
+    return columns
+
+
+def iter_rows(df):
+    """
+    Rows of a result frame as JSON-ready dicts, generated lazily: _time becomes an
+    ISO "timestamp", other internal columns are left out, NaN becomes None.
+    """
+    if df is None or not len(df):
+        return
+    names = ["timestamp"]
+    times = np.datetime_as_string(df["_time"].dt.tz_convert("UTC").to_numpy("datetime64[s]"), unit="s")
+    columns = [[t + "+00:00" for t in times.tolist()]]
+    for name in data_columns(df):
+        col = df[name]
+        names.append(name)
+        columns.append(col.astype(object).where(col.notna(), None).to_numpy())
+    for values in zip(*columns):
+        yield dict(zip(names, values))
+
+
+def first_row(df):
+    return next(iter_rows(df), {})
+
+
+def _json_bytes(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def frame_to_arrow(df):
+    import pyarrow as pa
+    arrays = {"timestamp": pa.array(df["_time"].to_numpy("datetime64[ms]"), pa.timestamp("ms", tz="UTC"))}
+    for name in data_columns(df):
+        arrays[name] = pa.array(df[name].to_numpy(), from_pandas=True)
+    table = pa.table(arrays)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_frame(df, media_type):
+    """Serializes a pivoted frame as records (JSON) or in one of the columnar formats."""
+    if media_type == JSON:
+        return _json_bytes(list(iter_rows(df)))
+    if media_type == ARROW:
+        return frame_to_arrow(df)
+    columns = frame_to_columns(df)
+    if media_type == MSGPACK:
+        return msgpack.packb(columns)
+    return _json_bytes(columns)
+
+
+def compress(body, accept_encoding):
+    """(body, content-encoding) using the best accepted encoding: br, then gzip."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = {token: q for token, q in _parse_header(accept_encoding) if q > 0}
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def encoded_response(body, media_type, accept_encoding=None):
+    body, encoding = compress(body, accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,61 +1,255 @@
 import os
-from influxdb_client import InfluxDBClient
-
-# Configuration
-INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN", "my-super-secret-auth-token")
-INFLUX_ORG = os.getenv("INFLUX_ORG", "myorg")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "hems_data")
-
-client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-query_api = client.query_api()
-
-def get_latest_status():
-    query = f'''
-    from(bucket: "{INFLUX_BUCKET}")
-      |> range(start: -1h)
-      |> filter(fn: (r) => r["_measurement"] == "energy_flow")
-      |> last()
-      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-    '''
-    result = query_api.query(org=INFLUX_ORG, query=query)
-    results = []
-    for table in result:
-        for record in table.records:
-            results.append(record.values)
-    return results[0] if results else {}
-
-def get_flow_timeseries(range_start="-24h"):
-    query = f'''
-    from(bucket: "{INFLUX_BUCKET}")
-      |> range(start: {range_start})
-      |> filter(fn: (r) => r["_measurement"] == "energy_flow")
-      |> aggregateWindow(every: 15m, fn: mean, createEmpty: false)
-      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-      |> sort(columns: ["_time"])
-    '''
-    result = query_api.query(org=INFLUX_ORG, query=query)
-    results = []
-    for table in result:
-        for record in table.records:
-            results.append(record.values)
-    return results
-
-def get_soc_forecast(range_start="-1h", range_stop="24h"):
-    # Read forecast_soc
-    # Forecasts are in future, so range logic is tricky with Flux if we use relative start.
-    # Usually we query start: now(), stop: now() + 24h
-    # But Flux range requires start.
-    query = f'''
-    from(bucket: "{INFLUX_BUCKET}")
-      |> range(start: {range_start}) 
-      |> filter(fn: (r) => r["_measurement"] == "forecast_soc")
-      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-      |> sort(columns: ["_time"])
-    '''
-    result = query_api.query(org=INFLUX_ORG, query=query)
-    results = []
-    for table in result:
-        for record in table.records:
-            results.append(record.values)
-    return results
+import re
+import math
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from functools import wraps
+from common.storage import make_storage, empty_frame, merge_series, merge_last
+from downsample import downsample_frame
+
+# InfluxDB (async client, one shared connection pool) or the embedded SQLite store
+storage = make_storage()
+
+
+async def close_client():
+    await storage.aclose()
+
+# Cache settings
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 60))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 256))
+# Relative ranges ("-24h") move with the clock, keys roll over every bucket
+CACHE_BUCKET_SECONDS = int(os.getenv("CACHE_BUCKET_SECONDS", 60))
+
+
+class QueryCache:
+    """
+    In-process LRU cache for query results with TTL and single-flight loading:
+    concurrent misses on the same key run the query once and share the result.
+    Entries remember their measurement so writers can invalidate them; a load
+    that was running during an invalidation is not stored, and later callers do
+    not wait for it.
+    Used from the event loop only, so no locking is needed.
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, measurement, value)
+        self._inflight = {}             # key -> (asyncio.Future, measurement)
+        self._generations = {}          # measurement -> invalidation count (None: all)
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    async def get_or_load(self, key, measurement, loader):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[2]
+
+        inflight = self._inflight.get(key, (None,))[0]
+        if inflight is not None:
+            # Someone else is already loading this key
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The loading request was cancelled, not us: load ourselves
+                return await self.get_or_load(key, measurement, loader)
+
+        self._stats["misses"] += 1
+        generation = self._generation(measurement)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, measurement)
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved, waiters (if any) get the error re-raised
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+
+        # Invalidated while loading: the result may predate the write
+        if self._generation(measurement) == generation:
+            self._entries[key] = (time.monotonic() + self.ttl, measurement, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        future.set_result(value)
+        return value
+
+    def _generation(self, measurement):
+        return self._generations.get(None, 0), self._generations.get(measurement, 0)
+
+    def invalidate(self, measurements=None):
+        """Drops entries of the given measurements (all entries if None). Returns the count."""
+        if measurements is None:
+            keys = list(self._entries)
+            loading = list(self._inflight)
+            self._generations[None] = self._generations.get(None, 0) + 1
+        else:
+            measurements = set(measurements)
+            keys = [k for k, e in self._entries.items() if e[1] in measurements]
+            loading = [k for k, (_, m) in self._inflight.items() if m in measurements]
+            for m in measurements:
+                self._generations[m] = self._generations.get(m, 0) + 1
+        for k in keys:
+            del self._entries[k]
+        # Callers from now on start a fresh load instead of joining one that may miss the write
+        for k in loading:
+            del self._inflight[k]
+        self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def stats(self):
+        s = dict(self._stats)
+        s["entries"] = len(self._entries)
+        lookups = s["hits"] + s["misses"] + s["coalesced"]
+        s["hit_rate"] = round((s["hits"] + s["coalesced"]) / lookups, 4) if lookups else 0.0
+        return s
+
+
+cache = QueryCache()
+
+
+def cached(measurement):
+    """Caches an async reader function per arguments and time bucket."""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            bucket = int(time.time() // CACHE_BUCKET_SECONDS)
+            key = (func.__name__, args, tuple(sorted(kwargs.items())), bucket)
+            return await cache.get_or_load(key, measurement, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+@cached("energy_flow")
+async def get_latest_status():
+    """Newest value of every energy_flow field of the past hour as a one-row frame (empty if none)."""
+    df = await storage.call("last", "energy_flow", datetime.now(timezone.utc) - timedelta(hours=1))
+    # last() runs per series (one per source, each with its own fields); combine them
+    return merge_last(df)
+
+# Downsampled energy_flow kept up to date by the ingest service: (measurement, window seconds)
+FLOW_TIERS = [("energy_flow_15m", 15 * 60), ("energy_flow_1h", 3600), ("energy_flow_1d", 86400)]
+# Shorter ranges are read from raw data, which is fresher than the tiers
+FLOW_RAW_MAX_SECONDS = int(os.getenv("FLOW_RAW_MAX_HOURS", 48)) * 3600
+# Default chart width in points; the window grows so a range never returns more
+FLOW_MAX_POINTS = int(os.getenv("FLOW_MAX_POINTS", 1000))
+FLOW_MIN_WINDOW_SECONDS = 15 * 60
+# Plan shown as the SoC forecast (algorithm tag of forecast_soc)
+SOC_FORECAST_ALGORITHM = os.getenv("SOC_FORECAST_ALGORITHM", "simple_heuristic")
+
+_DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600, "d": 86400,
+                   "w": 7 * 86400, "mo": 30 * 86400, "y": 365 * 86400}
+
+
+def parse_time(value):
+    """Absolute time of a Flux range bound: relative duration ("-24h"), RFC3339 or now()."""
+    now = datetime.now(timezone.utc)
+    if value is None or value == "now()":
+        return now
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    parts = re.findall(r"(\d+)(ns|us|ms|mo|s|m|h|d|w|y)", value)
+    if parts and value.lstrip("-") == "".join(n + u for n, u in parts):
+        seconds = sum(int(n) * _DURATION_UNITS[u] for n, u in parts)
+        return datetime.fromtimestamp(now.timestamp() + (-seconds if value.startswith("-") else seconds), timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def plan_flow_query(range_seconds, max_points=FLOW_MAX_POINTS, tiers=True):
+    """
+    (measurement, tier window, output window) for a flow chart over range_seconds:
+    at most max_points windows, never finer than 15 minutes, read from the
+    coarsest rollup tier that still resolves the window (raw data without tiers).
+    """
+    window = max(FLOW_MIN_WINDOW_SECONDS, math.ceil(range_seconds / max(1, max_points)))
+    if range_seconds <= FLOW_RAW_MAX_SECONDS or not tiers:
+        return "energy_flow", None, math.ceil(window / 60) * 60
+    measurement, step = FLOW_TIERS[0]
+    for name, every in FLOW_TIERS:
+        if every <= window:
+            measurement, step = name, every
+    return measurement, step, math.ceil(window / step) * step
+
+
+async def _series(measurement, range_start, range_stop, fields=None, every=None, shift=None, max_points=None,
+                  merge=False, tags=None):
+    start, stop = parse_time(range_start), parse_time(range_stop)
+    fields = list(fields) if fields else None
+    if every:
+        # Tier points carry their window's end time; shift back so windows regroup correctly
+        df = await storage.call("aggregate", measurement, start, stop, every=timedelta(seconds=every), fields=fields,
+                                shift=timedelta(seconds=-shift) if shift else None, tags=tags)
+    else:
+        df = await storage.call("query_range", measurement, start, stop, fields=fields, tags=tags)
+    if merge:
+        # One row per time, so charts and LTTB see complete rows instead of one source at a time
+        df = merge_series(df)
+    # Hard cap on the response size, whatever the data density
+    return downsample_frame(df, max_points, fields)
+
+
+def _flow_plan(range_start, range_stop, max_points):
+    """Source measurement, bounds and window/shift for a flow query (see plan_flow_query)."""
+    start, stop = parse_time(range_start), parse_time(range_stop)
+    measurement, step, window = plan_flow_query((stop - start).total_seconds(), max_points, storage.has_rollups)
+    if step is None:
+        return dict(measurement=measurement, range_start=start, range_stop=stop, every=window)
+    if window == step:
+        # Tier already has the requested resolution
+        return dict(measurement=measurement, range_start=start, range_stop=stop)
+    return dict(measurement=measurement, range_start=start, range_stop=stop, every=window, shift=step)
+
+
+@cached("energy_flow")
+async def get_flow_timeseries(range_start="-24h", range_stop=None, fields=None, max_points=FLOW_MAX_POINTS):
+    """energy_flow in windows chosen for max_points (see plan_flow_query), fields as a tuple."""
+    return await _series(fields=fields, max_points=max_points, merge=True,
+                         **_flow_plan(range_start, range_stop, max_points))
+
+@cached("forecast_soc")
+async def get_soc_forecast(range_start="-1h", range_stop="24h", fields=None, max_points=None,
+                           algorithm=SOC_FORECAST_ALGORITHM, site=None):
+    # Forecasts lie in the future, so the range runs from just before now to the horizon.
+    # forecast_soc holds every algorithm's plan and one per fleet site; read one of them
+    return await _series("forecast_soc", range_start, range_stop, fields, max_points=max_points,
+                         tags={"algorithm": algorithm, "site": site})
+
+@cached("weather")
+async def get_weather_series(range_start="-24h", range_stop="24h"):
+    # Hourly irradiance/temperature written by the ingest service (incl. forecast hours)
+    return await _series("weather", range_start, range_stop)
+
+async def get_dashboard_data():
+    """
+    Status, flow and SoC forecast frames queried concurrently over the shared connection
+    pool. A failing query leaves its part empty and is listed under "errors".
+    """
+    parts = {"status": empty_frame(), "flow": empty_frame(), "soc": empty_frame()}
+    results = await asyncio.gather(
+        get_latest_status(),
+        get_flow_timeseries(range_start="-24h"),
+        get_soc_forecast(range_start="-1h"),
+        return_exceptions=True,
+    )
+    errors = []
+    for name, result in zip(list(parts), results):
+        if isinstance(result, Exception):
+            errors.append(f"{name}: {result}")
+        else:
+            parts[name] = result
+    parts["errors"] = errors
+    return parts
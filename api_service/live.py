@@ -0,0 +1,97 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timedelta, timezone
+from influx_reader import get_latest_status, get_flow_timeseries, get_soc_forecast
+from encoding import iter_rows, first_row
+
+# Events buffered per client before it is told to resync
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 50))
+# Seconds between keep-alive comments on an idle stream
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 20))
+# Flow deltas restart at the last pushed window so a still-filling window is resent
+FLOW_WINDOW = timedelta(minutes=15)
+
+
+class LiveBroadcaster:
+    """
+    Pushes changes to connected dashboards. Writers report changed measurements
+    via notify(); the broadcaster then runs one query per change (not per client)
+    and fans the result out. Without subscribers nothing is queried at all.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._pending = set()
+        self._task = None
+        self._flow_since = None
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self._flow_since = None
+
+    def notify(self, measurements):
+        if not self._subscribers:
+            return
+        self._pending |= set(measurements)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh())
+
+    def _publish(self, event):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog, it reloads the full snapshot instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def _refresh(self):
+        # Changes arriving while a refresh runs are merged into the next round
+        while self._pending and self._subscribers:
+            measurements, self._pending = self._pending, set()
+            try:
+                if "energy_flow" in measurements:
+                    await self._push_flow()
+                if "forecast_soc" in measurements:
+                    soc = await get_soc_forecast(range_start="-1h")
+                    self._publish({"type": "soc", "data": list(iter_rows(soc))})
+            except Exception as e:
+                print(f"Live update failed: {e}")
+
+    async def _push_flow(self):
+        now = datetime.now(timezone.utc)
+        since = self._flow_since or now - timedelta(hours=1)
+        start = since.strftime("%Y-%m-%dT%H:%M:%SZ")
+        flow, status = await asyncio.gather(get_flow_timeseries(range_start=start), get_latest_status())
+        if len(flow):
+            self._flow_since = flow["_time"].iloc[-1].to_pydatetime() - FLOW_WINDOW
+        self._publish({"type": "flow", "data": list(iter_rows(flow)), "status": first_row(status)})
+
+    async def stream(self, request):
+        """Server-sent events for one client (unnamed events, JSON with a "type" field)."""
+        queue = self.subscribe()
+        try:
+            yield f"data: {json.dumps({'type': 'hello'})}\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self.unsubscribe(queue)
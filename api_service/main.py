@@ -1,100 +1,188 @@
 import os
-import requests
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from influx_reader import get_latest_status, get_flow_timeseries, get_soc_forecast
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+from typing import Annotated
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from influx_reader import (get_latest_status, get_flow_timeseries, get_soc_forecast, get_dashboard_data,
+                           cache, close_client, parse_time, storage, FLOW_MAX_POINTS, SOC_FORECAST_ALGORITHM)
+import encoding
+from encoding import iter_rows, first_row
+from live import LiveBroadcaster
+from weather import WeatherService, make_provider
+from common.health import Readiness
+from common.security import verify_token, verify_cache_invalidate, decode_username, verifier
 
-app = FastAPI()
+# Browsers open the live stream directly, so the dashboard origin must be allowed
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "http://localhost:8050").split(",") if o.strip()]
 
-# Security
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
-ALGORITHM = "HS256"
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://localhost:8003/token")
+weather = WeatherService(make_provider())
 
-def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    return username
+async def storage_ready():
+    return await storage.call("ping")
+
+readiness = Readiness("api_service")
+readiness.check("storage", storage_ready)
+
+def import_frame_libs():
+    # Loaded on first use otherwise, which would land on the first dashboard request
+    for name in ("pandas", "pyarrow") if encoding.HAS_ARROW else ("pandas",):
+        importlib.import_module(name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.warm_up("frame_libs", import_frame_libs)
+    weather.start()
+
+    yield
+
+    await weather.stop()
+    await close_client()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["GET"], allow_headers=["Authorization"])
+
+@app.get("/health/live")
+async def liveness():
+    return readiness.live()
+
+@app.get("/health/ready")
+async def readiness_probe():
+    ready, details = await readiness.ready()
+    return JSONResponse(details, status_code=200 if ready else 503)
 
 @app.get("/data/current_status", dependencies=[Depends(verify_token)])
-def current_status():
-    data = get_latest_status()
-    # Serialize InfluxDB record to JSON
-    # Flux returns dictionary with keys including '_time', 'consumption_power_kw', 'pv_power_kw'
-    return clean_influx_data(data)
+async def current_status():
+    # One-row frame with '_time', 'consumption_power_kw', 'pv_power_kw', ...
+    return first_row(await get_latest_status())
+
+def check_range(start, stop):
+    """Validates start/stop (relative durations like -7d or RFC3339 times) and returns them unchanged."""
+    try:
+        if parse_time(start) >= parse_time(stop):
+            raise ValueError("start must be before stop")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid time range: {e}")
+    return start, stop
+
+def negotiate_format(request: Request, fmt: str | None):
+    try:
+        return encoding.negotiate(request.headers.get("accept"), fmt)
+    except encoding.NotAcceptable as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
 
 @app.get("/data/flow/timeseries", dependencies=[Depends(verify_token)])
-def flow_timeseries():
-    data = get_flow_timeseries(range_start="-24h")
-    return [clean_influx_data(record) for record in data]
+async def flow_timeseries(
+    request: Request,
+    start: str = "-24h",
+    stop: str | None = None,
+    fields: Annotated[list[str] | None, Query()] = None,
+    max_points: Annotated[int, Query(ge=2, le=10000)] = FLOW_MAX_POINTS,
+    format: str | None = None,
+):
+    """
+    energy_flow between start and stop (default: last 24h until now). The server picks
+    the aggregation window and rollup tier so at most max_points rows come back.
+    Records JSON by default, columnar formats via Accept or ?format=columns|msgpack|arrow;
+    responses are compressed per Accept-Encoding (br, gzip).
+    """
+    check_range(start, stop)
+    media_type = negotiate_format(request, format)
+    args = dict(range_start=start, range_stop=stop, fields=tuple(fields) if fields else None, max_points=max_points)
+    body = encoding.encode_frame(await get_flow_timeseries(**args), media_type)
+    return encoding.encoded_response(body, media_type, request.headers.get("accept-encoding"))
 
 @app.get("/data/soc/timeseries", dependencies=[Depends(verify_token)])
-def soc_timeseries():
+async def soc_timeseries(
+    request: Request,
+    start: str = "-1h",
+    stop: str = "24h",
+    fields: Annotated[list[str] | None, Query()] = None,
+    max_points: Annotated[int | None, Query(ge=2, le=10000)] = None,
+    algorithm: str | None = None,
+    site: str | None = None,
+    format: str | None = None,
+):
     # Fetch forecast data
-    # Note: OptimizationService creates forecast.
-    data = get_soc_forecast(range_start="-1h") # Fetch recently generated forecasts
-    return [clean_influx_data(record) for record in data]
+    # Note: OptimizationService creates forecast. Default: recently generated forecasts for the next 24h
+    # of SOC_FORECAST_ALGORITHM; site selects the plan of one fleet site
+    check_range(start, stop)
+    media_type = negotiate_format(request, format)
+    args = dict(range_start=start, range_stop=stop, fields=tuple(fields) if fields else None, max_points=max_points,
+                algorithm=algorithm or SOC_FORECAST_ALGORITHM, site=site)
+    body = encoding.encode_frame(await get_soc_forecast(**args), media_type)
+    return encoding.encoded_response(body, media_type, request.headers.get("accept-encoding"))
 
 @app.get("/data/weather", dependencies=[Depends(verify_token)])
-def get_weather():
-    """
-    Fetches real-time weather for Klagenfurt (Lat: 46.6247, Lon: 14.3053)
-    from Open-Meteo API.
-    """
-    try:
-        # Klagenfurt coordinates
-        url = "https://api.open-meteo.com/v1/forecast?latitude=46.6247&longitude=14.3053&current=temperature_2m"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            # Extract temperature
-            temp = data.get("current", {}).get("temperature_2m")
-            return {"temperature_c": temp, "location": "Klagenfurt"}
-        else:
-            return {"error": "Weather API unreachable", "details": response.text}
-    except Exception as e:
-        return {"error": "Failed to fetch weather", "details": str(e)}
+async def get_weather():
+    # Served from the shared weather cache, refreshed in the background
+    return await weather.get_weather()
 
 @app.get("/data/weather/irradiance", dependencies=[Depends(verify_token)])
-def get_irradiance():
+async def get_irradiance():
+    return await weather.get_irradiance()
+
+@app.get("/data/dashboard", dependencies=[Depends(verify_token)])
+async def dashboard_snapshot():
     """
-    Fetches hourly solar irradiance (shortwave_radiation) for Klagenfurt.
-    Returns timeseries for graph overlay.
+    Everything the dashboard needs in one response: the InfluxDB queries run
+    concurrently, weather comes from the background-refreshed cache.
     """
-    try:
-        # Klagenfurt coordinates, past_days=1 to get recent history match with monitoring
-        url = "https://api.open-meteo.com/v1/forecast?latitude=46.6247&longitude=14.3053&hourly=shortwave_radiation&past_days=1&forecast_days=1"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            hourly = data.get("hourly", {})
-            times = hourly.get("time", [])
-            values = hourly.get("shortwave_radiation", [])
-            
-            # Zip into list of dicts
-            return [{"timestamp": t, "irradiance": v} for t, v in zip(times, values)]
-        else:
-            return []
-    except Exception:
-        return []
-
-def clean_influx_data(record):
+    data, weather_data, irradiance = await asyncio.gather(
+        get_dashboard_data(),
+        weather.get_weather(),
+        weather.get_irradiance(),
+    )
+    return {
+        "status": first_row(data["status"]),
+        "flow": list(iter_rows(data["flow"])),
+        "soc": list(iter_rows(data["soc"])),
+        "weather": weather_data,
+        "irradiance": irradiance,
+        "errors": data["errors"],
+    }
+
+class CacheInvalidation(BaseModel):
+    # None drops everything
+    measurements: list[str] | None = None
+
+@app.post("/cache/invalidate", dependencies=[Depends(verify_cache_invalidate)])
+async def invalidate_cache(body: CacheInvalidation):
+    """Called by ingest/optimization after they wrote new data."""
+    measurements = body.measurements
+    if measurements is not None:
+        # Rollup tiers are cached together with their raw measurement
+        measurements = ["energy_flow" if m.startswith("energy_flow_") else m for m in measurements]
+    dropped = cache.invalidate(measurements)
+    # Push the new data to connected dashboards
+    live.notify(body.measurements or ["energy_flow", "forecast_soc"])
+    if body.measurements is None or "weather" in body.measurements:
+        weather.refresh_soon()
+    return {"invalidated": dropped}
+
+@app.get("/data/stream")
+async def live_stream(request: Request, token: str):
     """
-    Cleans InfluxDB record dictionary for JSON response.
-    Removes internal keys like _start, _stop, result, table
+    Server-sent events with new energy_flow windows, current status and new SoC
+    forecasts as soon as they are written. The token is passed as query parameter
+    because EventSource cannot send an Authorization header.
     """
-    if not record:
-        return {}
-    clean = {}
-    for k, v in record.items():
-        if not k.startswith("_") and k not in ["result", "table"]:
-            clean[k] = v
-        elif k == "_time":
-            clean["timestamp"] = v.isoformat() if hasattr(v, 'isoformat') else v
-    return clean
+    decode_username(token)
+    return StreamingResponse(
+        live.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/stats", dependencies=[Depends(verify_token)])
+async def cache_stats():
+    stats = cache.stats()
+    stats["live_subscribers"] = live.subscribers
+    stats["weather"] = weather.stats()
+    stats["auth"] = verifier.stats()
+    return stats
+
+live = LiveBroadcaster()
@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import time
+import asyncio
+import inspect
+from datetime import datetime, timedelta, timezone
+import requests
+
+# Provider: "openmeteo" (default), "influx" (hourly data stored by the ingest service, any storage backend)
+# or "stub" (synthetic data, no network)
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "openmeteo")
+# Klagenfurt coordinates
+WEATHER_LATITUDE = float(os.getenv("WEATHER_LATITUDE", 46.6247))
+WEATHER_LONGITUDE = float(os.getenv("WEATHER_LONGITUDE", 14.3053))
+WEATHER_LOCATION = os.getenv("WEATHER_LOCATION", "Klagenfurt")
+# Open-Meteo updates hourly, so a refresh every 15 minutes is plenty
+WEATHER_REFRESH_SECONDS = float(os.getenv("WEATHER_REFRESH_SECONDS", 900))
+# Retry sooner while the provider is failing
+WEATHER_RETRY_SECONDS = float(os.getenv("WEATHER_RETRY_SECONDS", 60))
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", 5))
+# Last good result, used on cold start until the first refresh succeeds
+WEATHER_CACHE_PATH = os.getenv("WEATHER_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".weather_cache.json"))
+
+
+class OpenMeteoProvider:
+    """Current temperature and hourly irradiance (yesterday + today) in one Open-Meteo call."""
+    name = "Open-Meteo API"
+
+    def fetch(self):
+        url = (
+            "https://api.open-meteo.com/v1/forecast"
+            f"?latitude={WEATHER_LATITUDE}&longitude={WEATHER_LONGITUDE}"
+            "&current=temperature_2m&hourly=shortwave_radiation&past_days=1&forecast_days=1"
+        )
+        response = requests.get(url, timeout=WEATHER_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        hourly = data.get("hourly", {})
+        return {
+            "weather": {"temperature_c": data.get("current", {}).get("temperature_2m"), "location": WEATHER_LOCATION},
+            "irradiance": [
+                {"timestamp": t, "irradiance": v}
+                for t, v in zip(hourly.get("time", []), hourly.get("shortwave_radiation", []))
+            ],
+        }
+
+
+class StubProvider:
+    """Synthetic clear-sky day for offline development and tests."""
+    name = "Local stub"
+
+    def fetch(self):
+        now = datetime.now(timezone.utc)
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        irradiance = []
+        for h in range(48):
+            t = start + timedelta(hours=h)
+            # Sun between 06:00 and 18:00, 800 W/m² peak at noon
+            irr = max(0.0, math.sin(math.pi * (t.hour - 6) / 12)) * 800 if 6 <= t.hour <= 18 else 0.0
+            irradiance.append({"timestamp": t.strftime("%Y-%m-%dT%H:%M"), "irradiance": round(irr, 1)})
+        temperature = 12 + 6 * math.sin(math.pi * (now.hour - 9) / 12)
+        return {
+            "weather": {"temperature_c": round(temperature, 1), "location": WEATHER_LOCATION},
+            "irradiance": irradiance,
+        }
+
+
+class InfluxWeatherProvider:
+    """Reads the "weather" measurement written hourly by the ingest service; no external calls."""
+    name = "Open-Meteo (stored)"
+
+    async def fetch(self):
+        from influx_reader import get_weather_series
+        from encoding import iter_rows
+        df = await get_weather_series(range_start="-24h", range_stop="24h")
+        if not len(df):
+            raise RuntimeError("no weather data stored yet")
+        now = datetime.now(timezone.utc)
+        past = df.loc[df["_time"] <= now, "temperature_2m"].dropna() if "temperature_2m" in df else []
+        return {
+            "weather": {"temperature_c": float(past.iloc[-1]) if len(past) else None, "location": WEATHER_LOCATION},
+            "irradiance": [
+                {"timestamp": r["timestamp"], "irradiance": r.get("shortwave_radiation")}
+                for r in iter_rows(df)
+            ],
+        }
+
+
+PROVIDERS = {"openmeteo": OpenMeteoProvider, "influx": InfluxWeatherProvider, "stub": StubProvider}
+
+
+def make_provider(name=WEATHER_PROVIDER):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown WEATHER_PROVIDER '{name}', expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+class WeatherService:
+    """
+    Keeps one weather/irradiance result for all callers. A background task
+    refreshes it every refresh_seconds; requests never call the provider
+    themselves, except for the very first one when nothing is cached yet.
+    Concurrent refreshes share a single provider call.
+    """
+
+    def __init__(self, provider, refresh_seconds=WEATHER_REFRESH_SECONDS,
+                 retry_seconds=WEATHER_RETRY_SECONDS, cache_path=WEATHER_CACHE_PATH):
+        self.provider = provider
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.cache_path = cache_path
+        self._data = None
+        self._fetched_at = None        # unix time of the current data
+        self._refreshing = None        # asyncio.Task of the running refresh
+        self._loop_task = None
+        self._stats = {"refreshes": 0, "failures": 0, "coalesced": 0, "last_error": None}
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self._data = cached["data"]
+            self._fetched_at = cached["fetched_at"]
+            print(f"Weather: loaded cached data from {self.cache_path}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Weather: ignoring unreadable cache {self.cache_path}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"fetched_at": self._fetched_at, "data": self._data}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print(f"Weather: could not write cache {self.cache_path}: {e}")
+
+    async def refresh(self):
+        """Fetches new data. Callers arriving during a running refresh wait for that one."""
+        if self._refreshing is not None and not self._refreshing.done():
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(self._refreshing)
+        self._refreshing = asyncio.create_task(self._fetch())
+        return await asyncio.shield(self._refreshing)
+
+    async def _fetch(self):
+        try:
+            if inspect.iscoroutinefunction(self.provider.fetch):
+                data = await self.provider.fetch()
+            else:
+                # Blocking provider (requests), keep it off the event loop
+                data = await asyncio.to_thread(self.provider.fetch)
+        except Exception as e:
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(e)
+            print(f"Weather refresh failed: {e}")
+            return False
+        # Kept with the data so a cached result still names where it came from
+        data["weather"]["source"] = self.provider.name
+        self._data = data
+        self._fetched_at = time.time()
+        self._stats["refreshes"] += 1
+        self._stats["last_error"] = None
+        self._save_cache()
+        return True
+
+    def refresh_soon(self):
+        """Starts a refresh in the background, e.g. after new weather data was written."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch())
+
+    async def _run(self):
+        while True:
+            ok = await self.refresh()
+            await asyncio.sleep(self.refresh_seconds if ok else self.retry_seconds)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    async def _current(self):
+        if self._data is None:
+            await self.refresh()
+        return self._data
+
+    async def get_weather(self):
+        data = await self._current()
+        if data is None:
+            return {"error": "Failed to fetch weather", "details": self._stats["last_error"]}
+        weather = dict(data["weather"])
+        weather["updated_at"] = datetime.fromtimestamp(self._fetched_at, timezone.utc).isoformat()
+        weather["stale"] = self.is_stale()
+        return weather
+
+    async def get_irradiance(self):
+        data = await self._current()
+        return data["irradiance"] if data is not None else []
+
+    def is_stale(self):
+        # Older than two refresh periods means the provider has been failing
+        return self._fetched_at is None or time.time() - self._fetched_at > 2 * self.refresh_seconds
+
+    def stats(self):
+        s = dict(self._stats)
+        s["provider"] = self.provider.name
+        s["age_seconds"] = round(time.time() - self._fetched_at, 1) if self._fetched_at else None
+        s["stale"] = self.is_stale()
+        return s
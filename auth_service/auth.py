@@ -2,12 +2,40 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
+import hashlib
+import secrets
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
-ALGORITHM = "HS256"
+# HS256 signs with the shared secret; RS256/ES256 with the private key, so the data
+# services only need the public key (python gen_keys.py creates a pair)
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_PRIVATE_KEY_PATH = os.getenv("JWT_PRIVATE_KEY_PATH", "")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2id cost. The default is the OWASP baseline (19 MiB, 2 passes, 1 lane) instead of
+# passlib's 64 MiB / 3 passes / 4 lanes; hashes with other settings are upgraded on the next login
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 19456))  # KiB
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 1))
+
+pwd_context = CryptContext(
+    schemes=["argon2"], deprecated="auto",
+    argon2__memory_cost=ARGON2_MEMORY_COST, argon2__time_cost=ARGON2_TIME_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+_signing_key = None
+
+def signing_key():
+    global _signing_key
+    if _signing_key is None:
+        if ALGORITHM == "HS256":
+            _signing_key = SECRET_KEY
+        else:
+            with open(JWT_PRIVATE_KEY_PATH) as fh:
+                _signing_key = fh.read()
+    return _signing_key
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +43,18 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update(plain_password, hashed_password):
+    """(valid, new hash or None); a new hash is returned when the stored one uses outdated cost settings."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def new_refresh_token():
+    """(token for the client, digest to store). Tokens are random, so a plain SHA-256 is enough."""
+    token = secrets.token_urlsafe(32)
+    return token, refresh_token_digest(token)
+
+def refresh_token_digest(token: str):
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -22,5 +62,5 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, signing_key(), algorithm=ALGORITHM)
     return encoded_jwt
@@ -0,0 +1,115 @@
+import time
+import asyncio
+import argparse
+import aiohttp
+
+# Login storm against a running auth_service: N clients log in at once (as after a
+# token-expiry wave). Reports logins/s, latency percentiles and rejected (503) logins.
+#   python bench_login.py --users 20 --concurrency 50 --logins 500
+#   python bench_login.py --mode refresh      # same storm, renewing with refresh tokens
+
+PASSWORD = "bench-password-123"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def ensure_users(session, url, users, prefix):
+    for i in range(users):
+        async with session.post(f"{url}/register", json={"username": f"{prefix}{i}", "password": PASSWORD}) as r:
+            await r.read()
+            if r.status not in (200, 400):   # 400: already registered
+                raise RuntimeError(f"register failed: {r.status}")
+
+
+async def login(session, url, username):
+    async with session.post(f"{url}/token", data={"username": username, "password": PASSWORD}) as r:
+        body = await r.json(content_type=None)
+        return r.status, body
+
+
+async def refresh(session, url, tokens, username):
+    async with session.post(f"{url}/token/refresh", json={"refresh_token": tokens[username]}) as r:
+        body = await r.json(content_type=None)
+        if r.status == 200:
+            tokens[username] = body["refresh_token"]
+        return r.status, body
+
+
+async def client(queue, request, latencies, statuses):
+    while True:
+        try:
+            username = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        t0 = time.perf_counter()
+        try:
+            status, _ = await request(username)
+        except aiohttp.ClientError:
+            status = "error"
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Login storm benchmark for auth_service")
+    parser.add_argument("--url", default="http://localhost:8003")
+    parser.add_argument("--users", type=int, default=20, help="Distinct accounts (created if missing)")
+    parser.add_argument("--prefix", default="bench_user_")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500, help="Total logins")
+    parser.add_argument("--mode", choices=["password", "refresh"], default="password")
+    args = parser.parse_args()
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await ensure_users(session, args.url, args.users, args.prefix)
+        accounts = [f"{args.prefix}{i}" for i in range(args.users)]
+
+        if args.mode == "refresh":
+            # Every account needs one password login to obtain its first refresh token
+            tokens = {}
+            for name in accounts:
+                status, body = await login(session, args.url, name)
+                if status != 200 or not body.get("refresh_token"):
+                    raise RuntimeError("auth_service does not issue refresh tokens")
+                tokens[name] = body["refresh_token"]
+
+            def request(username):
+                return refresh(session, args.url, tokens, username)
+
+            # A refresh token works once (reuse revokes the account's sessions),
+            # so each account is renewed by one client, one renewal after the other
+            queues = [asyncio.Queue() for _ in accounts]
+            for i, name in enumerate(accounts):
+                for _ in range(args.logins // args.users):
+                    queues[i].put_nowait(name)
+        else:
+            def request(username):
+                return login(session, args.url, username)
+
+            shared = asyncio.Queue()
+            for i in range(args.logins):
+                shared.put_nowait(accounts[i % args.users])
+            queues = [shared] * args.concurrency
+
+        total = sum(q.qsize() for q in set(queues))
+        latencies, statuses = [], {}
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(q, request, latencies, statuses) for q in queues))
+        elapsed = time.perf_counter() - t0
+
+    ok = statuses.get(200, 0)
+    print(f"{args.mode} logins: {total} with {len(queues)} concurrent clients in {elapsed:.2f} s")
+    print(f"  successful/s {ok / elapsed:>10.1f}")
+    if latencies:
+        print(f"  p50 {percentile(latencies, 50):.0f} ms, p95 {percentile(latencies, 95):.0f} ms, "
+              f"p99 {percentile(latencies, 99):.0f} ms, max {max(latencies):.0f} ms")
+    print(f"  status counts: {dict(sorted(statuses.items(), key=str))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
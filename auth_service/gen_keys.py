@@ -0,0 +1,44 @@
+import os
+import argparse
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+# Creates a key pair for asymmetric JWTs:
+#   python gen_keys.py --algorithm ES256 --out keys
+# auth_service signs with JWT_PRIVATE_KEY_PATH=keys/jwt_private.pem, the data services
+# verify with JWT_PUBLIC_KEY_PATH=keys/jwt_public.pem; both need JWT_ALGORITHM set the same.
+
+
+def generate(algorithm):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unsupported algorithm {algorithm}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key pair")
+    parser.add_argument("--algorithm", default="ES256", choices=["ES256", "RS256"])
+    parser.add_argument("--out", default="keys", help="Directory for jwt_private.pem and jwt_public.pem")
+    args = parser.parse_args()
+
+    key = generate(args.algorithm)
+    os.makedirs(args.out, exist_ok=True)
+    private_path = os.path.join(args.out, "jwt_private.pem")
+    public_path = os.path.join(args.out, "jwt_public.pem")
+
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    # Private key readable by the owner only
+    fd = os.open(private_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(private_pem)
+    with open(public_path, "wb") as fh:
+        fh.write(key.public_key().public_bytes(serialization.Encoding.PEM,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo))
+    print(f"{args.algorithm} keys written: {private_path}, {public_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import auth
+
+# Worker processes for password hashing (default: all cores)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# Hashes queued or running at once; further logins get 503 instead of waiting behind them
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 32))
+# "spawn" keeps the workers independent of the server's threads
+HASH_MP_START = os.getenv("HASH_MP_START", "spawn")
+
+
+class HashPoolBusy(Exception):
+    pass
+
+
+class HashPool:
+    """
+    Runs argon2 on a process pool so CPU-bound hashing neither blocks the event
+    loop nor holds the GIL for the request threads. At most queue_size hashes
+    are admitted; beyond that the caller is told to retry (HashPoolBusy).
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE, mp_start=HASH_MP_START):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.mp_start = mp_start
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(self.mp_start))
+            return self._executor
+
+    def start(self):
+        """Starts the workers and loads argon2 in them without waiting, so the first login does not pay for it."""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(auth.get_password_hash, "warm-up")
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        executor = self._get_executor()
+        with self._lock:
+            if self._in_flight >= self.queue_size:
+                self.rejected += 1
+                raise HashPoolBusy()
+            self._in_flight += 1
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); the next call starts a fresh pool
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    async def hash(self, password):
+        return await self.run(auth.get_password_hash, password)
+
+    async def verify(self, password, hashed_password):
+        """(valid, upgraded hash or None)"""
+        return await self.run(auth.verify_and_update, password, hashed_password)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queue_size": self.queue_size, "in_flight": self._in_flight,
+                    "completed": self.completed, "rejected": self.rejected}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,16 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import models
 import auth
 from database import engine, SessionLocal
+from hashing import HashPool, HashPoolBusy
 
-models.Base.metadata.create_all(bind=engine)
+STARTED = time.monotonic()
 
-app = FastAPI()
+hash_pool = HashPool()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation is the only blocking startup work; engine connections are opened on demand
+    models.Base.metadata.create_all(bind=engine)
+    hash_pool.start()
+    yield
+    hash_pool.shutdown()
+    engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(HashPoolBusy)
+async def hash_pool_busy(request: Request, exc: HashPoolBusy):
+    # Login storm: tell clients to back off instead of queueing behind the hashing pool
+    return JSONResponse({"detail": "Too many logins in progress, retry shortly"},
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive", "service": "auth_service", "uptime_s": round(time.monotonic() - STARTED, 3)}
+
+@app.get("/health/ready")
+def readiness_probe():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse({"status": "not ready", "service": "auth_service", "checks": {"database": str(e)}},
+                            status_code=503)
+    return {"status": "ready", "service": "auth_service", "checks": {"database": "ok"}}
+
+@app.get("/hashing/stats")
+def hashing_stats():
+    return hash_pool.stats()
 
 def get_db():
     db = SessionLocal()
@@ -26,36 +67,94 @@ class UserCreate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
-@app.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_password = auth.get_password_hash(user.password)
-    new_user = models.User(username=user.username, hashed_password=hashed_password)
-    db.add(new_user)
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+# Database work is short and blocking, it runs on the threadpool; hashing runs on hash_pool
+
+def find_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def add_user(db: Session, username: str, hashed_password: str):
+    db.add(models.User(username=username, hashed_password=hashed_password))
+    db.commit()
+
+def update_hash(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
     db.commit()
-    db.refresh(new_user)
-    
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+def issue_tokens(db: Session, username: str):
+    """New access token plus a refresh token, so clients can renew without sending the password again."""
     access_token = auth.create_access_token(
-        data={"sub": new_user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token, digest = auth.new_refresh_token()
+    now = datetime.utcnow()
+    # Expired tokens of this user are dropped on the way
+    db.query(models.RefreshToken).filter(models.RefreshToken.username == username,
+                                         models.RefreshToken.expires_at < now).delete()
+    db.add(models.RefreshToken(token_hash=digest, username=username,
+                               expires_at=now + timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS)))
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+def rotate_refresh_token(db: Session, refresh_token: str):
+    """Exchanges a refresh token for new tokens; each refresh token works once."""
+    digest = auth.refresh_token_digest(refresh_token)
+    stored = db.query(models.RefreshToken).filter(models.RefreshToken.token_hash == digest).first()
+    if stored is None or stored.expires_at < datetime.utcnow():
+        return None
+    # Claim the token in one conditional update, so of two concurrent refreshes only one wins
+    claimed = db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == digest, models.RefreshToken.revoked == False).update(  # noqa: E712
+        {models.RefreshToken.revoked: True}, synchronize_session=False)
+    if claimed != 1:
+        # A used token came back: it was copied, so end every session of that user
+        db.query(models.RefreshToken).filter(models.RefreshToken.username == stored.username).update(
+            {models.RefreshToken.revoked: True}, synchronize_session=False)
+        db.commit()
+        return None
+    return issue_tokens(db, stored.username)
+
+def revoke_refresh_token(db: Session, refresh_token: str):
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == auth.refresh_token_digest(refresh_token)).update(
+        {models.RefreshToken.revoked: True})
+    db.commit()
+
+@app.post("/register", response_model=Token)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(find_user, db, user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+
+    hashed_password = await hash_pool.hash(user.password)
+    await run_in_threadpool(add_user, db, user.username, hashed_password)
+    return await run_in_threadpool(issue_tokens, db, user.username)
 
 @app.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(find_user, db, form_data.username)
+    valid, new_hash = (await hash_pool.verify(form_data.password, user.hashed_password)) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    if new_hash:
+        # Stored hash used older argon2 settings
+        await run_in_threadpool(update_hash, db, user, new_hash)
+    return await run_in_threadpool(issue_tokens, db, user.username)
+
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshRequest, db: Session = Depends(get_db)):
+    tokens = await run_in_threadpool(rotate_refresh_token, db, body.refresh_token)
+    if tokens is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    return tokens
+
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke(body: RefreshRequest, db: Session = Depends(get_db)):
+    await run_in_threadpool(revoke_refresh_token, db, body.refresh_token)
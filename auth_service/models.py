@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Integer, String
 from database import Base
 
 class User(Base):
@@ -7,3 +7,13 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    # SHA-256 of the token, the token itself is only known to the client
+    token_hash = Column(String, unique=True, index=True)
+    username = Column(String, index=True)
+    expires_at = Column(DateTime)
+    revoked = Column(Boolean, default=False)
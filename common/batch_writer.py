@@ -0,0 +1,324 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+from collections import deque
+
+# Defaults, overridable per service via environment
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", 5000))            # points per flush
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL", 1.0))   # max seconds a point waits
+WRITER_MAX_QUEUE = int(os.getenv("WRITER_MAX_QUEUE", 100000))            # points buffered before backpressure
+WRITER_MAX_RETRIES = int(os.getenv("WRITER_MAX_RETRIES", 5))
+WRITER_RETRY_BASE = float(os.getenv("WRITER_RETRY_BASE", 0.5))          # seconds, doubled per retry
+WRITER_RETRY_MAX = float(os.getenv("WRITER_RETRY_MAX", 30.0))
+
+
+def is_transient(error):
+    """True for errors worth retrying later: storage unreachable, overloaded or timing out."""
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        # influxdb-client ApiException; other 4xx (bad line, field type conflict) will fail again
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError, sqlite3.OperationalError)):
+        return True
+    if type(error).__module__.split(".", 1)[0] in ("urllib3", "aiohttp", "requests"):
+        return True
+    return isinstance(error, OSError)
+
+
+def _reachable(probe):
+    try:
+        return probe is not None and bool(probe())
+    except Exception:
+        return False
+
+
+def isolate(send, records, retryable=is_transient, probe=None):
+    """
+    Sends records, splitting a refused batch in halves until the records storage
+    refuses on their own are found. Returns (indexes of refused records, last error).
+
+    Raises instead when nothing could be written and storage looks unreachable:
+    a retryable error before any write, or every attempt failing and probe()
+    (if given) not confirming that storage is up.
+    """
+    refused, written, failures, error = [], 0, 0, None
+    # Failures a single bad record causes on its way down the halves
+    budget = len(records).bit_length() + 2
+    stack = [(0, len(records))]
+    while stack:
+        lo, hi = stack.pop()
+        try:
+            send(records[lo:hi])
+            written += hi - lo
+            continue
+        except Exception as e:
+            error = e
+            failures += 1
+            if not written:
+                if retryable(e):
+                    raise
+                if failures > budget:
+                    if not _reachable(probe):
+                        raise
+                    budget = float("inf")
+        if hi - lo == 1:
+            refused.append(lo)
+        else:
+            mid = (lo + hi) // 2
+            stack += [(mid, hi), (lo, mid)]
+    return refused, error
+
+
+class BatchingWriter:
+    """
+    Collects records (Points or line protocol strings) and sends them in batches
+    from a background thread. A batch is flushed once it reaches batch_size points
+    or its oldest point waited flush_interval seconds. Failed sends are retried
+    with jittered exponential backoff; batches that still fail are dropped and counted,
+    or appended to the spool if one is given (replayed once writes succeed again).
+    Errors that retrying cannot fix (is_transient() is False, e.g. a field type
+    conflict) are not retried or spooled: the batch is split to find the refused
+    points, which go to the spool's dead letter file (or are dropped) and counted.
+
+    send(records) must perform the actual (blocking) write and raise on failure.
+    on_flush(records), if given, is called after every successful write, also
+    for replayed batches. probe(), if given, tells whether storage is reachable.
+    """
+
+    def __init__(self, send, batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL,
+                 max_queue=WRITER_MAX_QUEUE, max_retries=WRITER_MAX_RETRIES,
+                 retry_base=WRITER_RETRY_BASE, retry_max=WRITER_RETRY_MAX, name="influx-writer", on_flush=None,
+                 spool=None, probe=None):
+        self.send = send
+        self.on_flush = on_flush
+        self.spool = spool
+        self.probe = probe
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max(1, max_queue)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._items = deque()          # (records, on_done, enqueued_at)
+        self._queued_points = 0
+        self._in_flight = 0
+        self._closed = False
+        self._thread = None
+
+        self._stats = {
+            "submitted": 0, "written": 0, "dropped": 0, "rejected": 0, "spooled": 0, "refused": 0,
+            "flushes": 0, "retries": 0, "last_flush_ms": 0.0, "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0, "last_error": None,
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+            self._thread.start()
+            if self.spool is not None:
+                self.spool.start(self.send, on_replayed=self.on_flush, probe=self.probe)
+
+    def start(self):
+        """Starts the background threads early, so points spooled by a previous run are replayed."""
+        with self._cond:
+            self._ensure_thread()
+
+    def submit(self, records, on_done=None, block=True, timeout=None):
+        """
+        Queues records for writing. Never performs I/O itself.
+        When the queue is full it blocks (backpressure) or, with block=False or
+        after timeout, rejects the records and returns False.
+        on_done(count, error) is called from the writer thread once the records are
+        written or spooled (error None) or given up on.
+        """
+        if not isinstance(records, (list, tuple)):
+            records = [records]
+        n = len(records)
+        if n == 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            # Oversized submissions are accepted into an empty queue to avoid a deadlock
+            while self._queued_points > 0 and self._queued_points + n > self.max_queue:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    self._stats["rejected"] += n
+                    return False
+                self._cond.wait(remaining)
+            self._items.append((list(records), on_done, time.monotonic()))
+            self._queued_points += n
+            self._stats["submitted"] += n
+            self._ensure_thread()
+            self._cond.notify_all()
+        return True
+
+    def _take_batch(self):
+        # Called with the lock held
+        batch, callbacks, count = [], [], 0
+        while self._items and count < self.batch_size:
+            records, on_done, _ = self._items.popleft()
+            batch.extend(records)
+            callbacks.append((on_done, len(records)))
+            count += len(records)
+        self._queued_points -= count
+        self._in_flight += count
+        self._cond.notify_all()
+        return batch, callbacks
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._items:
+                        oldest = self._items[0][2]
+                        due = oldest + self.flush_interval - time.monotonic()
+                        if self._queued_points >= self.batch_size or due <= 0 or self._closed:
+                            break
+                        self._cond.wait(due)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                batch, callbacks = self._take_batch()
+            self._flush(batch, callbacks)
+
+    def _flush(self, batch, callbacks):
+        error = None
+        spooled = False
+        refused = []
+        t0 = time.perf_counter()
+        # While earlier points wait in the spool, new ones queue up behind them
+        if self.spool is not None:
+            try:
+                spooled = self.spool.append_if_pending(batch)
+            except Exception as e:
+                print(f"[{self.name}] spool append failed ({e}), writing directly")
+        for attempt in range(0 if spooled else self.max_retries + 1):
+            try:
+                self.send(batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if not is_transient(e):
+                    break
+                if attempt == self.max_retries:
+                    break
+                delay = min(self.retry_max, self.retry_base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                with self._cond:
+                    self._stats["retries"] += 1
+                    self._stats["last_error"] = str(e)
+                print(f"[{self.name}] write of {len(batch)} points failed ({e}), retry in {delay:.1f}s")
+                time.sleep(delay)
+        if error is not None and not is_transient(error):
+            # Storage refuses some points: write the rest, set the refused ones aside
+            try:
+                refused, error = isolate(self.send, batch, probe=self.probe)
+            except Exception as e:
+                error = e
+            else:
+                self._refuse([batch[i] for i in refused], error)
+                if not refused:
+                    error = None
+        if error is not None and not refused and self.spool is not None:
+            try:
+                self.spool.append(batch)
+                print(f"[{self.name}] spooled {len(batch)} points after {self.max_retries} retries: {error}")
+                spooled, error = True, None
+            except Exception as e:
+                print(f"[{self.name}] spool append failed: {e}")
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        failed = error is not None and not refused
+
+        with self._cond:
+            self._in_flight -= len(batch)
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+            if spooled:
+                self._stats["spooled"] += len(batch)
+            elif failed:
+                self._stats["dropped"] += len(batch)
+                self._stats["last_error"] = str(error)
+            else:
+                self._stats["written"] += len(batch) - len(refused)
+                self._stats["refused"] += len(refused)
+                if refused:
+                    self._stats["last_error"] = str(error)
+            self._cond.notify_all()
+        if failed:
+            print(f"[{self.name}] dropped {len(batch)} points after {self.max_retries} retries: {error}")
+        elif self.on_flush is not None and not spooled:
+            refused_set = set(refused)
+            try:
+                self.on_flush([r for i, r in enumerate(batch) if i not in refused_set] if refused else batch)
+            except Exception as e:
+                print(f"[{self.name}] on_flush hook failed: {e}")
+
+        # Callbacks own consecutive slices of the batch; only those with refused points see the error
+        start = 0
+        for on_done, count in callbacks:
+            if on_done is not None:
+                own_error = error if failed or any(start <= i < start + count for i in refused) else None
+                try:
+                    on_done(count, own_error)
+                except Exception as e:
+                    print(f"[{self.name}] on_done callback failed: {e}")
+            start += count
+
+    def _refuse(self, records, error):
+        if not records:
+            return
+        print(f"[{self.name}] storage refused {len(records)} points: {error}")
+        if self.spool is not None:
+            try:
+                self.spool.dead_letter(records, error)
+            except Exception as e:
+                print(f"[{self.name}] dead letter write failed: {e}")
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far is written (or dropped). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # Make the pending items due right away
+            self._items = deque((r, cb, 0.0) for r, cb, _ in self._items)
+            self._cond.notify_all()
+            while self._items or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Flushes what is left and stops the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.spool is not None:
+            # What is still spooled stays on disk for the next start
+            self.spool.stop(timeout)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["queue_depth"] = self._queued_points
+            s["queued_batches"] = len(self._items)
+            s["in_flight"] = self._in_flight
+        flushes = s.pop("total_flush_ms")
+        s["avg_flush_ms"] = round(flushes / s["flushes"], 3) if s["flushes"] else 0.0
+        s["last_flush_ms"] = round(s["last_flush_ms"], 3)
+        s["max_flush_ms"] = round(s["max_flush_ms"], 3)
+        if self.spool is not None:
+            s["spool"] = self.spool.stats()
+        return s
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt
+
+# Per-request cost of bearer token verification: the old per-request jwt.decode
+# against the shared TokenVerifier, per algorithm, uncached and cached.
+#   python -m common.bench_auth --requests 20000 --users 50
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.security import TokenVerifier, PublicKey  # noqa: E402
+
+SECRET = "supersecretjwtkeyforlocaldev"
+
+
+def key_pair(algorithm):
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    private = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+    public = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                           serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private, public
+
+
+def tokens(algorithm, key, users):
+    exp = datetime.now(timezone.utc) + timedelta(hours=1)
+    return [jwt.encode({"sub": f"user{i}", "exp": exp}, key, algorithm=algorithm) for i in range(users)]
+
+
+def per_request_us(fn, stream, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        for token in stream:
+            fn(token)
+        samples.append((time.perf_counter() - t0) / len(stream) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token verification overhead per request")
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per run")
+    parser.add_argument("--users", type=int, default=50, help="Distinct tokens (dashboard sessions)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Each session polls several endpoints with the same token
+    def stream(toks):
+        return [toks[i % len(toks)] for i in range(args.requests)]
+
+    hs = tokens("HS256", SECRET, args.users)
+
+    def legacy(token):
+        # What every data service did on every request
+        return jwt.decode(token, SECRET, algorithms=["HS256"])["sub"]
+
+    rows = [("HS256 jwt.decode per request (before)", legacy, stream(hs))]
+    for algorithm in ("HS256", "RS256", "ES256"):
+        if algorithm == "HS256":
+            toks = hs
+            public_key = None
+        else:
+            private, public = key_pair(algorithm)
+            toks = tokens(algorithm, private, args.users)
+            public_key = PublicKey(pem=public, path="")
+        uncached = TokenVerifier(algorithm, secret=SECRET, public_key=public_key, max_entries=0)
+        cached = TokenVerifier(algorithm, secret=SECRET, public_key=public_key)
+        rows.append((f"{algorithm} verifier, no cache", uncached.username, stream(toks)))
+        rows.append((f"{algorithm} verifier, cached", cached.username, stream(toks)))
+
+    print(f"{args.requests} requests, {args.users} tokens, median of {args.runs} runs")
+    print(f"{'path':<40}{'us/request':>12}{'requests/s':>14}")
+    for name, fn, toks in rows:
+        us = per_request_us(fn, toks, args.runs)
+        print(f"{name:<40}{us:>12.1f}{1e6 / us:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+# Write-ahead spool: append rate during an outage (with and without fsync), replay
+# rate into a scratch SQLite store and into a no-op sink (spool reading alone),
+# compaction of rewritten forecasts, and an outage through a BatchingWriter:
+# storage fails for a while, then recovers; reports lost points and drain time.
+#   python -m common.bench_spool --points 500000
+#   python -m common.bench_spool --outage 10
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.batch_writer import BatchingWriter  # noqa: E402
+from common.spool import Spool  # noqa: E402
+from common.storage import SQLiteStorage  # noqa: E402
+
+T0_NS = 1_767_225_600_000_000_000   # 2026-01-01
+BATCH = 5000
+
+
+def meter_lines(n, offset=0, devices=200):
+    return [f"energy_flow,source=meter,device=dev{i % devices} pv_power_kw={i % 97 * 0.1:.1f},"
+            f"consumption_power_kw={i % 53 * 0.1:.1f} {T0_NS + (offset + i) * 1_000_000_000}" for i in range(n)]
+
+
+def append_all(spool, lines):
+    t0 = time.perf_counter()
+    for i in range(0, len(lines), BATCH):
+        spool.append(lines[i:i + BATCH])
+    return time.perf_counter() - t0
+
+
+def replay_all(spool, send):
+    t0 = time.perf_counter()
+    while spool.replay_once(send):
+        pass
+    return time.perf_counter() - t0
+
+
+def row(name, points, seconds, size=None):
+    mb = f"{size / seconds / 1e6:>10.1f}" if size else f"{'':>10}"
+    print(f"{name:<36}{points / seconds:>14,.0f}{mb}{seconds:>10.2f}")
+
+
+def outage(workdir, points, outage_s):
+    """Producer writes at a steady rate while storage is down for outage_s seconds."""
+    storage = SQLiteStorage(os.path.join(workdir, "outage.sqlite3"))
+    down = threading.Event()
+    down.set()
+
+    def send(records):
+        if down.is_set():
+            raise ConnectionError("storage unavailable")
+        storage.write(records)
+
+    spool = Spool(os.path.join(workdir, "outage_spool"), retry_base=0.2, retry_max=1.0, name="bench-spool")
+    writer = BatchingWriter(send, max_retries=1, retry_base=0.1, name="bench-writer", spool=spool)
+    lines = meter_lines(points)
+    chunk = 500
+    per_chunk = outage_s * 2 / (len(lines) / chunk)   # the producer runs for twice the outage
+    t_start = time.perf_counter()
+    recovered_at = None
+    for i in range(0, len(lines), chunk):
+        writer.submit(lines[i:i + chunk])
+        if recovered_at is None and time.perf_counter() - t_start >= outage_s:
+            down.clear()
+            recovered_at = time.perf_counter()
+        time.sleep(per_chunk)
+    if recovered_at is None:
+        down.clear()
+        recovered_at = time.perf_counter()
+    writer.flush()
+    while spool.pending():
+        time.sleep(0.01)
+    drained = time.perf_counter() - recovered_at
+    writer.close()
+    stored = len(storage.query_range("energy_flow", T0_NS, T0_NS + points * 1_000_000_000))
+    stats = writer.stats()
+    storage.close()
+    print(f"\noutage of {outage_s:.0f} s with {points:,} points submitted over {outage_s * 2:.0f} s:")
+    print(f"  spooled {stats['spooled']:,}, dropped {stats['dropped']:,}, stored {stored:,} "
+          f"(lost {points - stored:,})")
+    # New points keep arriving behind the backlog, so this includes writing those too
+    print(f"  spool empty {drained:.2f} s after storage came back "
+          f"(producer still writing {points / (outage_s * 2):,.0f} points/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write-ahead spool benchmark")
+    parser.add_argument("--points", type=int, default=200000)
+    parser.add_argument("--outage", type=float, default=5.0, help="Seconds storage is down in the outage run")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_spool_")
+    try:
+        lines = meter_lines(args.points)
+        print(f"{args.points:,} points in batches of {BATCH}")
+        print(f"{'':<36}{'points/s':>14}{'MB/s':>10}{'seconds':>10}")
+
+        results = {}
+        for fsync in (True, False):
+            spool = Spool(os.path.join(workdir, f"append_{fsync}"), fsync=fsync)
+            seconds = append_all(spool, lines)
+            size = spool.stats()["bytes"]
+            row(f"append ({'fsync' if fsync else 'no fsync'})", len(lines), seconds, size)
+            results[fsync] = spool
+
+        seconds = replay_all(results[False], lambda batch: None)
+        row("replay into no-op sink", len(lines), seconds)
+        storage = SQLiteStorage(os.path.join(workdir, "replay.sqlite3"))
+        seconds = replay_all(results[True], storage.write)
+        row("replay into SQLite", len(lines), seconds)
+        storage.close()
+
+        # Forecast runs rewrite the same horizon; only the last run per point matters
+        spool = Spool(os.path.join(workdir, "compact"), segment_bytes=1024 ** 2, compact_bytes=1024 ** 3)
+        runs, horizon = 20, max(1, args.points // 20)
+        for run in range(runs):
+            append_all(spool, [f"soc_forecast,source=optimizer soc={run + i % 100 * 0.01:.2f} "
+                               f"{T0_NS + i * 900_000_000_000}" for i in range(horizon)])
+        before = spool.stats()
+        t0 = time.perf_counter()
+        removed = spool.compact()
+        seconds = time.perf_counter() - t0
+        after = spool.stats()
+        print(f"\ncompaction of {runs} forecast runs ({before['segments']} segments, {before['bytes'] / 1e6:.1f} MB):")
+        print(f"  {before['pending_points']:,} -> {after['pending_points']:,} points ({removed:,} overwritten), "
+              f"{after['bytes'] / 1e6:.1f} MB, {seconds:.2f} s ({before['pending_points'] / seconds:,.0f} points/s)")
+        spool.stop()
+
+        outage(workdir, args.points, args.outage)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+# Cold start of every service: import time of main, and time from process start
+# until /health/live and /health/ready first answer 200. Runs uvicorn against a
+# scratch SQLite store in a temp directory, so no InfluxDB is needed and nothing
+# in the tree is touched.
+#   python -m common.bench_startup --runs 5
+#   python -m common.bench_startup --service api_service --service ingest_service
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = ["api_service", "ingest_service", "optimization_service", "auth_service"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def service_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "bench.sqlite3"),
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "WEATHER_CACHE_PATH": os.path.join(workdir, "weather.json"),
+        "FORECAST_MODEL_DIR": os.path.join(workdir, "models"),
+        "SPOOL_DIR": os.path.join(workdir, "spool"),
+        "WEATHER_INGEST_ENABLED": "false",
+        "API_SERVICE_URL": "",
+    })
+    return env
+
+
+def import_time(service, workdir):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.join(ROOT, service), env=service_env(workdir),
+                         capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(f"{service}: import failed\n{out.stderr[-2000:]}")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url, proc, deadline):
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def start_time(service, workdir, timeout):
+    """(seconds to live, seconds to ready) of one uvicorn start."""
+    port = free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", os.path.join(ROOT, service),
+           "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=service_env(workdir),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        live = wait_for(f"http://127.0.0.1:{port}/health/live", proc, deadline) - t0
+        ready = wait_for(f"http://127.0.0.1:{port}/health/ready", proc, deadline) - t0
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return live, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service cold-start benchmark")
+    parser.add_argument("--service", action="append", choices=SERVICES, help="Service to measure (repeatable)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'service':<24}{'import ms':>10}{'live ms':>10}{'ready ms':>10}   (median of {args.runs})")
+    for service in args.service or SERVICES:
+        imports, lives, readies = [], [], []
+        for _ in range(args.runs):
+            # Fresh directory per run: empty database, no fitted models, no caches
+            with tempfile.TemporaryDirectory() as workdir:
+                imports.append(import_time(service, workdir))
+            with tempfile.TemporaryDirectory() as workdir:
+                live, ready = start_time(service, workdir, args.timeout)
+            lives.append(live)
+            readies.append(ready)
+        print(f"{service:<24}{statistics.median(imports) * 1000:>10.0f}"
+              f"{statistics.median(lives) * 1000:>10.0f}{statistics.median(readies) * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import time
+import asyncio
+import inspect
+import threading
+
+# Seconds a dependency check result is reused (orchestrators probe every few seconds)
+READY_CHECK_TTL = float(os.getenv("READY_CHECK_TTL", 5))
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", 2))
+
+
+class Readiness:
+    """
+    Liveness and readiness of a service for /health/live and /health/ready.
+    Live only means the event loop answers. Ready means every warm-up step has
+    finished (a failed one is reported but does not block) and every dependency
+    check passes. Checks are cached for READY_CHECK_TTL so probes stay cheap and
+    never queue behind request work.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._started = time.monotonic()
+        self._warmups = {}     # name -> {"state": ..., "ms": ...}
+        self._checks = {}      # name -> callable returning truthy when healthy
+        self._results = {}     # name -> (expires_at, ok, detail)
+
+    def warm_up(self, name, fn):
+        """Runs fn in a background thread; the service is not ready before it returned."""
+        self._warmups[name] = {"state": "running", "ms": None}
+
+        def run():
+            t0 = time.perf_counter()
+            try:
+                fn()
+                state = "done"
+            except Exception as e:
+                print(f"[{self.service}] warm-up {name} failed: {e}")
+                state = f"failed: {e}"
+            self._warmups[name] = {"state": state, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+        threading.Thread(target=run, daemon=True, name=f"warmup-{name}").start()
+
+    def check(self, name, fn):
+        """Adds a dependency check: a sync or async callable, healthy if it returns truthy."""
+        self._checks[name] = fn
+
+    def live(self):
+        return {"status": "alive", "service": self.service, "uptime_s": round(time.monotonic() - self._started, 3)}
+
+    async def _run_check(self, name, fn):
+        cached = self._results.get(name)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+        try:
+            result = fn() if inspect.iscoroutinefunction(fn) else asyncio.to_thread(fn)
+            ok = bool(await asyncio.wait_for(result, READY_CHECK_TIMEOUT))
+            detail = "ok" if ok else "failed"
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timeout after {READY_CHECK_TIMEOUT}s"
+        except Exception as e:
+            ok, detail = False, str(e)
+        self._results[name] = (time.monotonic() + READY_CHECK_TTL, ok, detail)
+        return ok, detail
+
+    async def ready(self):
+        """(ready, details)"""
+        checks = dict(zip(self._checks, await asyncio.gather(
+            *(self._run_check(name, fn) for name, fn in self._checks.items()))))
+        warming = [name for name, w in self._warmups.items() if w["state"] == "running"]
+        ok = not warming and all(ok for ok, _ in checks.values())
+        return ok, {
+            "status": "ready" if ok else "not ready",
+            "service": self.service,
+            "checks": {name: detail for name, (_, detail) in checks.items()},
+            "warm_up": dict(self._warmups),
+        }
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+import urllib.request
+from datetime import datetime, timedelta
+from jose import jwt
+
+from common.security import CACHE_INVALIDATE_SCOPE
+
+# api_service base URL; notifications are disabled when empty
+API_SERVICE_URL = os.getenv("API_SERVICE_URL", "")
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
+# Minimum seconds between two notifications (changes in between are merged)
+NOTIFY_MIN_INTERVAL = float(os.getenv("NOTIFY_MIN_INTERVAL", 1.0))
+
+
+def record_measurement(record):
+    """Measurement name of a Point or line protocol string."""
+    if isinstance(record, str):
+        head = record.split(" ", 1)[0]
+        return head.split(",", 1)[0].replace("\\", "")
+    return getattr(record, "_name", None)
+
+
+class InvalidationNotifier:
+    """
+    Tells api_service which measurements changed so it can drop cached query results.
+    Meant as BatchingWriter.on_flush hook: it only collects measurement names and
+    a background thread sends at most one POST per NOTIFY_MIN_INTERVAL.
+    """
+
+    def __init__(self, service_name, api_url=API_SERVICE_URL, secret=JWT_SECRET_KEY,
+                 min_interval=NOTIFY_MIN_INTERVAL):
+        self.service_name = service_name
+        self.api_url = api_url.rstrip("/")
+        self.secret = secret
+        self.min_interval = min_interval
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._token = None
+        self._token_exp = None
+
+    @property
+    def enabled(self):
+        return bool(self.api_url)
+
+    def __call__(self, records):
+        self.notify({record_measurement(r) for r in records} - {None})
+
+    def notify(self, measurements):
+        if not self.enabled or not measurements:
+            return
+        with self._cond:
+            self._pending |= set(measurements)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="cache-notifier")
+                self._thread.start()
+            self._cond.notify()
+
+    def _service_token(self):
+        # Short-lived token signed with the shared secret, renewed before it expires
+        now = datetime.utcnow()
+        if self._token is None or self._token_exp - now < timedelta(minutes=1):
+            self._token_exp = now + timedelta(minutes=10)
+            claims = {"sub": self.service_name, "scope": CACHE_INVALIDATE_SCOPE, "exp": self._token_exp}
+            self._token = jwt.encode(claims, self.secret, algorithm="HS256")
+        return self._token
+
+    def _post(self, measurements):
+        body = json.dumps({"measurements": sorted(measurements)}).encode()
+        request = urllib.request.Request(
+            f"{self.api_url}/cache/invalidate", data=body, method="POST",
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self._service_token()}"},
+        )
+        with urllib.request.urlopen(request, timeout=2) as response:
+            response.read()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                measurements, self._pending = self._pending, set()
+            try:
+                self._post(measurements)
+            except Exception as e:
+                print(f"[cache-notifier] invalidation for {sorted(measurements)} failed: {e}")
+            time.sleep(self.min_interval)
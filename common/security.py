@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+
+# Algorithm of the user tokens issued by auth_service: HS256 (shared secret) or
+# RS256/ES256 (auth_service signs with its private key, data services only need the public key)
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
+# PEM public key, inline or as file (read once, reloaded when the file changes)
+JWT_PUBLIC_KEY = os.getenv("JWT_PUBLIC_KEY", "")
+JWT_PUBLIC_KEY_PATH = os.getenv("JWT_PUBLIC_KEY_PATH", "")
+# HS256 user tokens next to RS256/ES256 ones (only while migrating); off unless HS256 is the algorithm
+JWT_ALLOW_HS256 = os.getenv("JWT_ALLOW_HS256", "true" if JWT_ALGORITHM == "HS256" else "false").lower() == "true"
+# Service-to-service tokens are HS256 with the shared secret and only valid for their scope
+CACHE_INVALIDATE_SCOPE = "cache-invalidate"
+# Verified tokens kept, and the longest a token is trusted without re-verification
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+# Seconds between checks whether the public key file changed
+KEY_CHECK_INTERVAL = float(os.getenv("JWT_KEY_CHECK_INTERVAL", 60))
+
+ASYMMETRIC = ("RS256", "ES256")
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://localhost:8003/token")
+
+
+class PublicKey:
+    """Public key from JWT_PUBLIC_KEY or a PEM file; the file is re-read after it changed (key rotation)."""
+
+    def __init__(self, pem=JWT_PUBLIC_KEY, path=JWT_PUBLIC_KEY_PATH, check_interval=KEY_CHECK_INTERVAL):
+        self.pem = pem
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.pem and not self.path:
+            return self.pem
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    mtime = os.stat(self.path).st_mtime
+                    if mtime != self._mtime:
+                        with open(self.path) as fh:
+                            self.pem = fh.read()
+                        self._mtime = mtime
+                    self._next_check = now + self.check_interval
+        return self.pem
+
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens and remembers the verified ones in a bounded LRU,
+    so a dashboard polling several endpoints pays for signature checks once per
+    token instead of once per request. A cached token is trusted until its exp
+    (or at most ttl seconds); failures are never cached.
+    """
+
+    def __init__(self, algorithm=JWT_ALGORITHM, secret=JWT_SECRET_KEY, public_key=None, allow_hs256=JWT_ALLOW_HS256,
+                 max_entries=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        if algorithm not in ASYMMETRIC + ("HS256",):
+            raise ValueError(f"Unsupported JWT_ALGORITHM '{algorithm}', expected HS256, RS256 or ES256")
+        self.algorithm = algorithm
+        self.secret = secret
+        self.public_key = public_key or (PublicKey() if algorithm in ASYMMETRIC else None)
+        self.allow_hs256 = allow_hs256 or algorithm == "HS256"
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # token -> (expires_at, username)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, token):
+        # Each algorithm has its own key, so a token cannot pick a weaker one (no alg confusion)
+        alg = jwt.get_unverified_header(token).get("alg")
+        if alg == self.algorithm and alg in ASYMMETRIC:
+            return self.public_key.get(), alg
+        if alg == "HS256" and self.allow_hs256:
+            return self.secret, alg
+        raise JWTError(f"Algorithm {alg} not accepted")
+
+    def _verify(self, token):
+        key, alg = self._key(token)
+        payload = jwt.decode(token, key, algorithms=[alg])
+        if "scope" in payload:
+            raise JWTError("Service token used as user token")
+        username = payload.get("sub")
+        if username is None:
+            raise JWTError("Token has no subject")
+        expires_at = time.time() + self.ttl
+        if "exp" in payload:
+            expires_at = min(expires_at, float(payload["exp"]))
+        return username, expires_at
+
+    def username(self, token):
+        """Subject of a valid token; raises JWTError otherwise."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[token]
+            self.misses += 1
+
+        username, expires_at = self._verify(token)
+        with self._lock:
+            self._entries[token] = (expires_at, username)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return username
+
+    def service(self, token, scope):
+        """Subject of an HS256 service token carrying scope; not cached, so it never passes as a user token."""
+        if jwt.get_unverified_header(token).get("alg") != "HS256":
+            raise JWTError("Service tokens are HS256")
+        payload = jwt.decode(token, self.secret, algorithms=["HS256"])
+        if payload.get("scope") != scope or payload.get("sub") is None:
+            raise JWTError(f"Token not valid for {scope}")
+        return payload["sub"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"algorithm": self.algorithm, "entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+verifier = TokenVerifier()
+
+
+def decode_username(token: str):
+    try:
+        return verifier.username(token)
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+
+def verify_token(token: str = Depends(oauth2_scheme)):
+    return decode_username(token)
+
+
+def verify_cache_invalidate(token: str = Depends(oauth2_scheme)):
+    """User token, or the service token ingest/optimization send after writing."""
+    try:
+        return verifier.service(token, CACHE_INVALIDATE_SCOPE)
+    except JWTError:
+        return decode_username(token)
@@ -0,0 +1,516 @@
+import os
+import json
+import time
+import zlib
+import threading
+
+from common.batch_writer import is_transient, isolate
+from common.storage import record_lines, parse_line
+
+# Defaults, overridable per service via environment
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "true").lower() == "true"
+SPOOL_DIR = os.getenv("SPOOL_DIR")   # default: .spool next to the service
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 1024 ** 3))                # oldest segments go beyond this
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 ** 2))   # a new segment file after this size
+SPOOL_REPLAY_LINES = int(os.getenv("SPOOL_REPLAY_LINES", 5000))               # points per replayed write
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "true").lower() == "true"
+SPOOL_RETRY_BASE = float(os.getenv("SPOOL_RETRY_BASE", 1.0))                  # seconds between replay attempts, doubled
+SPOOL_RETRY_MAX = float(os.getenv("SPOOL_RETRY_MAX", 30.0))
+# Compaction runs while the database is down and this many sealed segments wait
+SPOOL_COMPACT_SEGMENTS = int(os.getenv("SPOOL_COMPACT_SEGMENTS", 4))
+SPOOL_COMPACT_BYTES = int(os.getenv("SPOOL_COMPACT_BYTES", 64 * 1024 ** 2))  # input per compaction run
+# After this many failed replays of the same batch it is split to find points storage refuses
+SPOOL_HEAD_MAX_FAILURES = int(os.getenv("SPOOL_HEAD_MAX_FAILURES", 10))
+# Points storage refuses for good are kept here for inspection, up to this size
+SPOOL_DEAD_LETTER_BYTES = int(os.getenv("SPOOL_DEAD_LETTER_BYTES", 64 * 1024 ** 2))
+
+HEADER = b"#spool"
+CURSOR_FILE = "cursor.json"
+CURSOR_BYTES = 128   # fixed size, rewritten in place
+DEAD_LETTER_FILE = "dead_letter.lp"
+
+
+def _stamp(line, now_ns):
+    # Replay can be hours later, so points without a time get the time they were spooled
+    return line if line.rsplit(" ", 1)[-1].lstrip("-").isdigit() else f"{line} {now_ns}"
+
+
+def _frame(lines):
+    payload = ("\n".join(lines) + "\n").encode()
+    return b"%s %d %d %08x\n" % (HEADER, len(lines), len(payload), zlib.crc32(payload)) + payload
+
+
+def _parse_header(header):
+    """(points, payload bytes, crc) of a frame header line, None if it is not one."""
+    parts = header.split()
+    if len(parts) != 4 or parts[0] != HEADER or not header.endswith(b"\n"):
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3], 16)
+    except ValueError:
+        return None
+
+
+def _point_key(line):
+    # Same series, fields and time: the later line overwrites the earlier one in storage
+    measurement, tags, fields, ts = parse_line(line)
+    return measurement, tuple(sorted(tags.items())), tuple(sorted(fields)), ts
+
+
+class Spool:
+    """
+    Durable write-ahead spool for a BatchingWriter: batches the database did not
+    take are appended to segment files (line protocol, one checksummed frame per
+    batch) and replayed in order by a background thread once writes succeed again.
+    While anything is spooled, new batches are appended too, so the database sees
+    points in the order they were written.
+
+    The read position is kept in cursor.json; a crash replays at most one batch
+    twice, which storage absorbs (same series and time overwrites). Sealed
+    segments are compacted during an outage, dropping points that a later point
+    of the same series and time overwrites. Beyond max_bytes the oldest segments
+    are dropped.
+
+    Only outages belong in the spool: points storage refuses for good (4xx such
+    as a field type conflict) are moved to dead_letter.lp with the error, so one
+    bad point cannot hold up everything behind it. A batch that keeps failing
+    with errors that look transient is split after head_max_failures attempts;
+    if parts of it are written, storage is up and the rest is dead-lettered.
+    """
+
+    def __init__(self, directory, max_bytes=SPOOL_MAX_BYTES, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 replay_lines=SPOOL_REPLAY_LINES, fsync=SPOOL_FSYNC, retry_base=SPOOL_RETRY_BASE,
+                 retry_max=SPOOL_RETRY_MAX, compact_segments=SPOOL_COMPACT_SEGMENTS,
+                 compact_bytes=SPOOL_COMPACT_BYTES, head_max_failures=SPOOL_HEAD_MAX_FAILURES,
+                 dead_letter_bytes=SPOOL_DEAD_LETTER_BYTES, name="spool"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.replay_lines = max(1, replay_lines)
+        self.fsync = fsync
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.compact_segments = compact_segments
+        self.compact_bytes = compact_bytes
+        self.head_max_failures = max(1, head_max_failures)
+        self.dead_letter_bytes = dead_letter_bytes
+        self.name = name
+
+        self._lock = threading.Condition(threading.RLock())
+        self._opened = False
+        self._segments = {}        # seq -> [file bytes, points not replayed yet], oldest first
+        self._cursor = (None, 0)   # segment and offset of the next frame to replay
+        self._compacted = 0        # segments up to this seq went through compaction
+        self._next_seq = 1
+        self._active = None        # (seq, append handle)
+        self._reader = None        # (seq, read handle)
+        self._cursor_fd = None
+        self._points = 0
+        self._thread = None
+        self._stopping = False
+        self._send = None
+        self._on_replayed = None
+        self._probe = None
+        self._head_failures = 0
+
+        self._stats = {
+            "appended": 0, "replayed": 0, "dropped": 0, "compacted": 0, "corrupt_frames": 0,
+            "replay_batches": 0, "replay_failures": 0, "dead_lettered": 0, "dead_letter_dropped": 0,
+            "last_error": None,
+        }
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}.seg")
+
+    # --- opening (on first use, called with the lock held) ---
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(os.path.join(self.directory, "compact.tmp")):
+            os.remove(os.path.join(self.directory, "compact.tmp"))
+        state = {}
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as fh:
+                state = json.load(fh)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[{self.name}] ignoring unreadable spool cursor ({e}), replaying from the start")
+        cursor_seq, cursor_offset = state.get("segment"), state.get("offset", 0)
+        self._compacted = state.get("compacted", 0)
+
+        seqs = sorted(int(n[:-4]) for n in os.listdir(self.directory) if n.endswith(".seg") and n[:-4].isdigit())
+        for seq in seqs:
+            if cursor_seq is not None and seq < cursor_seq:
+                # Replayed before the restart, only the deletion was missed
+                os.remove(self._path(seq))
+                continue
+            self._segments[seq] = list(self._scan(seq, cursor_offset if seq == cursor_seq else 0))
+        if self._segments:
+            first = next(iter(self._segments))
+            self._cursor = (first, cursor_offset if first == cursor_seq else 0)
+        self._points = sum(points for _, points in self._segments.values())
+        self._next_seq = max([*seqs, cursor_seq or 0, self._compacted]) + 1
+        self._opened = True
+        if self._points:
+            print(f"[{self.name}] {self._points} spooled points from a previous run waiting for replay")
+
+    def _scan(self, seq, start):
+        """(file size, points after start) of a segment; a torn last frame is cut off."""
+        points, good = 0, start
+        with open(self._path(seq), "r+b") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            fh.seek(start)
+            while True:
+                frame = _parse_header(fh.readline(128))
+                if frame is None or fh.tell() + frame[1] > size:
+                    break
+                fh.seek(frame[1], os.SEEK_CUR)
+                good = fh.tell()
+                points += frame[0]
+            if good < size:
+                print(f"[{self.name}] truncating torn frame at the end of {self._path(seq)}")
+                fh.truncate(good)
+        return good, points
+
+    # --- appending ---
+
+    def append(self, records):
+        """Writes records to the newest segment; returns the number of points spooled."""
+        now_ns = time.time_ns()
+        lines = [_stamp(line, now_ns) for line in record_lines(records)]
+        if not lines:
+            return 0
+        frame = _frame(lines)
+        with self._lock:
+            self._open()
+            self._make_room(len(frame))
+            if self._active is None or self._segments[self._active[0]][0] >= self.segment_bytes:
+                self._rotate()
+            seq, fh = self._active
+            fh.write(frame)
+            fh.flush()
+            if self.fsync:
+                os.fsync(fh.fileno())
+            self._segments[seq][0] += len(frame)
+            self._segments[seq][1] += len(lines)
+            self._points += len(lines)
+            self._stats["appended"] += len(lines)
+            self._lock.notify_all()
+        return len(lines)
+
+    def append_if_pending(self, records):
+        """Appends only while earlier points are still spooled, so they are not overtaken."""
+        with self._lock:
+            self._open()
+            if not self._points:
+                return False
+            self.append(records)
+            return True
+
+    def _rotate(self):
+        if self._active is not None:
+            self._active[1].close()
+        seq = self._next_seq
+        self._next_seq += 1
+        self._active = (seq, open(self._path(seq), "ab"))
+        self._segments[seq] = [0, 0]
+        if self._cursor[0] is None:
+            self._cursor = (seq, 0)
+
+    def _make_room(self, needed):
+        while self._segments and sum(size for size, _ in self._segments.values()) + needed > self.max_bytes:
+            seq, (size, points) = next(iter(self._segments.items()))
+            self._remove(seq)
+            self._points -= points
+            self._stats["dropped"] += points
+            print(f"[{self.name}] spool over {self.max_bytes} bytes, dropped {points} oldest points")
+
+    def _remove(self, seq):
+        if self._active is not None and self._active[0] == seq:
+            self._active[1].close()
+            self._active = None
+        if self._reader is not None and self._reader[0] == seq:
+            self._reader[1].close()
+            self._reader = None
+        os.remove(self._path(seq))
+        del self._segments[seq]
+        if self._cursor[0] == seq:
+            self._cursor = (next(iter(self._segments)), 0) if self._segments else (None, 0)
+            self._save_cursor()
+
+    def _save_cursor(self):
+        # Saved after every replayed batch: one small in-place write instead of a
+        # rename, which costs as much as the replay itself on some filesystems
+        if self._cursor_fd is None:
+            self._cursor_fd = os.open(os.path.join(self.directory, CURSOR_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        state = json.dumps({"segment": self._cursor[0], "offset": self._cursor[1], "compacted": self._compacted})
+        os.pwrite(self._cursor_fd, state.encode().ljust(CURSOR_BYTES), 0)
+
+    # --- replay ---
+
+    def _read(self):
+        """(segment, end offset, lines) of the next frames of the cursor segment, None if nothing is due."""
+        seq, offset = self._cursor
+        while seq is not None and offset >= self._segments[seq][0]:
+            if self._active is not None and self._active[0] == seq:
+                return None
+            # Nothing left in a sealed segment (its frames were damaged or torn)
+            self._remove(seq)
+            seq, offset = self._cursor
+        if seq is None:
+            return None
+        if self._reader is None or self._reader[0] != seq:
+            if self._reader is not None:
+                self._reader[1].close()
+            self._reader = (seq, open(self._path(seq), "rb"))
+        fh = self._reader[1]
+        fh.seek(offset)
+        size = self._segments[seq][0]
+        lines = []
+        while offset < size and len(lines) < self.replay_lines:
+            frame = _parse_header(fh.readline(128))
+            payload = fh.read(frame[1]) if frame is not None else b""
+            if frame is None or len(payload) != frame[1] or zlib.crc32(payload) != frame[2]:
+                # Nothing after a damaged frame can be trusted to be framed correctly
+                self._stats["corrupt_frames"] += 1
+                print(f"[{self.name}] damaged frame in {self._path(seq)} at byte {offset}, skipping the rest")
+                return seq, size, lines
+            lines.extend(payload.decode().splitlines())
+            offset = fh.tell()
+        return seq, offset, lines
+
+    def _advance(self, seq, end, count):
+        segment = self._segments.get(seq)
+        if segment is None:
+            return   # dropped by the size cap meanwhile
+        count = min(count, segment[1])
+        segment[1] -= count
+        self._points -= count
+        if end >= segment[0]:
+            self._remove(seq)
+        else:
+            self._cursor = (seq, end)
+            self._save_cursor()
+
+    def replay_once(self, send, force=False):
+        """
+        Sends the next batch of spooled points with send(lines) and returns the
+        lines written (empty if nothing is spooled). Points storage refuses go to
+        the dead letter file. Transient errors propagate and the batch stays
+        spooled; with force, any error splits the batch (see isolate()).
+        """
+        with self._lock:
+            self._open()
+            batch = self._read()
+        if batch is None:
+            return []
+        seq, end, lines = batch
+        refused = []
+        if lines:
+            retryable = (lambda e: False) if force else is_transient
+            refused, error = isolate(send, lines, retryable=retryable, probe=self._probe)
+            if refused:
+                self.dead_letter([lines[i] for i in refused], error)
+        with self._lock:
+            self._advance(seq, end, len(lines))
+            self._stats["replayed"] += len(lines) - len(refused)
+            self._stats["replay_batches"] += 1
+            self._head_failures = 0
+            self._lock.notify_all()
+        if refused:
+            refused = set(refused)
+            return [line for i, line in enumerate(lines) if i not in refused]
+        return lines
+
+    def dead_letter(self, records, error):
+        """Keeps points storage refused for good, with the error, in dead_letter.lp."""
+        lines = list(record_lines(records))
+        if not lines:
+            return
+        reason = (str(error).splitlines() or [type(error).__name__])[0]
+        header = f"# {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())} {reason}\n"
+        data = (header + "\n".join(lines) + "\n").encode()
+        with self._lock:
+            self._open()
+            path = os.path.join(self.directory, DEAD_LETTER_FILE)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size + len(data) > self.dead_letter_bytes:
+                self._stats["dead_letter_dropped"] += len(lines)
+                print(f"[{self.name}] dead letter file full, dropped {len(lines)} refused points")
+                return
+            with open(path, "ab") as fh:
+                fh.write(data)
+            self._stats["dead_lettered"] += len(lines)
+        print(f"[{self.name}] {len(lines)} refused points moved to {path}")
+
+    def start(self, send, on_replayed=None, probe=None):
+        """
+        Starts the background replay with send(lines); on_replayed(lines) after each
+        replayed batch. probe() tells whether storage is reachable (see isolate()).
+        """
+        with self._lock:
+            self._send = send
+            self._on_replayed = on_replayed
+            self._probe = probe
+            self._stopping = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name=f"{self.name}-replay")
+                self._thread.start()
+
+    def _run(self):
+        delay = self.retry_base
+        while True:
+            with self._lock:
+                self._open()
+                while not self._stopping and not self._points:
+                    self._lock.wait()
+                if self._stopping:
+                    return
+                # The same batch failed again and again: find out whether it is the batch or storage
+                force = self._head_failures > 0 and self._head_failures % self.head_max_failures == 0
+            try:
+                lines = self.replay_once(self._send, force=force)
+                delay = self.retry_base
+            except Exception as e:
+                with self._lock:
+                    self._head_failures += 1
+                    self._stats["replay_failures"] += 1
+                    self._stats["last_error"] = str(e)
+                print(f"[{self.name}] replay of {self._points} spooled points failed ({e}), retry in {delay:.0f}s")
+                # Nothing else to do while the database is down
+                self._maybe_compact()
+                with self._lock:
+                    if not self._stopping:
+                        self._lock.wait(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+            if lines and self._on_replayed is not None:
+                try:
+                    self._on_replayed(lines)
+                except Exception as e:
+                    print(f"[{self.name}] on_replayed hook failed: {e}")
+            if not self._points:
+                print(f"[{self.name}] spool replayed")
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            for handle in (self._active, self._reader):
+                if handle is not None:
+                    handle[1].close()
+            self._active = self._reader = None
+            if self._cursor_fd is not None:
+                os.close(self._cursor_fd)
+                self._cursor_fd = None
+
+    # --- compaction ---
+
+    def _compactable(self):
+        # Sealed segments behind the one being replayed and not compacted yet
+        cursor_seq = self._cursor[0]
+        active_seq = self._active[0] if self._active is not None else None
+        return [seq for seq in self._segments
+                if seq != cursor_seq and seq != active_seq and seq > self._compacted]
+
+    def _maybe_compact(self):
+        with self._lock:
+            due = len(self._compactable()) >= self.compact_segments
+        if due:
+            try:
+                self.compact()
+            except OSError as e:
+                print(f"[{self.name}] spool compaction failed: {e}")
+
+    def compact(self):
+        """
+        Merges sealed, not yet replayed segments into one, keeping only the newest
+        point per series, field set and time. Returns the number of points removed.
+        """
+        with self._lock:
+            self._open()
+            group, total = [], 0
+            for seq in self._compactable():
+                if total >= self.compact_bytes:
+                    break
+                group.append(seq)
+                total += self._segments[seq][0]
+        if not group:
+            return 0
+
+        # Segments behind the cursor are only touched here and by the size cap, so the
+        # heavy part runs without the lock; the cap is checked again before swapping
+        lines, bad = [], 0
+        for seq in group:
+            with open(self._path(seq), "rb") as fh:
+                while True:
+                    frame = _parse_header(fh.readline(128))
+                    if frame is None:
+                        break
+                    payload = fh.read(frame[1])
+                    if len(payload) != frame[1] or zlib.crc32(payload) != frame[2]:
+                        bad += 1
+                        break
+                    lines.extend(payload.decode().splitlines())
+        kept, seen = [], set()
+        for line in reversed(lines):
+            try:
+                key = _point_key(line)
+            except (ValueError, IndexError):
+                key = line
+            if key not in seen:
+                seen.add(key)
+                kept.append(line)
+        kept.reverse()
+
+        tmp = os.path.join(self.directory, "compact.tmp")
+        with open(tmp, "wb") as fh:
+            for i in range(0, len(kept), self.replay_lines):
+                fh.write(_frame(kept[i:i + self.replay_lines]))
+            fh.flush()
+            os.fsync(fh.fileno())
+            size = fh.tell()
+
+        with self._lock:
+            if any(seq not in self._segments or seq == self._cursor[0] for seq in group):
+                os.remove(tmp)
+                return 0
+            before = sum(self._segments[seq][1] for seq in group)
+            os.replace(tmp, self._path(group[0]))
+            for seq in group[1:]:
+                self._remove(seq)
+            self._segments[group[0]] = [size, len(kept)]
+            removed = before - len(kept)
+            self._points -= removed
+            self._compacted = group[-1]
+            self._stats["compacted"] += removed
+            self._stats["corrupt_frames"] += bad
+            self._save_cursor()
+        print(f"[{self.name}] compacted {len(group)} segments: {before} -> {len(kept)} points")
+        return removed
+
+    def pending(self):
+        with self._lock:
+            return self._points
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["pending_points"] = self._points
+            s["segments"] = len(self._segments)
+            s["bytes"] = sum(size for size, _ in self._segments.values())
+            s["max_bytes"] = self.max_bytes
+        return s
+
+
+def make_spool(service_dir, name):
+    """The spool of a service (SPOOL_DIR or <service_dir>/.spool), None if SPOOL_ENABLED is off."""
+    if not SPOOL_ENABLED:
+        return None
+    return Spool(SPOOL_DIR or os.path.join(service_dir, ".spool"), name=name)
@@ -0,0 +1,611 @@
+import io
+import os
+import re
+import json
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# "influx" (InfluxDB 2.x server) or "sqlite" (embedded file, for edge gateways and CI)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "influx")
+
+INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN", "my-super-secret-auth-token")
+INFLUX_ORG = os.getenv("INFLUX_ORG", "myorg")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "hems_data")
+# Simultaneous HTTP connections of the async client (api_service)
+INFLUX_POOL_SIZE = int(os.getenv("INFLUX_POOL_SIZE", 20))
+INFLUX_TIMEOUT_MS = int(os.getenv("INFLUX_TIMEOUT_MS", 10000))
+
+# Shared by all services on one device; WAL lets them read while one writes
+SQLITE_PATH = os.getenv("SQLITE_PATH", "hems.sqlite3")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+# Rows per chunk when parsing Flux CSV results
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 10000))
+
+# Aggregates every backend supports: Flux function -> SQL function
+AGGREGATES = {"mean": "AVG", "min": "MIN", "max": "MAX", "sum": "SUM", "count": "COUNT"}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_ns(t):
+    """Epoch nanoseconds of a datetime (naive = UTC), RFC3339 string, numpy/pandas time or int."""
+    if isinstance(t, int):
+        return t
+    if isinstance(t, str):
+        t = datetime.fromisoformat(t.replace("Z", "+00:00"))
+    if hasattr(t, "astype"):
+        # numpy datetime64
+        return int(t.astype("datetime64[ns]").astype("int64"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    d = t - EPOCH
+    # pandas Timestamps carry nanoseconds beyond the microseconds
+    return (d.days * 86400 + d.seconds) * 1_000_000_000 + d.microseconds * 1000 + getattr(t, "nanosecond", 0)
+
+
+def to_datetime(t):
+    """Aware UTC datetime of the same inputs as to_ns (None stays None)."""
+    if t is None:
+        return None
+    if isinstance(t, datetime) and t.tzinfo is not None:
+        return t
+    return EPOCH + timedelta(microseconds=to_ns(t) // 1000)
+
+
+def empty_frame():
+    import pandas as pd
+    return pd.DataFrame({"_time": pd.Series([], dtype="datetime64[ns, UTC]")})
+
+
+def merge_series(df):
+    """
+    One row per _time with every numeric field summed over the series, tag
+    columns dropped: e.g. the per-source energy_flow series as one total.
+    A field none of the series has at a time stays NaN.
+    """
+    import pandas as pd
+    fields = [c for c, dtype in df.dtypes.items() if not c.startswith("_")
+              and pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+    if df.empty:
+        return df[["_time", *fields]].reset_index(drop=True)
+    return df.groupby("_time", sort=True)[fields].sum(min_count=1).reset_index()
+
+
+def merge_last(df):
+    """One row with the newest value of every field across the series of a last() result."""
+    # Sorted by time, so carrying values forward leaves the newest of each field in the last row
+    return merge_series(df).ffill().tail(1).reset_index(drop=True)
+
+
+# --- Line protocol -----------------------------------------------------------
+
+def _split(s, sep, quotes=False, maxsplit=-1):
+    """Splits on unescaped sep (and outside double quotes if quotes=True)."""
+    parts, start, i, quoted = [], 0, 0, False
+    while i < len(s):
+        c = s[i]
+        if c == "\\":
+            i += 2
+            continue
+        if quotes and c == '"':
+            quoted = not quoted
+        elif c == sep and not quoted and maxsplit != 0:
+            parts.append(s[start:i])
+            start = i + 1
+            maxsplit -= 1
+        i += 1
+    parts.append(s[start:])
+    return parts
+
+
+def _unescape(s):
+    return s.replace("\\,", ",").replace("\\=", "=").replace("\\ ", " ").replace("\\\\", "\\")
+
+
+def _field_value(v):
+    if v.startswith('"'):
+        return v[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    if v[-1] in "iu" and v[:-1].lstrip("-").isdigit():
+        return int(v[:-1])
+    if v in ("t", "T", "true", "True", "TRUE"):
+        return True
+    if v in ("f", "F", "false", "False", "FALSE"):
+        return False
+    return float(v)
+
+
+def parse_line(line):
+    """(measurement, tags, fields, time ns or None) of one line protocol line."""
+    line = line.strip()
+    if "\\" not in line and '"' not in line:
+        # Fast path for the common case without escapes or string fields
+        parts = line.split(" ")
+        key, field_set = parts[0], parts[1]
+        timestamp = parts[2] if len(parts) > 2 else None
+        measurement, *tag_set = key.split(",")
+        tags = dict(t.split("=", 1) for t in tag_set)
+        fields = {k: _field_value(v) for k, v in (f.split("=", 1) for f in field_set.split(","))}
+    else:
+        parts = [p for p in _split(line, " ", quotes=True) if p]
+        key, field_set = parts[0], parts[1]
+        timestamp = parts[2] if len(parts) > 2 else None
+        measurement, *tag_set = _split(key, ",")
+        tags = {}
+        for t in tag_set:
+            k, v = _split(t, "=", maxsplit=1)
+            tags[_unescape(k)] = _unescape(v)
+        fields = {}
+        for f in _split(field_set, ",", quotes=True):
+            k, v = _split(f, "=", maxsplit=1)
+            fields[_unescape(k)] = _field_value(v)
+        measurement = _unescape(measurement)
+    if not fields:
+        raise ValueError(f"Line without fields: {line!r}")
+    return measurement, tags, fields, int(timestamp) if timestamp else None
+
+
+def record_lines(records):
+    """Line protocol of Points / line protocol strings (as the BatchingWriter queues them)."""
+    for r in records:
+        if isinstance(r, str):
+            yield from (line for line in r.splitlines() if line.strip() and not line.startswith("#"))
+        elif isinstance(r, bytes):
+            yield from record_lines([r.decode()])
+        else:
+            yield r.to_line_protocol()
+
+
+# --- Interface ---------------------------------------------------------------
+
+class Storage(ABC):
+    """
+    Time series storage used by all services. Results are DataFrames pivoted
+    like a Flux pivot(): one row per series and timestamp with a UTC `_time`
+    column, `_measurement`, one column per tag and one per field, sorted by _time.
+    Time bounds are datetimes or RFC3339 strings; ranges include start, exclude stop.
+    `tags` limits a query to series with these tag values; None as value means
+    the series must not have that tag.
+
+    Methods are blocking; `await call(name, ...)` runs one from the event loop.
+    Constructing a backend never connects; pandas is imported on first query.
+    """
+    name = None
+    # Server-side rollup tiers (energy_flow_15m/1h/1d) are maintained and may be read
+    has_rollups = False
+
+    @abstractmethod
+    def write(self, records):
+        """Stores Points or line protocol strings (same series and time overwrites)."""
+
+    @abstractmethod
+    def query_range(self, measurement, start, stop=None, fields=None, tags=None):
+        ...
+
+    @abstractmethod
+    def aggregate(self, measurement, start, stop=None, every=timedelta(hours=1), fields=None, fn="mean", shift=None,
+                  tags=None):
+        """
+        fn over windows of length `every` aligned to the epoch, labelled with the
+        window end (like aggregateWindow). shift is added to the times first.
+        """
+
+    @abstractmethod
+    def last(self, measurement, start, stop=None, fields=None, tags=None):
+        """Newest value of every field of every series in the range."""
+
+    @abstractmethod
+    def delete(self, measurement, start=None, stop=None):
+        ...
+
+    @abstractmethod
+    def ping(self):
+        """True if the backend is reachable (readiness probes)."""
+
+    async def call(self, name, *args, **kwargs):
+        return await asyncio.to_thread(getattr(self, name), *args, **kwargs)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+def _check_fn(fn):
+    if fn not in AGGREGATES:
+        raise ValueError(f"Unsupported aggregate '{fn}', expected one of {sorted(AGGREGATES)}")
+
+
+def _check_tags(tags):
+    # Tag keys end up in query texts, values are always passed as parameters
+    for key in tags or ():
+        if not re.fullmatch(r"[A-Za-z0-9_.-]+", key):
+            raise ValueError(f"Unsupported tag key '{key}' in tag filter")
+
+
+# --- InfluxDB ----------------------------------------------------------------
+
+# Influx bookkeeping columns never read into result frames
+META_COLUMNS = {"result", "table", "_start", "_stop"}
+# Strings are tags and similar repeated values, stored once per distinct value
+_CSV_DTYPES = {"double": "float64", "boolean": "boolean", "string": "category"}
+
+
+def read_annotated_csv(text):
+    """
+    Frame from a Flux annotated CSV response, parsed column-wise by pandas' C reader.
+    Tables with different schemas come as separate blocks and are concatenated;
+    columns are typed from the #datatype annotation (times become UTC datetimes).
+    """
+    import pandas as pd
+    frames = []
+    for block in text.replace("\r\n", "\n").split("\n\n"):
+        if not block.strip():
+            continue
+        datatypes_line, _, rest = block.partition("\n")
+        header = rest.partition("\n")[0].split(",")
+        if "error" in header and "_time" not in header:
+            raise RuntimeError(f"Flux query failed: {rest.strip()}")
+        datatypes = datatypes_line.split(",")
+        # First column is the (empty) annotation column
+        columns = {name: kind for name, kind in zip(header[1:], datatypes[1:]) if name not in META_COLUMNS}
+        reader = pd.read_csv(io.BytesIO(rest.encode()), usecols=list(columns), chunksize=CSV_CHUNK_ROWS,
+                             dtype={n: _CSV_DTYPES[k] for n, k in columns.items() if k in _CSV_DTYPES})
+        # Chunks keep the tokenizer's buffers and the raw time strings small
+        for df in reader:
+            for name, kind in columns.items():
+                if kind.startswith("dateTime"):
+                    df[name] = pd.to_datetime(df[name], utc=True, format="ISO8601")
+            frames.append(df)
+    if not frames:
+        return empty_frame()
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return df if "_time" in df.columns else empty_frame()
+
+
+# Query values are passed as parameters. influxdb-client sends them as extern
+# `option q_name = ...` statements (not the `params` record), so the Flux refers
+# to them by name; the q_ prefix keeps them clear of Flux builtins.
+@lru_cache(maxsize=None)
+def series_flux(filter_fields=False, shift=False, window=None, last=False, tag_filter=()):
+    """
+    Flux for a pivoted series between q_start and q_stop. All values are passed
+    as query parameters, so there are only a handful of distinct query texts.
+    tag_filter is a tuple of (tag key, present); the values are q_tag_<i>.
+    """
+    steps = [
+        "from(bucket: q_bucket)",
+        "|> range(start: q_start, stop: q_stop)",
+        '|> filter(fn: (r) => r["_measurement"] == q_measurement)',
+    ]
+    for i, (key, present) in enumerate(tag_filter):
+        steps.append(f'|> filter(fn: (r) => r["{key}"] == q_tag_{i})' if present
+                     else f'|> filter(fn: (r) => not exists r["{key}"])')
+    if filter_fields:
+        steps.append('|> filter(fn: (r) => contains(value: r["_field"], set: q_fields))')
+    if shift:
+        steps.append("|> timeShift(duration: q_shift)")
+    if window:
+        steps.append(f"|> aggregateWindow(every: q_every, fn: {window}, createEmpty: false)")
+    if last:
+        steps.append("|> last()")
+    steps += [
+        '|> drop(columns: ["_start", "_stop"])',
+        '|> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")',
+        '|> sort(columns: ["_time"])',
+    ]
+    return "\n  ".join(steps)
+
+
+class InfluxStorage(Storage):
+    """
+    InfluxDB 2.x. Clients are created on first use, so importing or starting a
+    service never needs a reachable server. Queries read raw annotated CSV into
+    typed frames (no per-row records); call() uses the async client.
+    """
+    name = "influx"
+    has_rollups = True
+
+    def __init__(self, url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG, bucket=INFLUX_BUCKET):
+        self.url = url
+        self.token = token
+        self.org = org
+        self.bucket = bucket
+        self._client = None
+        self._write_api = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from influxdb_client import InfluxDBClient
+                self._client = InfluxDBClient(url=self.url, token=self.token, org=self.org)
+            return self._client
+
+    @property
+    def write_api(self):
+        if self._write_api is None:
+            from influxdb_client.client.write_api import SYNCHRONOUS
+            self._write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        return self._write_api
+
+    @staticmethod
+    def _dialect():
+        from influxdb_client.domain.dialect import Dialect
+        # Only the datatype annotation is needed to type the columns
+        return Dialect(header=True, delimiter=",", annotations=["datatype"], comment_prefix="#",
+                       date_time_format="RFC3339")
+
+    def write(self, records):
+        self.write_api.write(bucket=self.bucket, org=self.org, record=records)
+
+    def flux(self, query, params=None):
+        """Runs any Flux query and returns its tables (Influx-only features such as rollups)."""
+        return self.client.query_api().query(query=query, org=self.org, params=params)
+
+    def _params(self, measurement, start, stop, fields, tags):
+        params = {"q_bucket": self.bucket, "q_measurement": measurement,
+                  "q_start": to_datetime(start), "q_stop": to_datetime(stop) or datetime.now(timezone.utc)}
+        if fields:
+            params["q_fields"] = list(fields)
+        _check_tags(tags)
+        tag_filter = tuple((key, tags[key] is not None) for key in sorted(tags or ()))
+        for i, (key, present) in enumerate(tag_filter):
+            if present:
+                params[f"q_tag_{i}"] = str(tags[key])
+        return params, tag_filter
+
+    # Each _plan_<method> returns (query, params) for the sync and the async path
+    def _plan_query_range(self, measurement, start, stop=None, fields=None, tags=None):
+        params, tag_filter = self._params(measurement, start, stop, fields, tags)
+        return series_flux(filter_fields=bool(fields), tag_filter=tag_filter), params
+
+    def _plan_aggregate(self, measurement, start, stop=None, every=timedelta(hours=1), fields=None, fn="mean", shift=None,
+                        tags=None):
+        _check_fn(fn)
+        params, tag_filter = self._params(measurement, start, stop, fields, tags)
+        params["q_every"] = every
+        if shift:
+            params["q_shift"] = shift
+        return series_flux(filter_fields=bool(fields), shift=bool(shift), window=fn, tag_filter=tag_filter), params
+
+    def _plan_last(self, measurement, start, stop=None, fields=None, tags=None):
+        params, tag_filter = self._params(measurement, start, stop, fields, tags)
+        return series_flux(filter_fields=bool(fields), last=True, tag_filter=tag_filter), params
+
+    @staticmethod
+    def _finish(df):
+        return df.sort_values("_time", kind="stable", ignore_index=True)
+
+    def _frame(self, query, params):
+        response = self.client.query_api().query_raw(query=query, org=self.org, dialect=self._dialect(), params=params)
+        return self._finish(read_annotated_csv(response.data.decode()))
+
+    def query_range(self, *args, **kwargs):
+        return self._frame(*self._plan_query_range(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs):
+        return self._frame(*self._plan_aggregate(*args, **kwargs))
+
+    def last(self, *args, **kwargs):
+        return self._frame(*self._plan_last(*args, **kwargs))
+
+    def delete(self, measurement, start=None, stop=None):
+        self.client.delete_api().delete(to_datetime(start) or EPOCH, to_datetime(stop) or datetime(2100, 1, 1, tzinfo=timezone.utc),
+                                        f'_measurement="{measurement}"', bucket=self.bucket, org=self.org)
+
+    def ping(self):
+        return self.client.ping()
+
+    def _get_async_client(self):
+        # The async client binds to the running event loop, so it is created on first use
+        if self._async_client is None:
+            from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+            self._async_client = InfluxDBClientAsync(url=self.url, token=self.token, org=self.org,
+                                                     timeout=INFLUX_TIMEOUT_MS, connection_pool_maxsize=INFLUX_POOL_SIZE)
+        return self._async_client
+
+    def _get_async_query_api(self):
+        return self._get_async_client().query_api()
+
+    async def call(self, name, *args, **kwargs):
+        if name == "ping":
+            return await self._get_async_client().ping()
+        plan = getattr(self, f"_plan_{name}", None)
+        if plan is None:
+            return await super().call(name, *args, **kwargs)
+        query, params = plan(*args, **kwargs)
+        text = await self._get_async_query_api().query_raw(query=query, org=self.org, dialect=self._dialect(),
+                                                           params=params)
+        df = read_annotated_csv(text)
+        # Free the CSV text before the sorted copy is made
+        del text
+        return self._finish(df)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        self.close()
+
+
+# --- SQLite ------------------------------------------------------------------
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    measurement TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    UNIQUE (measurement, tags)
+);
+CREATE TABLE IF NOT EXISTS points (
+    series_id INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value,
+    PRIMARY KEY (series_id, time, field)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded store in one SQLite file, no server needed (edge gateways, CI,
+    benchmarks). Points are kept per series (measurement + tags), time (ns)
+    and field, clustered by series and time so range scans read contiguous
+    pages. Aggregation runs in SQL. No rollup tiers: long ranges aggregate raw data.
+    """
+    name = "sqlite"
+    has_rollups = False
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._series_ids = {}      # (measurement, tags json) -> id
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        # One connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SQLITE_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _series_id(self, conn, measurement, tags):
+        key = (measurement, json.dumps(tags, sort_keys=True, separators=(",", ":")))
+        sid = self._series_ids.get(key)
+        if sid is None:
+            conn.execute("INSERT OR IGNORE INTO series (measurement, tags) VALUES (?, ?)", key)
+            sid = conn.execute("SELECT id FROM series WHERE measurement = ? AND tags = ?", key).fetchone()[0]
+            with self._lock:
+                self._series_ids[key] = sid
+        return sid
+
+    def write(self, records):
+        conn = self._conn()
+        now = None
+        rows = []
+        with conn:
+            for line in record_lines(records):
+                measurement, tags, fields, t = parse_line(line)
+                if t is None:
+                    now = now or to_ns(datetime.now(timezone.utc))
+                    t = now
+                sid = self._series_id(conn, measurement, tags)
+                rows.extend((sid, t, k, v) for k, v in fields.items())
+            conn.executemany("INSERT OR REPLACE INTO points (series_id, time, field, value) VALUES (?, ?, ?, ?)", rows)
+
+    def _series(self, conn, measurement, tags=None):
+        """{series id: tags} of a measurement, only those matching the tag filter."""
+        _check_tags(tags)
+        series = {sid: json.loads(t) for sid, t in
+                  conn.execute("SELECT id, tags FROM series WHERE measurement = ?", (measurement,))}
+        if tags:
+            series = {sid: t for sid, t in series.items()
+                      if all(t.get(k) == (None if v is None else str(v)) for k, v in tags.items())}
+        return series
+
+    def _where(self, series, start, stop, fields):
+        sql = f"series_id IN ({','.join('?' * len(series))}) AND time >= ? AND time < ?"
+        params = [*series, to_ns(start), to_ns(stop if stop is not None else datetime.now(timezone.utc))]
+        if fields:
+            sql += f" AND field IN ({','.join('?' * len(fields))})"
+            params += list(fields)
+        return sql, params
+
+    @staticmethod
+    def _pivot(df, measurement, series):
+        """Long (series_id, time, field, value) rows to the pivoted result frame."""
+        import pandas as pd
+        if df.empty:
+            return empty_frame()
+        wide = df.pivot(index=["series_id", "time"], columns="field", values="value").reset_index()
+        wide.columns.name = None
+        fields = sorted(c for c in wide.columns if c not in ("series_id", "time"))
+        out = {"_time": pd.to_datetime(wide["time"].to_numpy("int64"), unit="ns", utc=True),
+               "_measurement": pd.Categorical([measurement] * len(wide))}
+        for key in sorted({k for tags in series.values() for k in tags}):
+            out[key] = pd.Categorical(wide["series_id"].map({sid: tags.get(key) for sid, tags in series.items()}))
+        for name in fields:
+            out[name] = wide[name].infer_objects()
+        return pd.DataFrame(out).sort_values("_time", kind="stable", ignore_index=True)
+
+    def _select(self, select, measurement, start, stop, fields, tags, group=""):
+        import pandas as pd
+        conn = self._conn()
+        series = self._series(conn, measurement, tags)
+        if not series:
+            return empty_frame()
+        where, params = self._where(series, start, stop, fields)
+        df = pd.read_sql_query(f"SELECT {select} FROM points WHERE {where} {group}", conn, params=params)
+        return self._pivot(df, measurement, series)
+
+    def query_range(self, measurement, start, stop=None, fields=None, tags=None):
+        return self._select("series_id, time, field, value", measurement, start, stop, fields, tags)
+
+    def aggregate(self, measurement, start, stop=None, every=timedelta(hours=1), fields=None, fn="mean", shift=None,
+                  tags=None):
+        _check_fn(fn)
+        every_ns = int(every.total_seconds() * 1e9)
+        shift_ns = int(shift.total_seconds() * 1e9) if shift else 0
+        stop_ns = to_ns(stop if stop is not None else datetime.now(timezone.utc)) + shift_ns
+        # Window end as label, the last (partial) window ends at the range stop like aggregateWindow
+        select = (f"series_id, MIN(((time + {shift_ns}) / {every_ns} + 1) * {every_ns}, {stop_ns}) AS time, "
+                  f"field, {AGGREGATES[fn]}(value) AS value")
+        return self._select(select, measurement, start, stop, fields, tags,
+                            f"AND typeof(value) IN ('integer', 'real') "
+                            f"GROUP BY series_id, field, (points.time + {shift_ns}) / {every_ns}")
+
+    def last(self, measurement, start, stop=None, fields=None, tags=None):
+        # SQLite returns the other columns from the row holding MAX(time)
+        return self._select("series_id, MAX(time) AS time, field, value", measurement, start, stop, fields, tags,
+                            "GROUP BY series_id, field")
+
+    def ping(self):
+        return self._conn().execute("SELECT 1").fetchone() == (1,)
+
+    def delete(self, measurement, start=None, stop=None):
+        conn = self._conn()
+        series = self._series(conn, measurement)
+        if not series:
+            return
+        with conn:
+            where, params = self._where(series, start if start is not None else 0,
+                                        stop if stop is not None else 2 ** 62, None)
+            conn.execute(f"DELETE FROM points WHERE {where}", params)
+            if start is None and stop is None:
+                conn.execute("DELETE FROM series WHERE measurement = ?", (measurement,))
+                with self._lock:
+                    self._series_ids = {k: v for k, v in self._series_ids.items() if k[0] != measurement}
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+BACKENDS = {"influx": InfluxStorage, "sqlite": SQLiteStorage}
+
+
+def make_storage(name=STORAGE_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,111 @@
+import os
+import time
+
+from common.batch_writer import BatchingWriter
+from common.spool import Spool, DEAD_LETTER_FILE
+
+
+class FieldTypeConflict(Exception):
+    # Like influxdb-client's ApiException for a refused write
+    status = 422
+
+
+class Sink:
+    """send() for a BatchingWriter: refuses lines containing `bad`, fails everything while down."""
+
+    def __init__(self, bad_error=FieldTypeConflict):
+        self.lines = []
+        self.down = False
+        self.bad_error = bad_error
+
+    def send(self, records):
+        if self.down:
+            raise ConnectionError("storage unavailable")
+        if any("bad" in r for r in records):
+            raise self.bad_error("field type conflict")
+        self.lines.extend(records)
+
+    def ping(self):
+        return not self.down
+
+
+def make_writer(tmp_path, sink, **spool_args):
+    spool = Spool(str(tmp_path / "spool"), retry_base=0.01, retry_max=0.02, **spool_args)
+    writer = BatchingWriter(sink.send, batch_size=10, flush_interval=0.01, max_retries=1, retry_base=0.01,
+                            spool=spool, probe=sink.ping)
+    return writer, spool
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_refused_point_is_dead_lettered_and_does_not_block(tmp_path):
+    sink = Sink()
+    writer, spool = make_writer(tmp_path, sink)
+    errors = []
+    writer.submit(["m v=1 1", "m bad=1i 2", "m v=3 3"], on_done=lambda count, error: errors.append(error))
+    for i in range(20):
+        writer.submit([f"m v={i} {100 + i}"], on_done=lambda count, error: errors.append(error))
+    writer.flush(5)
+    writer.close(5)
+
+    assert len(sink.lines) == 22
+    assert spool.stats()["pending_points"] == 0
+    assert writer.stats()["refused"] == 1
+    assert [e for e in errors if e is not None] and errors.count(None) == 20
+    assert "m bad=1i 2" in (tmp_path / "spool" / DEAD_LETTER_FILE).read_text()
+
+
+def test_outage_is_replayed_in_order(tmp_path):
+    sink = Sink()
+    sink.down = True
+    writer, spool = make_writer(tmp_path, sink)
+    for i in range(30):
+        writer.submit([f"m v={i} {i}"])
+    writer.flush(5)
+    assert spool.pending() == 30
+
+    sink.down = False
+    for i in range(30, 40):
+        writer.submit([f"m v={i} {i}"])
+    writer.flush(5)
+    assert wait_for(lambda: not spool.pending())
+    writer.close(5)
+    assert [int(line.rsplit(" ", 1)[1]) for line in sink.lines] == list(range(40))
+
+
+def test_head_failing_with_transient_looking_error_is_moved_past(tmp_path):
+    # The bad line fails with an error that looks like an outage; storage itself is up
+    sink = Sink(bad_error=ConnectionResetError)
+    sink.down = True
+    writer, spool = make_writer(tmp_path, sink, head_max_failures=3)
+    writer.submit(["m bad=1 1"] + [f"m v={i} {i}" for i in range(2, 10)])
+    writer.flush(5)
+    sink.down = False
+    writer.submit(["m v=10 10"])
+    writer.flush(5)
+    assert wait_for(lambda: not spool.pending())
+    writer.close(5)
+
+    assert len(sink.lines) == 9
+    assert spool.stats()["dead_lettered"] == 1
+
+
+def test_spool_survives_restart(tmp_path):
+    spool = Spool(str(tmp_path / "spool"))
+    spool.append(["m v=1 1", "m v=2 2"])
+    spool.append(["m v=3 3"])
+    spool.stop()
+    with open(sorted(p for p in (tmp_path / "spool").iterdir() if p.suffix == ".seg")[-1], "ab") as fh:
+        fh.write(b"#spool 1 100 00000000\ntorn")
+
+    reopened = Spool(str(tmp_path / "spool"))
+    replayed = []
+    while reopened.replay_once(replayed.extend):
+        pass
+    assert replayed == ["m v=1 1", "m v=2 2", "m v=3 3"]
+    assert os.listdir(tmp_path / "spool") == ["cursor.json"]
@@ -0,0 +1,60 @@
+import os
+import re
+from datetime import timedelta
+
+import pytest
+
+from common.storage import InfluxStorage, Storage
+from common.verify_storage import Checks, open_storage, scratch_measurement, T0
+
+# The InfluxDB run needs a server: INFLUX_URL (and INFLUX_TOKEN/ORG/BUCKET) as for the services,
+# e.g. `docker compose up -d influxdb` and INFLUX_TEST=1
+INFLUX_TEST = os.getenv("INFLUX_TEST", "false").lower() in ("1", "true")
+
+
+BACKENDS = ["sqlite", pytest.param("influx", marks=pytest.mark.skipif(not INFLUX_TEST, reason="set INFLUX_TEST=1 with a server"))]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_conformance(backend):
+    storage = open_storage(backend)
+    try:
+        checks = Checks(storage, scratch_measurement())
+        assert checks.run(), f"failed: {checks.failed}"
+    finally:
+        storage.close()
+
+
+def test_incomplete_backend_fails_when_created():
+    class WriteOnly(Storage):
+        def write(self, records):
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnly()
+
+
+def extern_names(storage, plan, *args, **kwargs):
+    query, params = plan(*args, **kwargs)
+    # What influxdb-client actually sends: the values become extern `option` statements
+    body = storage.client.query_api()._create_query(query, None, params)
+    return query, {statement.assignment.id.name for statement in body.extern.body}
+
+
+@pytest.mark.parametrize("method, kwargs", [
+    ("query_range", {}),
+    ("query_range", {"fields": ["power"]}),
+    ("aggregate", {"every": timedelta(hours=1), "fields": ["power"], "shift": timedelta(minutes=-15)}),
+    ("last", {"fields": ["power"]}),
+    ("query_range", {"tags": {"algorithm": "lp_dispatch", "site": None}}),
+    ("aggregate", {"every": timedelta(hours=1), "tags": {"site": "a"}}),
+])
+def test_influx_queries_only_use_declared_parameters(method, kwargs):
+    storage = InfluxStorage(url="http://localhost:1", token="x", org="o", bucket="b")
+    try:
+        query, declared = extern_names(storage, getattr(storage, f"_plan_{method}"), "m", T0,
+                                       T0 + timedelta(hours=4), **kwargs)
+    finally:
+        storage.close()
+    assert "params." not in query
+    assert set(re.findall(r"\bq_\w+", query)) <= declared
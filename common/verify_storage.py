@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Conformance and performance checks every storage backend has to pass.
+# Writes into a scratch measurement and deletes it afterwards.
+#   python -m common.verify_storage --backend sqlite
+#   STORAGE_BACKEND=influx INFLUX_URL=http://localhost:8086 python -m common.verify_storage --points 200000
+# The conformance part also runs under pytest (common/test_storage.py).
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.storage import BACKENDS, SQLiteStorage, merge_series, merge_last, to_ns  # noqa: E402
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def line(measurement, tags, fields, t):
+    tag_set = "".join(f",{k}={v}" for k, v in sorted(tags.items()))
+    field_set = ",".join(f"{k}={v}" for k, v in fields.items())
+    return f"{measurement}{tag_set} {field_set} {to_ns(t)}"
+
+
+class Checks:
+    def __init__(self, storage, measurement):
+        self.s = storage
+        self.m = measurement
+        self.failed = []
+
+    def check(self, name, condition, detail=""):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}{'' if condition else f'  ({detail})'}")
+        if not condition:
+            self.failed.append(name)
+
+    def run(self):
+        s, m = self.s, self.m
+        # 4 hours of 15-minute points for two series
+        lines = [line(m, {"site": site}, {"power": f"{i + (100 if site == 'b' else 0)}.0", "n": f"{i}i"},
+                      T0 + timedelta(minutes=15 * i))
+                 for site in ("a", "b") for i in range(16)]
+        s.write(lines)
+        stop = T0 + timedelta(hours=4)
+
+        df = s.query_range(m, T0, stop)
+        self.check("query_range returns every row", len(df) == 32, len(df))
+        self.check("result is sorted by _time", df["_time"].is_monotonic_increasing)
+        self.check("tags and fields are columns", {"_time", "site", "power", "n"} <= set(df.columns), list(df.columns))
+        self.check("_time is UTC", str(df["_time"].dt.tz) == "UTC", df["_time"].dtype)
+        a = df[df["site"] == "a"]
+        self.check("values round-trip", list(a["power"])[:3] == [0.0, 1.0, 2.0] and int(a["n"].iloc[5]) == 5,
+                   list(a["power"])[:3])
+
+        df = s.query_range(m, T0 + timedelta(hours=1), T0 + timedelta(hours=2))
+        self.check("range includes start, excludes stop", len(df) == 8 and df["_time"].min() == T0 + timedelta(hours=1),
+                   (len(df), df["_time"].min() if len(df) else None))
+
+        df = s.query_range(m, T0, stop, fields=["power"])
+        self.check("field filter", "n" not in df.columns and "power" in df.columns, list(df.columns))
+
+        s.write([line(m, {"site": "a"}, {"power": "42.0"}, T0)])
+        df = s.query_range(m, T0, T0 + timedelta(minutes=1), fields=["power"])
+        self.check("same series and time overwrites", sorted(df["power"]) == [42.0, 100.0], list(df["power"]))
+        s.write([line(m, {"site": "a"}, {"power": "0.0"}, T0)])
+
+        df = s.aggregate(m, T0, stop, every=timedelta(hours=1), fields=["power"])
+        a = df[df["site"] == "a"]
+        self.check("aggregate mean per window", list(a["power"]) == [1.5, 5.5, 9.5, 13.5], list(a["power"]))
+        self.check("windows are labelled with their end",
+                   list(a["_time"]) == [T0 + timedelta(hours=h) for h in (1, 2, 3, 4)], list(a["_time"]))
+        for fn, expected in (("min", 0.0), ("max", 3.0), ("sum", 6.0), ("count", 4)):
+            df = s.aggregate(m, T0, stop, every=timedelta(hours=1), fields=["power"], fn=fn)
+            got = df[df["site"] == "a"]["power"].iloc[0]
+            self.check(f"aggregate {fn}", got == expected, got)
+
+        df = s.aggregate(m, T0, T0 + timedelta(minutes=90), every=timedelta(hours=1), fields=["power"])
+        a = df[df["site"] == "a"]
+        self.check("last window ends at the range stop", a["_time"].iloc[-1] == T0 + timedelta(minutes=90),
+                   list(a["_time"]))
+
+        df = s.aggregate(m, T0, stop, every=timedelta(hours=1), fields=["power"], shift=timedelta(minutes=-15))
+        a = df[df["site"] == "a"]
+        self.check("shift moves points before windowing",
+                   list(a["power"]) == [0.0, 2.5, 6.5, 10.5, 14.0]
+                   and a["_time"].iloc[-1] == stop - timedelta(minutes=15), list(a["power"]))
+
+        df = s.last(m, T0, stop)
+        self.check("last returns the newest point per series",
+                   sorted(df["power"]) == [15.0, 115.0] and (df["_time"] == T0 + timedelta(minutes=225)).all(),
+                   df[["_time", "power"]].values.tolist())
+
+        # One series per source, each with its own field (like energy_flow from the CSV files)
+        t1 = T0 + timedelta(hours=10)
+        s.write([line(m, {"source": src}, {f"{src}_kw": f"{i + 1}.0"}, t1 + timedelta(minutes=15 * i))
+                 for src in ("pv", "load") for i in range(4)]
+                + [line(m, {"source": "pv2"}, {"pv_kw": "10.0"}, t1)])
+        df = merge_series(s.query_range(m, t1, t1 + timedelta(hours=1)))
+        self.check("merge_series gives one complete row per time",
+                   len(df) == 4 and df["load_kw"].notna().all() and list(df["pv_kw"]) == [11.0, 2.0, 3.0, 4.0],
+                   df.to_dict("records"))
+        df = merge_series(s.aggregate(m, t1, t1 + timedelta(hours=1), every=timedelta(minutes=30)))
+        self.check("merge_series after aggregate", list(df["pv_kw"]) == [11.5, 3.5] and list(df["load_kw"]) == [1.5, 3.5],
+                   df.to_dict("records"))
+        s.write([line(m, {"source": "load"}, {"load_kw": "7.0"}, t1 + timedelta(minutes=50))])
+        df = merge_last(s.last(m, t1, t1 + timedelta(hours=1)))
+        self.check("merge_last keeps the newest value of every field",
+                   len(df) == 1 and df["pv_kw"].iloc[0] == 4.0 and df["load_kw"].iloc[0] == 7.0
+                   and df["_time"].iloc[0] == t1 + timedelta(minutes=50), df.to_dict("records"))
+
+        df = s.query_range(m, t1, t1 + timedelta(hours=1), tags={"source": "pv"})
+        self.check("tag filter", len(df) == 4 and set(df["source"]) == {"pv"}, df.to_dict("records"))
+        df = s.query_range(m, T0, stop, tags={"site": None})
+        self.check("tag filter on a missing tag", df.empty, df.to_dict("records"))
+        df = s.aggregate(m, t1, t1 + timedelta(hours=1), every=timedelta(hours=1), tags={"source": "pv2", "site": None})
+        self.check("tag filter in aggregate", df["pv_kw"].tolist() == [10.0], df.to_dict("records"))
+        df = s.last(m, T0, stop, tags={"site": "b"})
+        self.check("tag filter in last", df["power"].tolist() == [115.0], df.to_dict("records"))
+
+        df = s.query_range(m + "_missing", T0, stop)
+        self.check("unknown measurement gives an empty frame with _time", df.empty and "_time" in df.columns,
+                   list(df.columns))
+
+        s.write([f'{m},site=x\\ y\\,z note="a, b \\"c\\"",power=1 {to_ns(T0)}'])
+        df = s.query_range(m, T0, T0 + timedelta(minutes=1))
+        row = df[df["site"] == "x y,z"]
+        self.check("escaped tags and string fields", len(row) == 1 and row["note"].iloc[0] == 'a, b "c"',
+                   df.to_dict("records"))
+
+        sync = s.query_range(m, T0, stop, fields=["power"])
+        result = asyncio.run(s.call("query_range", m, T0, stop, fields=["power"]))
+        self.check("call() matches the blocking method", result["power"].tolist() == sync["power"].tolist())
+
+        s.delete(m)
+        self.check("delete removes the measurement", s.query_range(m, T0, stop).empty)
+        return not self.failed
+
+
+def performance(storage, measurement, points, batch):
+    t = np.datetime64(T0.replace(tzinfo=None), "ns") + np.arange(points) * np.timedelta64(60, "s")
+    ts = t.astype("int64").astype(str)
+    lines = [f"{measurement},site=perf pv=1.5,load={i % 97}.25 {ts[i]}" for i in range(points)]
+    stop = T0 + timedelta(minutes=points)
+
+    t0 = time.perf_counter()
+    for i in range(0, points, batch):
+        storage.write(lines[i:i + batch])
+    write_s = time.perf_counter() - t0
+    print(f"  write       {points / write_s:>12,.0f} points/s  ({write_s:.2f} s, batches of {batch})")
+
+    for name, fn in (
+        ("query_range", lambda: storage.query_range(measurement, T0, stop)),
+        ("query 1 day", lambda: storage.query_range(measurement, stop - timedelta(days=1), stop)),
+        ("aggregate 1h", lambda: storage.aggregate(measurement, T0, stop, every=timedelta(hours=1))),
+        ("aggregate 1d", lambda: storage.aggregate(measurement, T0, stop, every=timedelta(days=1))),
+        ("last", lambda: storage.last(measurement, stop - timedelta(hours=1), stop)),
+    ):
+        t0 = time.perf_counter()
+        rows = len(fn())
+        print(f"  {name:<12}{(time.perf_counter() - t0) * 1000:>12.1f} ms        ({rows} rows)")
+    storage.delete(measurement)
+
+
+def open_storage(backend):
+    if backend == "sqlite" and "SQLITE_PATH" not in os.environ:
+        # Scratch database unless a real one is given
+        return SQLiteStorage(os.path.join(tempfile.mkdtemp(), "verify.sqlite3"))
+    return BACKENDS[backend]()
+
+
+def scratch_measurement():
+    return f"conformance_{os.getpid()}_{time.time_ns()}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend conformance and performance checks")
+    parser.add_argument("--backend", default=os.getenv("STORAGE_BACKEND", "sqlite"), choices=sorted(BACKENDS))
+    parser.add_argument("--points", type=int, default=100000, help="Points for the performance run (0 to skip)")
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    storage = open_storage(args.backend)
+    measurement = scratch_measurement()
+
+    print(f"Conformance ({storage.name})")
+    ok = Checks(storage, measurement).run()
+    if args.points:
+        print(f"Performance ({storage.name}, {args.points} points)")
+        performance(storage, measurement + "_perf", args.points, args.batch)
+    storage.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import os
+import json
+from urllib.parse import quote
 import dash
 import dash_bootstrap_components as dbc
 from dash import Input, Output, State, dcc, html, callback_context, no_update
+from dash_extensions import EventSource
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -11,6 +15,16 @@ import plotly.graph_objects as go
 # Both services must point to the proper ports
 API_SERVICE_URL = os.getenv("API_SERVICE_URL", "http://localhost:8000")
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8003")
+# The live stream is opened by the browser, so it needs the URL as seen from outside Docker
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", "http://localhost:8000")
+# Full reload (weather, resync) interval; everything else arrives via the live stream
+REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", 300))
+
+# One pooled session for all backend calls (keep-alive instead of a new TCP connection per request)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
 
 # suppress_callback_exceptions MUSS gesetzt sein
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY], suppress_callback_exceptions=True)
@@ -72,9 +86,13 @@ dashboard_layout = dbc.Container([
 app.layout = html.Div([
     dcc.Store(id="auth-token", storage_type="local"),
     dcc.Store(id="login-state", data=False),
+    # Last dashboard snapshot, kept up to date by the live stream
+    dcc.Store(id="dashboard-data"),
+    # EventSource is created once a token is available
+    html.Div(id="live-container"),
 
     # Interval muss hier im Haupt-Layout sein
-    dcc.Interval(id="interval-component", interval=15*1000, n_intervals=0),
+    dcc.Interval(id="interval-component", interval=REFRESH_INTERVAL_SECONDS*1000, n_intervals=0),
 
     # page-content erhält KEINE Klassen, da sie dynamisch über Callback 
     # gesteuert werden muss (Output("page-content", "className"))
@@ -121,7 +139,7 @@ def login_user(n_clicks, username, password):
         return no_update, no_update, "Please enter credentials."
     
     try:
-        response = requests.post(f"{AUTH_SERVICE_URL}/token", data={"username": username, "password": password})
+        response = http.post(f"{AUTH_SERVICE_URL}/token", data={"username": username, "password": password}, timeout=10)
         if response.status_code == 200:
             token = response.json().get("access_token")
             return token, True, ""
@@ -142,39 +160,87 @@ def logout_user(n_clicks):
         return None, False
     return no_update, no_update
 
-# 3. Data Update Logic
+# 4. Data Loading: full snapshot on login and every REFRESH_INTERVAL_SECONDS
+def fetch_snapshot(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    # flow, SoC, status, weather and irradiance in one round trip
+    r_dash = http.get(f"{API_SERVICE_URL}/data/dashboard", headers=headers, timeout=15)
+    return r_dash.json() if r_dash.status_code == 200 else {}
+
 @app.callback(
-    [Output("flow-graph", "figure"), Output("soc-graph", "figure"), Output("status-display", "children")],
-    [Input("interval-component", "n_intervals")],
+    Output("dashboard-data", "data"),
+    [Input("interval-component", "n_intervals"), Input("login-state", "data")],
     [State("auth-token", "data")]
 )
-def update_metrics(n, token):
+def load_snapshot(n, is_logged_in, token):
     if not token:
-        return go.Figure(), go.Figure(), "Not authenticated"
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    # Fetch Data
+        return None
     try:
-        r_flow = requests.get(f"{API_SERVICE_URL}/data/flow/timeseries", headers=headers)
-        flow_data = r_flow.json() if r_flow.status_code == 200 else []
-        
-        r_soc = requests.get(f"{API_SERVICE_URL}/data/soc/timeseries", headers=headers)
-        soc_data = r_soc.json() if r_soc.status_code == 200 else []
-        
-        r_status = requests.get(f"{API_SERVICE_URL}/data/current_status", headers=headers)
-        status_data = r_status.json() if r_status.status_code == 200 else {}
-        
-        # Fetch Weather
-        r_weather = requests.get(f"{API_SERVICE_URL}/data/weather", headers=headers)
-        weather_data = r_weather.json() if r_weather.status_code == 200 else {}
-        
-        # Fetch Irradiance
-        r_irr = requests.get(f"{API_SERVICE_URL}/data/weather/irradiance", headers=headers)
-        irr_data = r_irr.json() if r_irr.status_code == 200 else []
-        
+        return fetch_snapshot(token)
     except Exception:
+        return no_update
+
+# 5. Live Stream: server pushes new data instead of polling
+@app.callback(
+    Output("live-container", "children"),
+    Input("auth-token", "data")
+)
+def connect_stream(token):
+    if not token:
+        return []
+    return EventSource(id="live-stream", url=f"{API_PUBLIC_URL}/data/stream?token={quote(token)}")
+
+@app.callback(
+    Output("dashboard-data", "data", allow_duplicate=True),
+    Input("live-stream", "message"),
+    [State("dashboard-data", "data"), State("auth-token", "data")],
+    prevent_initial_call=True
+)
+def apply_live_update(message, snapshot, token):
+    if not message or not token:
+        return no_update
+    event = json.loads(message)
+    kind = event.get("type")
+    if kind == "resync" or snapshot is None:
+        # Updates are applied to a snapshot, so without one fetch the full state first
+        try:
+            return fetch_snapshot(token)
+        except Exception:
+            return no_update
+    if kind == "flow":
+        # Upsert the pushed 15m windows and keep the last 24h
+        merged = {r["timestamp"]: r for r in snapshot.get("flow") or [] if "timestamp" in r}
+        merged.update({r["timestamp"]: r for r in event.get("data", []) if "timestamp" in r})
+        flow = [merged[k] for k in sorted(merged)]
+        if flow:
+            cutoff = (pd.Timestamp(flow[-1]["timestamp"]) - pd.Timedelta(hours=24)).isoformat()
+            flow = [r for r in flow if r["timestamp"] >= cutoff]
+        snapshot["flow"] = flow
+        if event.get("status"):
+            snapshot["status"] = event["status"]
+        return snapshot
+    if kind == "soc":
+        snapshot["soc"] = event.get("data", [])
+        return snapshot
+    return no_update
+
+# 6. Rendering from the snapshot store
+@app.callback(
+    [Output("flow-graph", "figure"), Output("soc-graph", "figure"), Output("status-display", "children")],
+    [Input("dashboard-data", "data")],
+    [State("auth-token", "data")]
+)
+def update_metrics(snapshot, token):
+    if not token:
+        return go.Figure(), go.Figure(), "Not authenticated"
+    if snapshot is None:
         return no_update, no_update, "Error fetching data"
+
+    flow_data = snapshot.get("flow") or []
+    soc_data = snapshot.get("soc") or []
+    status_data = snapshot.get("status") or {}
+    weather_data = snapshot.get("weather") or {}
+    irr_data = snapshot.get("irradiance") or []
     
     # Create Flow Graph
     fig_flow = go.Figure()
@@ -225,11 +291,11 @@ def update_metrics(n, token):
     
     status_html = html.Div([
         html.H4("System Status", className="mb-3"),
-        html.P(f"Current PV: {status_data.get('pv_power_kw', 0):.2f} kW"),
-        html.P(f"Current Load: {status_data.get('consumption_power_kw', 0):.2f} kW"),
+        html.P(f"Current PV: {status_data.get('pv_power_kw') or 0:.2f} kW"),
+        html.P(f"Current Load: {status_data.get('consumption_power_kw') or 0:.2f} kW"),
         html.Hr(),
         html.H4("Weather", className="mb-2"),
-        html.P(f"Source: Open-Meteo API"),
+        html.P(f"Source: {weather_data.get('source', 'Open-Meteo API')}"),
         html.P(f"Location: {loc_display}"),
         html.P(f"Temperature: {temp_display}"),
         html.Hr(),
@@ -0,0 +1,268 @@
+import os
+import glob
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Rows per line-protocol chunk handed to the writer
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 5000))
+# Files parsed concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 2))
+
+# (data subfolder, measurement, tags, csv column -> influx field)
+DATA_SOURCES = [
+    ("consumption", "energy_flow", {"source": "file_consumption"}, {"consumption_kwh": "consumption_power_kw"}),
+    ("pv", "energy_flow", {"source": "file_pv"}, {"production_kw": "pv_power_kw"}),
+    ("market", "market_prices", {"source": "file_market"}, {"price_eur_mwh": "price_eur_mwh"}),
+]
+
+
+def _escape(value: str) -> str:
+    # Line protocol escaping for measurement names, tag keys and tag values
+    return str(value).replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def series_prefix(measurement: str, tags: dict) -> str:
+    prefix = _escape(measurement)
+    for k in sorted(tags):
+        prefix += f",{_escape(k)}={_escape(tags[k])}"
+    return prefix
+
+
+def frame_to_line_protocol(df: "pd.DataFrame", measurement: str, tags: dict, field_map: dict):
+    """
+    Converts a whole DataFrame to line protocol column by column.
+    Rows without any valid field value are skipped (same as Point would do).
+    Returns (lines, newest timestamp in ns or None).
+    """
+    import pandas as pd
+    parts = []
+    for csv_col, influx_field in field_map.items():
+        if csv_col not in df.columns:
+            continue
+        values = pd.to_numeric(df[csv_col], errors="coerce").astype(float)
+        part = (f"{_escape(influx_field)}=" + values.astype(str)).where(values.notna(), "")
+        parts.append(part)
+    if not parts:
+        return [], None
+
+    fields = parts[0]
+    for part in parts[1:]:
+        fields = fields + "," + part
+    if len(parts) > 1:
+        fields = fields.str.replace(r",{2,}", ",", regex=True).str.strip(",")
+
+    lines = series_prefix(measurement, tags) + " " + fields
+    valid = fields != ""
+
+    # Parse the whole datetime column once instead of per row
+    last_ts = None
+    if "datetime" in df.columns:
+        ts_ns = pd.to_datetime(df["datetime"], utc=True, format="ISO8601").dt.as_unit("ns").astype("int64")
+        lines = lines + " " + ts_ns.astype(str)
+        if valid.any():
+            last_ts = int(ts_ns[valid].max())
+
+    return lines[valid].tolist(), last_ts
+
+
+def iter_line_protocol_chunks(path, measurement, tags, field_map, chunk_size=INGEST_CHUNK_SIZE, offset=0):
+    """
+    Streams a CSV file as (lines, newest timestamp ns) chunks of at most chunk_size rows.
+    With offset > 0 only the rows after that byte position are read (appended tail).
+    """
+    import pandas as pd
+    with open(path, "rb") as fh:
+        header = fh.readline().decode("utf-8-sig").strip().split(",")
+        if offset:
+            fh.seek(offset)
+        for chunk in pd.read_csv(fh, names=header, header=None, chunksize=chunk_size):
+            lines, last_ts = frame_to_line_protocol(chunk, measurement, tags, field_map)
+            if lines:
+                yield lines, last_ts
+
+
+def ingest_file(path, measurement, tags, field_map, write, chunk_size=INGEST_CHUNK_SIZE):
+    """Writes one CSV file in chunks via write(lines). Returns the number of rows written."""
+    written = 0
+    for lines, _ in iter_line_protocol_chunks(path, measurement, tags, field_map, chunk_size):
+        write(lines)
+        written += len(lines)
+    return written
+
+
+def discover_files(base_path):
+    """Yields (path, measurement, tags, field_map) for every CSV below base_path."""
+    for subdir, measurement, tags, field_map in DATA_SOURCES:
+        for f in sorted(glob.glob(os.path.join(base_path, subdir, "*.csv"))):
+            yield f, measurement, tags, field_map
+
+
+class IngestRunner:
+    """
+    Runs a batch ingest in the background: one task per file on a bounded thread pool.
+    write(lines, on_done) is expected to queue the chunk (blocking while its queue is
+    full, which applies backpressure to the parsers) and to call on_done(count, error)
+    once the chunk is written.
+    """
+
+    def __init__(self, write, workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE, manifest=None):
+        self.write = write
+        self.manifest = manifest
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._files = {}
+        self._thread = None
+        self._started_at = None
+        self._finished_at = None
+
+    # --- progress bookkeeping ---
+
+    def _update(self, path, **changes):
+        with self._lock:
+            entry = self._files[path]
+            for k, v in changes.items():
+                if k in ("rows_parsed", "rows_written", "rows_failed", "pending_chunks"):
+                    entry[k] += v
+                elif k == "last_ts":
+                    if v is not None and (entry["last_ts"] is None or v > entry["last_ts"]):
+                        entry["last_ts"] = v
+                else:
+                    entry[k] = v
+            finished = entry["parsed"] and entry["pending_chunks"] == 0 and entry["finished_at"] is None
+            if finished:
+                entry["finished_at"] = time.time()
+                self._done.notify_all()
+            commit = finished and not entry["errors"] and entry["mode"] != "skip" and entry["fingerprint"]
+            if commit:
+                entry = dict(entry)
+        if commit and self.manifest is not None:
+            # Only fully written files are remembered, failed ones are retried next start
+            self.manifest.record_file(path, entry["fingerprint"], entry["measurement"], entry["tags"], entry["last_ts"])
+
+    def _error(self, path, message):
+        print(f"Error loading {path}: {message}")
+        with self._lock:
+            self._files[path]["errors"].append(message)
+
+    # --- workers ---
+
+    def _parse_file(self, path, measurement, tags, field_map, offset=0):
+        self._update(path, state="parsing", started_at=time.time())
+        try:
+            for lines, last_ts in iter_line_protocol_chunks(path, measurement, tags, field_map, self.chunk_size, offset):
+                self._update(path, rows_parsed=len(lines), pending_chunks=1, last_ts=last_ts)
+                try:
+                    self.write(lines, on_done=lambda count, error, path=path: self._written(path, count, error))
+                except Exception:
+                    # The chunk was not queued, so on_done never comes for it
+                    self._update(path, rows_failed=len(lines), pending_chunks=-1)
+                    raise
+        except Exception as e:
+            self._error(path, str(e))
+        self._update(path, parsed=True)
+
+    def _written(self, path, count, error):
+        if error is None:
+            self._update(path, rows_written=count, pending_chunks=-1)
+        else:
+            self._error(path, str(error))
+            self._update(path, rows_failed=count, pending_chunks=-1)
+
+    def run(self, files, force=False):
+        """
+        Ingests all files and blocks until everything is written. With a manifest,
+        unchanged files are skipped and appended files only have their tail ingested.
+        """
+        files = list(files)
+        tasks = []
+        with self._lock:
+            self._started_at = time.time()
+            self._finished_at = None
+            self._files = {}
+        for path, measurement, tags, field_map in files:
+            mode, offset, fingerprint = "full", 0, None
+            if self.manifest is not None:
+                try:
+                    mode, offset, fingerprint = self.manifest.plan(path)
+                except OSError as e:
+                    print(f"Cannot stat {path}: {e}")
+                if force and mode != "full":
+                    mode, offset = "full", 0
+            skipped = mode == "skip"
+            with self._lock:
+                self._files[path] = {
+                    "state": "skipped" if skipped else "queued", "mode": mode, "parsed": skipped,
+                    "rows_parsed": 0, "rows_written": 0, "rows_failed": 0, "pending_chunks": 0,
+                    "errors": [], "started_at": None, "finished_at": time.time() if skipped else None,
+                    "fingerprint": fingerprint, "measurement": measurement, "tags": tags, "last_ts": None,
+                }
+            if not skipped:
+                tasks.append((path, measurement, tags, field_map, offset))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+            for task in tasks:
+                pool.submit(self._parse_file, *task)
+
+        with self._lock:
+            # Parsing is done, wait for the writer to confirm the remaining chunks
+            self._done.wait_for(lambda: all(e["finished_at"] is not None for e in self._files.values()))
+            self._finished_at = time.time()
+        print(f"Batch Data ingestion completed ({len(tasks)} of {len(files)} files needed ingest).")
+
+    def start(self, files, force=False):
+        """Starts run() in a background thread and returns immediately."""
+        self._thread = threading.Thread(target=self.run, args=(files, force), daemon=True, name="ingest-runner")
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            files = {}
+            for path, e in self._files.items():
+                if e["mode"] == "skip":
+                    state = "skipped"
+                elif e["errors"] and e["finished_at"] is not None:
+                    state = "error"
+                elif e["finished_at"] is not None:
+                    state = "done"
+                elif e["parsed"]:
+                    state = "writing"
+                else:
+                    state = e["state"]
+                elapsed = None
+                if e["started_at"] is not None:
+                    elapsed = (e["finished_at"] or now) - e["started_at"]
+                files[os.path.basename(path)] = {
+                    "state": state,
+                    "mode": e["mode"],
+                    "rows_parsed": e["rows_parsed"],
+                    "rows_written": e["rows_written"],
+                    "rows_failed": e["rows_failed"],
+                    "rows_per_sec": round(e["rows_written"] / elapsed, 1) if elapsed else 0.0,
+                    "errors": list(e["errors"]),
+                }
+            total_written = sum(f["rows_written"] for f in files.values())
+            elapsed = None
+            if self._started_at is not None:
+                elapsed = (self._finished_at or now) - self._started_at
+            return {
+                "running": self.is_running(),
+                "files_total": len(files),
+                "files_done": sum(1 for f in files.values() if f["state"] in ("done", "error", "skipped")),
+                "files_skipped": sum(1 for f in files.values() if f["state"] == "skipped"),
+                "rows_written": total_written,
+                "rows_per_sec": round(total_written / elapsed, 1) if elapsed else 0.0,
+                "elapsed_sec": round(elapsed, 3) if elapsed else 0.0,
+                "files": files,
+            }
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+from influxdb_client import Point, WritePrecision
+
+from batch_ingest import discover_files, iter_line_protocol_chunks, INGEST_CHUNK_SIZE
+
+# Benchmark of the CSV -> line protocol conversion on the bundled data/ files.
+# "legacy" is the old per-row iterrows/Point path, "vectorized" the batch_ingest path.
+# With --write the vectorized chunks are also sent to InfluxDB (needs a running instance).
+
+def legacy_convert(f, measurement, tags, field_map):
+    df = pd.read_csv(f)
+    lines = []
+    for _, row in df.iterrows():
+        p = Point(measurement)
+        for k, v in tags.items():
+            p.tag(k, v)
+        for csv_col, influx_field in field_map.items():
+            if csv_col in row:
+                p.field(influx_field, float(row[csv_col]))
+        if 'datetime' in row:
+            p.time(pd.to_datetime(row['datetime']), WritePrecision.NS)
+        lines.append(p.to_line_protocol())
+    return len(lines)
+
+
+def vectorized_convert(f, measurement, tags, field_map, chunk_size, write=None):
+    rows = 0
+    for lines, _ in iter_line_protocol_chunks(f, measurement, tags, field_map, chunk_size):
+        if write:
+            write(lines)
+        rows += len(lines)
+    return rows
+
+
+def run(label, convert, files):
+    total_rows = 0
+    t0 = time.perf_counter()
+    for f, measurement, tags, field_map in files:
+        total_rows += convert(f, measurement, tags, field_map)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<12} {total_rows:>8} rows in {elapsed:7.3f}s  -> {total_rows / elapsed:>12,.0f} rows/sec")
+    return total_rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV ingest throughput")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only run the vectorized path")
+    parser.add_argument("--write", action="store_true", help="Also write the vectorized chunks to InfluxDB")
+    args = parser.parse_args()
+
+    base_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    files = list(discover_files(base_path))
+    if not files:
+        print(f"No CSV files found below {base_path}")
+        sys.exit(1)
+    print(f"{len(files)} files, chunk size {args.chunk_size}")
+
+    write = None
+    if args.write:
+        # influx_client needs the repo root on the path for the shared writer
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from influx_client import write_points, writer
+        write = write_points
+
+    before = None
+    if not args.skip_legacy:
+        before = run("legacy", legacy_convert, files)
+    t0 = time.perf_counter()
+    after = run("vectorized", lambda f, m, t, fm: vectorized_convert(f, m, t, fm, args.chunk_size, write), files)
+    if write:
+        writer.flush()
+        elapsed = time.perf_counter() - t0
+        stats = writer.stats()
+        print(f"written      {stats['written']:>8} rows in {elapsed:7.3f}s  -> {stats['written'] / elapsed:>12,.0f} rows/sec "
+              f"(dropped {stats['dropped']}, avg flush {stats['avg_flush_ms']} ms)")
+    if before:
+        print(f"Speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
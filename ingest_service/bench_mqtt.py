@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+# Device gateway under load: D devices publish PV/meter readings at a fixed total
+# rate (a share of them QoS 1 redeliveries, a share as per-field scalar topics).
+# The gateway writes through a BatchingWriter into a scratch SQLite store.
+# Reports messages/s, gateway CPU per message, duplicates dropped, readings merged,
+# rows written and end-to-end lag (reading time -> stored).
+#   python bench_mqtt.py --devices 5000 --rate 20000 --duration 20
+#   python bench_mqtt.py --broker mqtt://localhost:1883     # through mosquitto (needs aiomqtt)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.batch_writer import BatchingWriter  # noqa: E402
+from common.storage import SQLiteStorage  # noqa: E402
+from mqtt_gateway import MqttGateway, LocalBroker, aiomqtt  # noqa: E402
+
+
+def readings(devices, sites, duplicates, scalars):
+    """Endless (topic, payload) stream; every device reports once per round."""
+    rng = random.Random(1)
+    while True:
+        ts = time.time()
+        for d in range(devices):
+            topic = f"hems/site{d % sites}/meter{d}"
+            pv_w, load_kw = rng.uniform(0, 8000), rng.uniform(0.2, 6)
+            if rng.random() < scalars:
+                yield f"{topic}/pv_w", f"{pv_w:.0f}"
+                yield f"{topic}/load_kw", f"{load_kw:.3f}"
+                continue
+            message = topic, json.dumps({"ts": round(ts, 3), "pv_w": round(pv_w), "load_kw": round(load_kw, 3),
+                                         "grid_w": round(load_kw * 1000 - pv_w)})
+            yield message
+            if rng.random() < duplicates:
+                yield message
+
+
+async def publish(publish_one, stream, rate, duration, tick=0.05):
+    sent = 0
+    t0 = time.monotonic()
+    while (elapsed := time.monotonic() - t0) < duration:
+        # Catch up to the target rate, in bursts as devices tend to report
+        for _ in range(int(rate * elapsed) - sent):
+            topic, payload = next(stream)
+            await publish_one(topic, payload)
+            sent += 1
+        await asyncio.sleep(tick)
+    return sent
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="MQTT gateway benchmark")
+    parser.add_argument("--broker", default="local", help="'local' (in-process) or mqtt://host:port")
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--rate", type=int, default=20000, help="Messages per second, all devices together")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="Share of messages delivered twice")
+    parser.add_argument("--scalars", type=float, default=0.2, help="Share of devices publishing one topic per field")
+    parser.add_argument("--coalesce", type=float, default=0.25, help="MQTT_COALESCE_SECONDS")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_mqtt_")
+    storage = SQLiteStorage(os.path.join(workdir, "bench.db"))
+    writer = BatchingWriter(storage.write, name="bench-writer")
+
+    def submit(lines, on_done=None):
+        return writer.submit(lines, on_done=on_done, block=False)
+
+    broker = LocalBroker() if args.broker == "local" else None
+    gateway = MqttGateway(submit, url=args.broker, broker=broker, coalesce_seconds=args.coalesce)
+    stream = readings(args.devices, args.sites, args.duplicates, args.scalars)
+
+    if broker is not None:
+        async def publish_one(topic, payload):
+            broker.publish(topic, payload)
+        client = None
+    else:
+        if aiomqtt is None:
+            raise SystemExit("aiomqtt is not installed")
+        from urllib.parse import urlparse
+        u = urlparse(args.broker)
+        client = aiomqtt.Client(u.hostname, port=u.port or 1883, identifier="bench-mqtt-publisher")
+        await client.__aenter__()
+
+        async def publish_one(topic, payload):
+            await client.publish(topic, payload, qos=1)
+
+    gateway.start()
+    while not gateway.connected:
+        await asyncio.sleep(0.05)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    sent = await publish(publish_one, stream, args.rate, args.duration)
+    # Let the gateway drain and the writer catch up
+    while gateway.counters["messages"] < sent and time.perf_counter() - t0 < args.duration + 10:
+        await asyncio.sleep(0.05)
+    await gateway.stop()
+    writer.flush(timeout=30)
+    elapsed, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    if client is not None:
+        await client.__aexit__(None, None, None)
+    writer.close(timeout=10)
+
+    s = gateway.status(top=0)
+    lag = s["end_to_end_lag_ms"]
+    print(f"{args.broker} broker: {args.devices} devices on {args.sites} sites, {args.rate:,} messages/s target, "
+          f"{elapsed:.1f} s, coalesce {args.coalesce} s")
+    print(f"  published      {sent:>12,}")
+    print(f"  handled        {s['messages']:>12,}  ({s['messages'] / elapsed:,.0f} messages/s)")
+    # Publisher, gateway and writer share this process, so this is an upper bound for the gateway
+    print(f"  CPU            {cpu / max(s['messages'], 1) * 1e6:>12.1f} us per message (whole process)")
+    print(f"  duplicates     {s['duplicates']:>12,}")
+    print(f"  merged         {s['coalesced']:>12,} readings into existing points")
+    print(f"  points written {s['written']:>12,}  (deferred {s['deferred']:,}, dropped {s['dropped']:,})")
+    print(f"  invalid        {s['invalid']:>12,}  unmapped {s['unmapped']:,}")
+    if lag["p50"] is not None:
+        print(f"  end-to-end lag p50 {lag['p50']:.0f} ms, p99 {lag['p99']:.0f} ms, max {lag['max']:.0f} ms")
+    storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
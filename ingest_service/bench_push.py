@@ -0,0 +1,114 @@
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import aiohttp
+
+# Load generator for POST /ingest on a running ingest_service: C clients push
+# batches of smart-meter points for a fixed time. Reports accepted points/s,
+# points per server CPU-second (= per core, from /ingest/push/stats), request
+# latency and how often the service pushed back with 429.
+#   python bench_push.py --token $TOKEN --format lp --points 5000 --concurrency 8 --duration 20
+#   python bench_push.py --token $TOKEN --format ndjson --gzip
+
+CONTENT_TYPES = {"lp": "text/plain", "ndjson": "application/x-ndjson", "csv": "text/csv"}
+T0_NS = 1_767_225_600_000_000_000   # 2026-01-01
+
+
+def make_body(fmt, points, offset, devices):
+    rows = range(offset, offset + points)
+    if fmt == "lp":
+        text = "".join(f"telemetry,device=dev{i % devices} power_kw={i % 97 * 0.1:.1f},voltage=230.{i % 10} "
+                       f"{T0_NS + i * 1_000_000_000}\n" for i in rows)
+    elif fmt == "ndjson":
+        text = "".join(json.dumps({"measurement": "telemetry", "tags": {"device": f"dev{i % devices}"},
+                                   "fields": {"power_kw": i % 97 * 0.1, "voltage": 230 + i % 10 / 10},
+                                   "time": T0_NS + i * 1_000_000_000}) + "\n" for i in rows)
+    else:
+        text = "time,device,power_kw,voltage\n" + "".join(
+            f"{T0_NS + i * 1_000_000_000},dev{i % devices},{i % 97 * 0.1:.1f},230.{i % 10}\n" for i in rows)
+    return text.encode()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def push_stats(session, url, headers):
+    async with session.get(f"{url}/ingest/push/stats", headers=headers) as r:
+        r.raise_for_status()
+        return await r.json()
+
+
+async def client(session, url, headers, params, bodies, deadline, result):
+    i = 0
+    while time.monotonic() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            async with session.post(f"{url}/ingest", data=body, headers=headers, params=params) as r:
+                payload = await r.json(content_type=None)
+                status = r.status
+        except aiohttp.ClientError:
+            result["errors"] += 1
+            continue
+        if status == 200:
+            result["points"] += payload["accepted"]
+            result["latencies"].append((time.perf_counter() - t0) * 1000)
+        elif status == 429:
+            result["throttled"] += 1
+            await asyncio.sleep(0.05)
+        else:
+            result["errors"] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Push ingestion load generator")
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--token", required=True, help="JWT for the ingest service")
+    parser.add_argument("--format", choices=sorted(CONTENT_TYPES), default="lp")
+    parser.add_argument("--points", type=int, default=5000, help="Points per request")
+    parser.add_argument("--devices", type=int, default=100, help="Distinct device tags")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to push")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}", "Content-Type": CONTENT_TYPES[args.format]}
+    params = {"measurement": "telemetry", "tag": "device"} if args.format == "csv" else {}
+    # A few distinct bodies, prepared up front so the generator itself stays cheap
+    bodies = [make_body(args.format, args.points, k * args.points, args.devices) for k in range(8)]
+    if args.gzip:
+        bodies = [gzip.compress(b) for b in bodies]
+        headers["Content-Encoding"] = "gzip"
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        stat_headers = {"Authorization": headers["Authorization"]}
+        before = await push_stats(session, args.url, stat_headers)
+        result = {"points": 0, "throttled": 0, "errors": 0, "latencies": []}
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(client(session, args.url, headers, params, bodies, deadline, result)
+                               for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+        after = await push_stats(session, args.url, stat_headers)
+
+    cpu = after["process_cpu_s"] - before["process_cpu_s"]
+    lat = result["latencies"]
+    print(f"{args.format}{' (gzip)' if args.gzip else ''}: {args.points} points/request, "
+          f"{args.concurrency} clients, {elapsed:.1f} s, {len(bodies[0]) / 1024:.0f} KiB/request")
+    print(f"  accepted       {result['points']:>12,} points  ({result['points'] / elapsed:,.0f} points/s)")
+    if cpu > 0:
+        print(f"  per core       {result['points'] / cpu:>12,.0f} points per server CPU-second")
+    if lat:
+        print(f"  latency        p50 {statistics.median(lat):.0f} ms, p99 {percentile(lat, 99):.0f} ms")
+    print(f"  throttled      {result['throttled']:>12} (429)")
+    print(f"  errors         {result['errors']:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,33 @@
 import os
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from datetime import datetime, timedelta, timezone
+from common.batch_writer import BatchingWriter
+from common.invalidation import InvalidationNotifier
+from common.spool import make_spool
+from common.storage import make_storage, INFLUX_BUCKET, INFLUX_ORG
+from rollup import RollupWorker
 
-# Configuration
-INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN", "my-super-secret-auth-token")
-INFLUX_ORG = os.getenv("INFLUX_ORG", "myorg")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "hems_data")
+# InfluxDB or the embedded SQLite store (STORAGE_BACKEND); connects on first use
+storage = make_storage()
 
-client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-write_api = client.write_api(write_options=SYNCHRONOUS)
+# api_service is told which measurements changed so it can drop cached results
+notifier = InvalidationNotifier("ingest_service")
+# energy_flow_15m/1h/1d are recomputed for the windows new points fall into.
+# Only InfluxDB keeps these tiers; other backends aggregate raw data at query time
+rollups = RollupWorker(storage.flux, INFLUX_BUCKET, INFLUX_ORG, on_done=notifier.notify) if storage.has_rollups else None
+
+def _on_flush(records: list):
+    notifier(records)
+    if rollups is not None:
+        rollups.mark_dirty(records)
+
+# All writes go through the background batching writer; batches storage does not
+# take during an outage wait in an on-disk spool and are replayed in order
+spool = make_spool(os.path.dirname(os.path.abspath(__file__)), name="ingest-spool")
+writer = BatchingWriter(storage.write, name="ingest-writer", on_flush=_on_flush, spool=spool,
+                        probe=storage.ping)
 
 def write_data(measurement: str, tags: dict, fields: dict, timestamp=None):
+    from influxdb_client import Point, WritePrecision
     point = Point(measurement)
     for k, v in tags.items():
         point = point.tag(k, v)
@@ -19,8 +35,20 @@ def write_data(measurement: str, tags: dict, fields: dict, timestamp=None):
         point = point.field(k, v)
     if timestamp:
         point = point.time(timestamp, WritePrecision.NS)
-    
-    write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
 
-def write_points(points: list):
-    write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=points)
+    # Non-blocking, safe to call from the event loop; dropped if the queue is full
+    return writer.submit([point], block=False)
+
+def offer_points(points: list, on_done=None):
+    # Non-blocking; False when the writer queue is full (pushing clients get 429)
+    return writer.submit(points, on_done=on_done, block=False)
+
+def write_points(points: list, on_done=None):
+    # Blocks while the writer queue is full (backpressure for bulk producers)
+    return writer.submit(points, on_done=on_done)
+
+def last_time(measurement: str, lookback: timedelta = timedelta(days=92)):
+    """Newest timestamp (up to now) stored for a measurement, or None."""
+    now = datetime.now(timezone.utc)
+    df = storage.last(measurement, now - lookback, now)
+    return df["_time"].max().to_pydatetime() if len(df) else None
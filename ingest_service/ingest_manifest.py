@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+# Where the ingest state is persisted between restarts
+INGEST_MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_manifest.json")
+)
+
+
+def file_sha256(path, limit=None):
+    """SHA-256 of a file, or of its first `limit` bytes."""
+    h = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as fh:
+        while remaining is None or remaining > 0:
+            block = fh.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            h.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return h.hexdigest()
+
+
+def series_key(measurement, tags):
+    return ",".join([measurement] + [f"{k}={tags[k]}" for k in sorted(tags)])
+
+
+class IngestManifest:
+    """
+    Remembers which CSV files were ingested (size, mtime, content hash) and the
+    newest timestamp written per measurement/source, so restarts only ingest what changed.
+    """
+
+    def __init__(self, path=INGEST_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files = {}
+        self.series = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+            self.files = data.get("files", {})
+            self.series = data.get("series", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable ingest manifest {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            data = {"files": self.files, "series": self.series}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as fh:
+                json.dump(data, fh, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+    def reset(self):
+        with self._lock:
+            self.files = {}
+            self.series = {}
+        self.save()
+
+    def plan(self, path):
+        """
+        Decides how to ingest a file. Returns (action, offset, fingerprint) with
+        action "skip" (unchanged), "append" (only bytes after offset are new) or "full".
+        """
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.files.get(key)
+
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return "skip", 0, entry
+
+        sha = file_sha256(path)
+        fingerprint = {"size": st.st_size, "mtime": st.st_mtime, "sha256": sha}
+        if not entry:
+            return "full", 0, fingerprint
+        if entry["sha256"] == sha:
+            # Only touched, content is the same: remember the new size/mtime so the next start skips the hash
+            with self._lock:
+                self.files[key] = fingerprint
+            self.save()
+            return "skip", 0, fingerprint
+        if st.st_size > entry["size"] and file_sha256(path, entry["size"]) == entry["sha256"]:
+            # Appended: the old content is an unchanged prefix ending on a line break
+            with open(path, "rb") as fh:
+                fh.seek(entry["size"] - 1)
+                if fh.read(1) == b"\n":
+                    return "append", entry["size"], fingerprint
+        return "full", 0, fingerprint
+
+    def record_file(self, path, fingerprint, measurement, tags, last_ts_ns=None):
+        with self._lock:
+            self.files[os.path.abspath(path)] = dict(fingerprint)
+            if last_ts_ns is not None:
+                key = series_key(measurement, tags)
+                last = datetime.fromtimestamp(last_ts_ns / 1e9, tz=timezone.utc).isoformat()
+                if key not in self.series or self.series[key] < last:
+                    self.series[key] = last
+        self.save()
+
+    def last_timestamp(self, measurement, tags):
+        """Newest ingested timestamp (ISO string) for a measurement/tag set, or None."""
+        return self.series.get(series_key(measurement, tags))
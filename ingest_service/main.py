@@ -1,29 +1,33 @@
 import asyncio
 import os
-import pandas as pd
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from influxdb_client import Point, WritePrecision
-from influx_client import write_data, write_points
+from typing import Annotated
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from influx_client import write_data, write_points, offer_points, writer, last_time, rollups, storage
+from batch_ingest import discover_files, IngestRunner
+from ingest_manifest import IngestManifest
+from weather_ingest import WeatherIngestor
+from mqtt_gateway import MqttGateway, MQTT_ENABLED
+from telemetry import PushError, PushIntake, PushStats, make_parser, media_format, PUSH_MAX_BODY_BYTES
+from common.health import Readiness
+from common.security import verify_token
 
-app = FastAPI()
+# Manifest makes restarts incremental: unchanged CSVs are skipped, appended ones only send the tail
+ingest_manifest = IngestManifest()
+ingest_runner = IngestRunner(write=write_points, manifest=ingest_manifest)
 
-# Security
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
-ALGORITHM = "HS256"
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://localhost:8003/token")
+# Hourly weather/irradiance into the "weather" measurement (one API call per hour for everyone)
+WEATHER_INGEST_ENABLED = os.getenv("WEATHER_INGEST_ENABLED", "true").lower() == "true"
+weather_ingestor = WeatherIngestor(write=write_points, last_timestamp=last_time)
 
-def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    return username
+# Downsampled energy_flow tiers for long-range charts (InfluxDB backend only)
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "true").lower() == "true" and rollups is not None
+
+# Device readings over MQTT into energy_flow (MQTT_URL=local for the in-process broker)
+mqtt_gateway = MqttGateway(submit=offer_points) if MQTT_ENABLED else None
 
 # Simulation
 async def run_simulation():
@@ -46,59 +50,139 @@ async def run_simulation():
         print(f"Simulated data written: PV={pv:.2f}, Cons={consumption:.2f}")
         await asyncio.sleep(15)
 
-@app.on_event("startup")
-async def startup_event():
-    import glob
-    print("Starting data ingestion from files (BATCH MODE)...")
-    
+# Ready once storage answers; the file backfill runs in the background and does not gate readiness,
+# neither does the MQTT connection (see /mqtt/status)
+readiness = Readiness("ingest_service")
+readiness.check("storage", storage.ping)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Replays points spooled during an earlier storage outage
+    writer.start()
+
+    print("Starting data ingestion from files (BATCH MODE, background)...")
+
     # Use dirname of the current file to locate data folder correctly
     base_path = os.path.join(os.path.dirname(__file__), "data")
 
-    def process_file(f, measurement, tags, field_map):
-        try:
-            df = pd.read_csv(f)
-            points = []
-            for _, row in df.iterrows():
-                p = Point(measurement)
-                for k, v in tags.items():
-                    p.tag(k, v)
-                for csv_col, influx_field in field_map.items():
-                    if csv_col in row:
-                        val = float(row[csv_col])
-                        p.field(influx_field, val)
-                
-                # Assume columns 'datetime' exists
-                if 'datetime' in row:
-                    ts = pd.to_datetime(row['datetime'])
-                    p.time(ts, WritePrecision.NS)
-                points.append(p)
-            
-            if points:
-                write_points(points)
-                print(f"Loaded {len(points)} points from {f}")
-        except Exception as e:
-            print(f"Error loading {f}: {e}")
-
-    # 1. Consumption
-    files = glob.glob(os.path.join(base_path, "consumption", "*.csv"))
-    for f in files:
-        process_file(f, "energy_flow", {"source": "file_consumption"}, {"consumption_kwh": "consumption_power_kw"})
-
-    # 2. PV
-    files = glob.glob(os.path.join(base_path, "pv", "*.csv"))
-    for f in files:
-        process_file(f, "energy_flow", {"source": "file_pv"}, {"production_kw": "pv_power_kw"})
-
-    # 3. Market Prices
-    files = glob.glob(os.path.join(base_path, "market", "*.csv"))
-    for f in files:
-        process_file(f, "market_prices", {"source": "file_market"}, {"price_eur_mwh": "price_eur_mwh"})
-
-    print("Batch Data ingestion completed.")
+    # Runs on a worker pool so the service can answer requests right away.
+    # Progress is available via /ingest/status
+    ingest_runner.start(discover_files(base_path))
+
+    if WEATHER_INGEST_ENABLED:
+        weather_ingestor.start()
+
+    if ROLLUP_ENABLED:
+        rollups.start()
+
+    if mqtt_gateway is not None:
+        mqtt_gateway.start()
 
     # Optional: Start simulation if needed for "live" feel beyond static data
     # asyncio.create_task(run_simulation())
 
+    yield
+
+    # Stop taking device readings and hand the merged ones to the writer first
+    if mqtt_gateway is not None:
+        await mqtt_gateway.stop()
+    # Flush whatever is still buffered
+    writer.close(timeout=10)
+    if rollups is not None:
+        rollups.stop()
+    storage.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/health/live")
+def liveness():
+    return readiness.live()
+
+@app.get("/health/ready")
+async def readiness_probe():
+    ready, details = await readiness.ready()
+    return JSONResponse(details, status_code=200 if ready else 503)
+
 @app.get("/health", dependencies=[Depends(verify_token)])
 def health_check():
-    return {"status": "running", "service": "ingest_service"}
+    return {"status": "running", "service": "ingest_service", "storage": storage.name}
+
+@app.get("/ingest/status", dependencies=[Depends(verify_token)])
+def ingest_status():
+    return ingest_runner.status()
+
+@app.get("/weather/status", dependencies=[Depends(verify_token)])
+def weather_status():
+    return weather_ingestor.status()
+
+@app.get("/rollup/status", dependencies=[Depends(verify_token)])
+def rollup_status():
+    if rollups is None:
+        return {"enabled": False, "backend": storage.name}
+    return rollups.status()
+
+@app.get("/writer/stats", dependencies=[Depends(verify_token)])
+def writer_stats():
+    return writer.stats()
+
+push_stats = PushStats()
+
+@app.post("/ingest", dependencies=[Depends(verify_token)])
+async def push_ingest(
+    request: Request,
+    precision: str = "ns",
+    measurement: str | None = None,
+    tag: Annotated[list[str] | None, Query()] = None,
+):
+    """
+    Accepts points pushed by devices and gateways, selected by Content-Type:
+    line protocol (text/plain), NDJSON ({"measurement", "tags", "fields", "time"}
+    per line) or CSV (header row; `time`, field columns, tag columns named with
+    ?tag=, measurement from ?measurement= or a column). gzip bodies are accepted.
+    Numeric times use ?precision (ns, us, ms, s); points without time get the
+    arrival time. The body is parsed while it streams in and valid points go to
+    the batching writer. Invalid lines are skipped and reported.
+    429 means the write buffer is full: nothing after the reported `accepted`
+    points was taken. Re-sending the whole body is safe for points with a time
+    (same series and time overwrite); points without one get a new arrival time
+    and are stored twice, so re-send only the points after the first `accepted` ones.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > PUSH_MAX_BODY_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Body larger than {PUSH_MAX_BODY_BYTES} bytes")
+    try:
+        parser = make_parser(media_format(request.headers.get("content-type")), precision, measurement, tag or ())
+        intake = PushIntake(offer_points, parser, encoding=request.headers.get("content-encoding"))
+        taken = True
+        async for chunk in request.stream():
+            # Parsing is CPU work, keep it off the event loop
+            if chunk and not await run_in_threadpool(intake.feed, chunk):
+                taken = False
+                break
+        if taken:
+            taken = await run_in_threadpool(intake.finish)
+    except PushError as e:
+        push_stats.add(requests=1)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    push_stats.add(requests=1, points=intake.points, invalid_lines=intake.invalid, throttled=0 if taken else 1,
+                   bytes=intake.body_bytes)
+    result = {"accepted": intake.points, "invalid": intake.invalid, "errors": intake.errors}
+    if not taken:
+        return JSONResponse({"detail": "Write buffer full, retry later", **result},
+                            status_code=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": "1"})
+    if intake.invalid and not intake.points:
+        return JSONResponse({"detail": "No valid points", **result}, status_code=status.HTTP_400_BAD_REQUEST)
+    return result
+
+@app.get("/ingest/push/stats", dependencies=[Depends(verify_token)])
+def push_ingest_stats():
+    return push_stats.snapshot()
+
+@app.get("/mqtt/status", dependencies=[Depends(verify_token)])
+def mqtt_status(top: int = Query(20, ge=0, le=1000)):
+    # Message rate and lag of the busiest device topics
+    if mqtt_gateway is None:
+        return {"enabled": False}
+    return mqtt_gateway.status(top=top)
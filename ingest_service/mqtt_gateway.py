@@ -0,0 +1,423 @@
+import os
+import json
+import math
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from batch_ingest import series_prefix
+
+try:
+    import aiomqtt
+except ImportError:
+    aiomqtt = None
+
+MQTT_ENABLED = os.getenv("MQTT_ENABLED", "false").lower() == "true"
+# mqtt://[user:password@]host:port, or "local" for the in-process broker
+MQTT_URL = os.getenv("MQTT_URL", "mqtt://localhost:1883")
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "hems-ingest")
+MQTT_QOS = int(os.getenv("MQTT_QOS", 1))
+# Several ingest processes can split the devices with an MQTT 5 shared subscription
+MQTT_SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "")
+# Topic layout: {name} segments become tags; one more segment names the field of a plain-number payload
+MQTT_TOPIC_TEMPLATE = os.getenv("MQTT_TOPIC_TEMPLATE", "hems/{site}/{device}")
+MQTT_MEASUREMENT = os.getenv("MQTT_MEASUREMENT", "energy_flow")
+# payload key = energy_flow field [* scale]; other keys are ignored
+MQTT_FIELD_MAP = os.getenv(
+    "MQTT_FIELD_MAP",
+    "pv_power_kw=pv_power_kw,consumption_power_kw=consumption_power_kw,"
+    "pv=pv_power_kw,pv_kw=pv_power_kw,pv_w=pv_power_kw*0.001,"
+    "load=consumption_power_kw,load_kw=consumption_power_kw,load_w=consumption_power_kw*0.001,"
+    "consumption=consumption_power_kw,grid=grid_kw,grid_kw=grid_kw,grid_w=grid_kw*0.001",
+)
+# Readings of one device and timestamp arriving within this window become one point
+MQTT_COALESCE_SECONDS = float(os.getenv("MQTT_COALESCE_SECONDS", 0.25))
+# Recently seen (series, time, field) values, for dropping redelivered messages
+MQTT_DEDUP_SIZE = int(os.getenv("MQTT_DEDUP_SIZE", 200000))
+# Points held while the writer pushes back; beyond that new readings are dropped
+MQTT_MAX_PENDING = int(os.getenv("MQTT_MAX_PENDING", 200000))
+# Topics with their own counters in /mqtt/status
+MQTT_STATS_TOPICS = int(os.getenv("MQTT_STATS_TOPICS", 20000))
+MQTT_RECONNECT_MAX = float(os.getenv("MQTT_RECONNECT_MAX", 30))
+
+TIME_KEYS = ("ts", "time", "timestamp")
+RATE_WINDOW = 10.0
+
+
+def parse_field_map(spec):
+    mapping = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        key, _, target = item.partition("=")
+        field, _, scale = target.partition("*")
+        mapping[key.strip()] = (field.strip(), float(scale) if scale else 1.0)
+    return mapping
+
+
+def topic_matches(pattern, topic):
+    """MQTT wildcard match (+ one level, # the rest)."""
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+def payload_time_ns(value):
+    """ns of an epoch number (s, ms, us or ns, told apart by magnitude) or an RFC3339 string."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError(f"timestamp {value} is not finite")
+        v = abs(value)
+        scale = 1e9 if v < 1e11 else 1e6 if v < 1e14 else 1e3 if v < 1e17 else 1
+        ns = int(value * scale)
+    else:
+        t = datetime.fromisoformat(str(value))
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        ns = int(t.timestamp()) * 1_000_000_000 + t.microsecond * 1000
+    # Line protocol times are signed 64 bit
+    if not -2 ** 63 <= ns < 2 ** 63:
+        raise ValueError(f"timestamp {value} out of range")
+    return ns
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else None
+
+
+class TopicStats:
+    __slots__ = ("messages", "window_start", "window_count", "rate", "last_seen", "receive_lag_ms")
+
+    def __init__(self, now):
+        self.messages = 0
+        self.window_start = now
+        self.window_count = 0
+        self.rate = 0.0
+        self.last_seen = now
+        self.receive_lag_ms = None
+
+    def add(self, now, lag_ms):
+        self.messages += 1
+        self.last_seen = now
+        if now - self.window_start >= RATE_WINDOW:
+            self.rate = self.window_count / (now - self.window_start)
+            self.window_start, self.window_count = now, 0
+        self.window_count += 1
+        if lag_ms is not None:
+            # Smoothed, a single late message does not dominate
+            self.receive_lag_ms = lag_ms if self.receive_lag_ms is None else 0.8 * self.receive_lag_ms + 0.2 * lag_ms
+
+    def as_dict(self, now):
+        elapsed = now - self.window_start
+        rate = self.window_count / elapsed if elapsed >= 1 else self.rate
+        return {"messages": self.messages, "rate_per_s": round(rate, 2),
+                "last_seen_s_ago": round(now - self.last_seen, 1),
+                "receive_lag_ms": None if self.receive_lag_ms is None else round(self.receive_lag_ms, 1)}
+
+
+class LocalBroker:
+    """
+    In-process MQTT-style broker (wildcard topics, no persistence or QoS) so the
+    gateway can run and be benchmarked without mosquitto. MQTT_URL=local.
+    """
+
+    def __init__(self, max_queue=100000):
+        self.max_queue = max_queue
+        self._subscribers = []   # (patterns, queue)
+        self.dropped = 0
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        for patterns, queue in self._subscribers:
+            if any(topic_matches(p, topic) for p in patterns):
+                try:
+                    queue.put_nowait((topic, payload))
+                except asyncio.QueueFull:
+                    self.dropped += 1
+
+    async def messages(self, patterns, on_subscribed=None):
+        queue = asyncio.Queue(self.max_queue)
+        entry = ([p.split("/", 2)[2] if p.startswith("$share/") else p for p in patterns], queue)
+        self._subscribers.append(entry)
+        if on_subscribed is not None:
+            on_subscribed()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(entry)
+
+
+async def aiomqtt_messages(url, patterns, qos=MQTT_QOS, client_id=MQTT_CLIENT_ID, on_subscribed=None):
+    """(topic, payload) from an MQTT broker via aiomqtt; on_subscribed() runs once the subscription is in place."""
+    if aiomqtt is None:
+        raise RuntimeError("aiomqtt is not installed")
+    u = urlparse(url)
+    async with aiomqtt.Client(u.hostname or "localhost", port=u.port or 1883, username=u.username,
+                              password=u.password, identifier=client_id) as client:
+        await client.subscribe([(p, qos) for p in patterns])
+        if on_subscribed is not None:
+            on_subscribed()
+        async for message in client.messages:
+            yield message.topic.value, message.payload
+
+
+class MqttGateway:
+    """
+    Subscribes to device topics and turns readings into energy_flow points.
+    Topics follow MQTT_TOPIC_TEMPLATE; payloads are JSON objects (keys mapped via
+    MQTT_FIELD_MAP, optional ts/time) or plain numbers on a per-field topic.
+    Redelivered readings are dropped, readings of one device and timestamp are
+    merged into one point and submitted in batches every MQTT_COALESCE_SECONDS.
+
+    handle_message() does not depend on the transport; run() feeds it from an
+    MQTT broker (aiomqtt) or the in-process LocalBroker.
+    """
+
+    def __init__(self, submit, url=MQTT_URL, template=MQTT_TOPIC_TEMPLATE, measurement=MQTT_MEASUREMENT,
+                 field_map=MQTT_FIELD_MAP, coalesce_seconds=MQTT_COALESCE_SECONDS, dedup_size=MQTT_DEDUP_SIZE,
+                 max_pending=MQTT_MAX_PENDING, stats_topics=MQTT_STATS_TOPICS, share_group=MQTT_SHARE_GROUP,
+                 broker=None):
+        self.submit = submit
+        self.url = url
+        self.broker = broker or (LocalBroker() if url == "local" else None)
+        self.measurement = measurement
+        self.field_map = parse_field_map(field_map) if isinstance(field_map, str) else dict(field_map)
+        self.coalesce_seconds = coalesce_seconds
+        self._window_ns = max(1, int(coalesce_seconds * 1e9))
+        self.dedup_size = dedup_size
+        self.max_pending = max_pending
+        self.stats_topics = stats_topics
+
+        self.segments = template.split("/")
+        self.tag_positions = [(i, s[1:-1]) for i, s in enumerate(self.segments) if s.startswith("{")]
+        base = "/".join("+" if s.startswith("{") else s for s in self.segments)
+        self.patterns = [base, base + "/+"]
+        if share_group:
+            self.patterns = [f"$share/{share_group}/{p}" for p in self.patterns]
+
+        self._prefixes = {}                # topic -> series prefix (None if the topic does not fit)
+        self._seen = OrderedDict()         # (prefix, ts, field) -> value digest
+        self._pending = {}                 # (prefix, ts) -> {field: value}
+        self._topics = {}                  # topic -> TopicStats
+        self._write_lag_ms = deque(maxlen=10000)
+        self._task = None
+        self._flusher = None
+        self.connected = False
+        self.last_error = None
+        self.counters = {"messages": 0, "points": 0, "duplicates": 0, "invalid": 0, "unmapped": 0,
+                         "coalesced": 0, "deferred": 0, "dropped": 0, "written": 0, "write_errors": 0,
+                         "reconnects": 0}
+
+    # --- message handling (transport independent) ---
+
+    def _prefix(self, topic):
+        prefix = self._prefixes.get(topic, False)
+        if prefix is False:
+            parts = topic.split("/")
+            # The topic without a per-field segment names the series
+            series = parts[:len(self.segments)]
+            if len(series) != len(self.segments) or any(
+                    s != p for s, p in zip(series, self.segments) if not p.startswith("{")):
+                prefix = None
+            else:
+                tags = {name: series[i] for i, name in self.tag_positions}
+                prefix = series_prefix(self.measurement, {"source": "mqtt", **tags}) if all(tags.values()) else None
+            if len(self._prefixes) < self.stats_topics * 4:
+                self._prefixes[topic] = prefix
+        return prefix
+
+    def _readings(self, topic, payload):
+        """[(field, value)], device time ns or None"""
+        field_segment = topic.split("/")[len(self.segments):]
+        text = payload.decode() if isinstance(payload, (bytes, bytearray)) else str(payload)
+        if field_segment:
+            key = field_segment[0]
+            return [(key, float(text))], None
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        ts = next((data[k] for k in TIME_KEYS if k in data), None)
+        readings = [(k, float(v)) for k, v in data.items()
+                    if k not in TIME_KEYS and isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return readings, None if ts is None else payload_time_ns(ts)
+
+    def handle_message(self, topic, payload, received_ns=None):
+        """Processes one message; returns the number of new readings taken."""
+        received_ns = received_ns or time.time_ns()
+        self.counters["messages"] += 1
+        prefix = self._prefix(topic)
+        try:
+            if prefix is None:
+                raise ValueError("topic does not match the template")
+            readings, ts = self._readings(topic, payload)
+        except (ValueError, TypeError, OverflowError):
+            self.counters["invalid"] += 1
+            return 0
+        self._topic_stats(topic, received_ns, ts)
+        if ts is None:
+            # Without a device time, readings arriving in the same window share one timestamp
+            ts = received_ns - received_ns % self._window_ns
+
+        taken = 0
+        for key, value in readings:
+            mapped = self.field_map.get(key)
+            if mapped is None or value != value or value in (float("inf"), float("-inf")):
+                self.counters["unmapped"] += 1
+                continue
+            field, scale = mapped
+            value = value * scale
+            point = self._pending.get((prefix, ts))
+            # A dropped reading must not be remembered, or its redelivery would count as a duplicate
+            if point is None and len(self._pending) >= self.max_pending:
+                self.counters["dropped"] += 1
+                continue
+            if self._duplicate(prefix, ts, field, value):
+                self.counters["duplicates"] += 1
+                continue
+            if point is None:
+                self._pending[(prefix, ts)] = {field: value}
+            else:
+                self.counters["coalesced"] += 1
+                point[field] = value
+            taken += 1
+        return taken
+
+    def _duplicate(self, prefix, ts, field, value):
+        key = (prefix, ts, field)
+        digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+        if self._seen.get(key) == digest:
+            self._seen.move_to_end(key)
+            return True
+        self._seen[key] = digest
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def _topic_stats(self, topic, received_ns, ts):
+        stats = self._topics.get(topic)
+        now = time.monotonic()
+        if stats is None:
+            if len(self._topics) >= self.stats_topics:
+                return
+            stats = self._topics[topic] = TopicStats(now)
+        stats.add(now, None if ts is None else (received_ns - ts) / 1e6)
+
+    def flush(self):
+        """Submits the merged points; kept for the next flush if the writer is full."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        lines, times = [], []
+        for (prefix, ts), fields in pending.items():
+            lines.append(f"{prefix} {','.join(f'{k}={v!r}' for k, v in fields.items())} {ts}")
+            times.append(ts)
+
+        def on_done(count, error):
+            if error is not None:
+                self.counters["write_errors"] += count
+                return
+            self.counters["written"] += count
+            now = time.time_ns()
+            # A sample of the batch is enough for the percentiles
+            for ts in times[::max(1, len(times) // 100)]:
+                self._write_lag_ms.append((now - ts) / 1e6)
+
+        if not self.submit(lines, on_done=on_done):
+            self.counters["deferred"] += len(lines)
+            # Newer readings of the same point win
+            for key, fields in pending.items():
+                self._pending[key] = {**fields, **self._pending.get(key, {})}
+            return 0
+        self.counters["points"] += len(lines)
+        return len(lines)
+
+    # --- transport ---
+
+    def _messages(self, on_subscribed):
+        if self.broker is not None:
+            return self.broker.messages(self.patterns, on_subscribed=on_subscribed)
+        return aiomqtt_messages(self.url, self.patterns, on_subscribed=on_subscribed)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.coalesce_seconds)
+            self.flush()
+
+    async def run(self):
+        delay = 1.0
+
+        def subscribed():
+            nonlocal delay
+            # Only counts as connected once the broker accepted the subscription
+            self.connected = True
+            delay = 1.0
+            print(f"MQTT gateway subscribed to {self.patterns} ({'local broker' if self.broker else self.url})")
+
+        while True:
+            try:
+                async for topic, payload in self._messages(subscribed):
+                    try:
+                        self.handle_message(topic, payload)
+                    except Exception as e:
+                        # One device's message must not cost everyone the subscription
+                        self.counters["invalid"] += 1
+                        self.last_error = f"{topic}: {e}"
+                    # Hand control back now and then when a burst is queued
+                    if self.counters["messages"] % 1000 == 0:
+                        await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"MQTT gateway disconnected ({e}), reconnecting in {delay:.0f}s")
+            self.connected = False
+            self.counters["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MQTT_RECONNECT_MAX)
+
+    def start(self):
+        if self.broker is None and aiomqtt is None:
+            self.last_error = "aiomqtt is not installed"
+            print("MQTT gateway not started: aiomqtt is not installed")
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        for task in (self._task, self._flusher):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._flusher = None
+        self.connected = False
+        self.flush()
+
+    def status(self, top=20):
+        now = time.monotonic()
+        busiest = sorted(self._topics.items(), key=lambda kv: kv[1].messages, reverse=True)[:top]
+        lags = list(self._write_lag_ms)
+        return {
+            "enabled": True,
+            "connected": self.connected,
+            "transport": "local" if self.broker is not None else self.url.rsplit("@", 1)[-1],
+            "subscriptions": self.patterns,
+            "last_error": self.last_error,
+            **self.counters,
+            "pending_points": len(self._pending),
+            "topics": len(self._topics),
+            "message_rate_per_s": round(sum(s.as_dict(now)["rate_per_s"] for s in self._topics.values()), 1),
+            "end_to_end_lag_ms": {"p50": percentile(lags, 50), "p99": percentile(lags, 99),
+                                  "max": max(lags) if lags else None},
+            "busiest_topics": {topic: s.as_dict(now) for topic, s in busiest},
+        }
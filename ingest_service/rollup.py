@@ -0,0 +1,188 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Seconds between rollup passes (new raw data is rolled up at most this late)
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", 60))
+# Raw range aggregated per Flux call during backfills
+ROLLUP_CHUNK_DAYS = int(os.getenv("ROLLUP_CHUNK_DAYS", 30))
+
+SOURCE_MEASUREMENT = "energy_flow"
+# (measurement, Flux window, window length), finest first
+TIERS = [
+    ("energy_flow_15m", "15m", timedelta(minutes=15)),
+    ("energy_flow_1h", "1h", timedelta(hours=1)),
+    ("energy_flow_1d", "1d", timedelta(days=1)),
+]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def record_time(record):
+    """Timestamp of a line protocol string or Point as aware datetime (None if it has none)."""
+    if isinstance(record, str):
+        parts = record.rsplit(" ", 1)
+        if len(parts) == 2 and parts[1].lstrip("-").isdigit():
+            return EPOCH + timedelta(microseconds=int(parts[1]) // 1000)
+        return None
+    t = getattr(record, "_time", None)
+    if isinstance(t, datetime):
+        return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
+    if isinstance(t, int):
+        return EPOCH + timedelta(microseconds=t // 1000)
+    return None
+
+
+def _floor(t, step):
+    return EPOCH + ((t - EPOCH) // step) * step
+
+
+def _rfc3339(t):
+    return t.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RollupWorker:
+    """
+    Keeps energy_flow_15m / _1h / _1d up to date (mean per window, same tags and
+    fields as energy_flow). The writer reports every flushed batch via mark_dirty();
+    a background thread then re-aggregates only the windows those points fall into,
+    server side with Flux to(). On start it also catches up on raw data that was
+    written while it was not running.
+
+    query(flux) runs a Flux query and returns its tables.
+    """
+
+    def __init__(self, query, bucket, org, on_done=None, interval=ROLLUP_INTERVAL,
+                 chunk=timedelta(days=ROLLUP_CHUNK_DAYS)):
+        self.query = query
+        self.bucket = bucket
+        self.org = org
+        self.on_done = on_done
+        self.interval = interval
+        self.chunk = chunk
+        self._cond = threading.Condition()
+        self._dirty = None          # (start, stop) of raw data not rolled up yet
+        self._thread = None
+        self._stopped = False
+        self._status = {"passes": 0, "windows_rolled_up": {m: 0 for m, _, _ in TIERS},
+                        "last_pass": None, "last_pass_ms": None, "last_error": None}
+
+    def mark_dirty(self, records):
+        """BatchingWriter.on_flush hook: remembers the time span of new energy_flow points."""
+        lo = hi = None
+        for r in records:
+            name = r.split(",", 1)[0].split(" ", 1)[0] if isinstance(r, str) else getattr(r, "_name", None)
+            if name != SOURCE_MEASUREMENT:
+                continue
+            t = record_time(r) or datetime.now(timezone.utc)
+            lo = t if lo is None or t < lo else lo
+            hi = t if hi is None or t > hi else hi
+        if lo is not None:
+            self._extend(lo, hi)
+
+    def _extend(self, lo, hi):
+        with self._cond:
+            if self._dirty is None:
+                self._dirty = (lo, hi)
+            else:
+                self._dirty = (min(self._dirty[0], lo), max(self._dirty[1], hi))
+
+    def _bounds(self, measurement):
+        """(first, last) timestamp of a measurement or (None, None)."""
+        flux = f'''
+        data = from(bucket: "{self.bucket}")
+          |> range(start: 0, stop: 2100-01-01T00:00:00Z)
+          |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+          |> keep(columns: ["_time"])
+        union(tables: [data |> min(column: "_time"), data |> max(column: "_time")])
+        '''
+        times = [rec.get_time() for table in self.query(flux) for rec in table.records]
+        return (min(times), max(times)) if times else (None, None)
+
+    def catch_up(self):
+        """Marks raw data newer than the coarsest tier (or all of it) as dirty."""
+        raw_first, raw_last = self._bounds(SOURCE_MEASUREMENT)
+        if raw_first is None:
+            return
+        _, tier_last = self._bounds(TIERS[-1][0])
+        start = raw_first if tier_last is None else max(raw_first, tier_last - TIERS[-1][2])
+        if start <= raw_last:
+            self._extend(start, raw_last)
+
+    def _rollup(self, measurement, every, step, start, stop):
+        flux = f'''
+        from(bucket: "{self.bucket}")
+          |> range(start: {_rfc3339(start)}, stop: {_rfc3339(stop)})
+          |> filter(fn: (r) => r["_measurement"] == "{SOURCE_MEASUREMENT}")
+          |> aggregateWindow(every: {every}, fn: mean, createEmpty: false)
+          |> set(key: "_measurement", value: "{measurement}")
+          |> to(bucket: "{self.bucket}", org: "{self.org}")
+          |> count()
+        '''
+        self.query(flux)
+        self._status["windows_rolled_up"][measurement] += int((stop - start) / step)
+
+    def run_once(self):
+        """Rolls up the dirty span into every tier. Returns False if there was nothing to do."""
+        with self._cond:
+            dirty, self._dirty = self._dirty, None
+        if dirty is None:
+            return False
+        t0 = datetime.now(timezone.utc)
+        try:
+            for measurement, every, step in TIERS:
+                # Whole windows only, so partially covered windows are recomputed completely
+                start, stop = _floor(dirty[0], step), _floor(dirty[1], step) + step
+                chunk = max(self.chunk, step)
+                while start < stop:
+                    end = min(stop, start + chunk)
+                    self._rollup(measurement, every, step, start, end)
+                    start = end
+        except Exception:
+            # Try the same span again next pass
+            self._extend(*dirty)
+            raise
+        self._status.update(
+            passes=self._status["passes"] + 1,
+            last_pass=_rfc3339(t0),
+            last_pass_ms=round((datetime.now(timezone.utc) - t0).total_seconds() * 1000, 1),
+            last_error=None,
+        )
+        if self.on_done:
+            self.on_done([m for m, _, _ in TIERS])
+        return True
+
+    def _run(self):
+        caught_up = False
+        while True:
+            try:
+                if not caught_up:
+                    self.catch_up()
+                    caught_up = True
+                self.run_once()
+            except Exception as e:
+                self._status["last_error"] = str(e)
+                print(f"Rollup pass failed: {e}")
+            with self._cond:
+                self._cond.wait(self.interval)
+                if self._stopped:
+                    return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="rollup-worker")
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            dirty = self._dirty
+        s = dict(self._status)
+        s["windows_rolled_up"] = dict(s["windows_rolled_up"])
+        s["pending"] = [_rfc3339(dirty[0]), _rfc3339(dirty[1])] if dirty else None
+        s["tiers"] = [m for m, _, _ in TIERS]
+        return s
@@ -0,0 +1,321 @@
+import os
+import csv
+import json
+import math
+import time
+import zlib
+import threading
+from datetime import datetime, timezone
+
+from batch_ingest import series_prefix, _escape
+from common.storage import parse_line, to_ns
+
+# Largest accepted request body (after decompression) and line
+PUSH_MAX_BODY_BYTES = int(os.getenv("PUSH_MAX_BODY_BYTES", 64 * 1024 * 1024))
+PUSH_MAX_LINE_BYTES = int(os.getenv("PUSH_MAX_LINE_BYTES", 64 * 1024))
+# Lines parsed and handed to the writer at once
+PUSH_BATCH_LINES = int(os.getenv("PUSH_BATCH_LINES", 5000))
+# Invalid lines reported back per request (all of them are counted)
+PUSH_MAX_ERRORS = int(os.getenv("PUSH_MAX_ERRORS", 20))
+
+PRECISION_NS = {"ns": 1, "us": 1_000, "ms": 1_000_000, "s": 1_000_000_000}
+
+LINE_PROTOCOL = "text/plain"
+NDJSON = "application/x-ndjson"
+CSV = "text/csv"
+FORMATS = {
+    "text/plain": LINE_PROTOCOL,
+    "application/vnd.influx.line-protocol": LINE_PROTOCOL,
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+    "text/csv": CSV,
+}
+
+
+class PushError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def media_format(content_type):
+    media_type = (content_type or LINE_PROTOCOL).split(";", 1)[0].strip().lower()
+    if media_type not in FORMATS:
+        raise PushError(415, f"Unsupported Content-Type '{media_type}', expected one of {sorted(FORMATS)}")
+    return FORMATS[media_type]
+
+
+def _check_float(key, value):
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"field {key} is not a finite number")
+
+
+def check_series(measurement, tags, fields):
+    # InfluxDB rejects a whole batch for one bad line, so everything is checked up front
+    if not measurement or not isinstance(measurement, str):
+        raise ValueError("missing measurement")
+    for k, v in tags.items():
+        if not k or not isinstance(v, str) or not v:
+            raise ValueError(f"tag {k!r} needs a non-empty string value")
+    names = [measurement, *tags, *tags.values(), *fields]
+    if any("\n" in s or "\r" in s for s in names):
+        raise ValueError("names and tag values cannot contain line breaks")
+    if not fields or not all(fields):
+        raise ValueError("missing field name")
+
+
+def field_set(fields):
+    """Line protocol field set of a dict; None values are left out."""
+    parts = []
+    for k, v in fields.items():
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            value = "true" if v else "false"
+        elif isinstance(v, int):
+            value = f"{v}i"
+        elif isinstance(v, float):
+            _check_float(k, v)
+            value = repr(v)
+        elif isinstance(v, str):
+            if "\n" in v or "\r" in v:
+                raise ValueError(f"field {k} contains a line break")
+            value = '"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        else:
+            raise ValueError(f"field {k} has unsupported type {type(v).__name__}")
+        parts.append(f"{_escape(k)}={value}")
+    if not parts:
+        raise ValueError("no field values")
+    return ",".join(parts)
+
+
+def parse_time(value, precision):
+    """ns timestamp of an epoch number (in the request precision) or an RFC3339 string."""
+    if isinstance(value, bool):
+        raise ValueError(f"invalid time {value!r}")
+    if isinstance(value, (int, float)):
+        return int(value * PRECISION_NS[precision])
+    value = str(value).strip()
+    if value.lstrip("-").isdigit():
+        return int(value) * PRECISION_NS[precision]
+    t = datetime.fromisoformat(value)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return to_ns(t)
+
+
+class LineProtocolParser:
+    """Validates line protocol; valid lines are passed on with their timestamp in ns."""
+
+    def __init__(self, precision="ns"):
+        self.scale = PRECISION_NS[precision]
+
+    def header(self, line):
+        return False
+
+    def parse(self, line, now_ns):
+        try:
+            measurement, tags, fields, ts = parse_line(line)
+        except (ValueError, IndexError) as e:
+            raise ValueError(f"expected 'measurement[,tag=value...] field=value[,...] [timestamp]' ({e})")
+        check_series(measurement, tags, fields)
+        for k, v in fields.items():
+            _check_float(k, v)
+        if ts is None:
+            return f"{line} {now_ns}"
+        if self.scale != 1:
+            return f"{line.rsplit(' ', 1)[0]} {ts * self.scale}"
+        return line
+
+
+class NdjsonParser:
+    """One JSON object per line: {"measurement", "tags", "fields", "time"}."""
+
+    def __init__(self, precision="ns"):
+        self.precision = precision
+
+    def header(self, line):
+        return False
+
+    def parse(self, line, now_ns):
+        obj = json.loads(line)
+        if not isinstance(obj, dict):
+            raise ValueError("expected a JSON object")
+        measurement = obj.get("measurement")
+        fields = obj.get("fields")
+        if not isinstance(fields, dict):
+            raise ValueError("missing fields object")
+        tags = obj.get("tags") or {}
+        if not isinstance(tags, dict):
+            raise ValueError("tags must be an object")
+        check_series(measurement, tags, fields)
+        # JSON does not tell 1 from 1.0; numbers are float fields like everywhere else in the store
+        fields = {k: float(v) if isinstance(v, int) and not isinstance(v, bool) else v for k, v in fields.items()}
+        ts = obj.get("time")
+        ts = now_ns if ts is None else parse_time(ts, self.precision)
+        return f"{series_prefix(measurement, tags)} {field_set(fields)} {ts}"
+
+
+class CsvParser:
+    """
+    CSV with a header row: a `time` column, tag columns (given as tag names) and
+    numeric field columns. The measurement comes from the query string or a
+    `measurement` column; empty cells are skipped.
+    """
+
+    def __init__(self, precision="ns", measurement=None, tag_columns=()):
+        self.precision = precision
+        self.measurement = measurement
+        self.tag_columns = set(tag_columns)
+        self.columns = None
+
+    def header(self, line):
+        if self.columns is not None:
+            return False
+        self.columns = next(csv.reader([line]))
+        if self.measurement is None and "measurement" not in self.columns:
+            raise PushError(422, "CSV needs a measurement column or ?measurement=")
+        return True
+
+    def parse(self, line, now_ns):
+        row = next(csv.reader([line]))
+        if len(row) != len(self.columns):
+            raise ValueError(f"expected {len(self.columns)} columns, got {len(row)}")
+        measurement, tags, fields, ts = self.measurement, {}, {}, now_ns
+        for name, value in zip(self.columns, row):
+            if value == "":
+                continue
+            if name == "time":
+                ts = parse_time(value, self.precision)
+            elif name == "measurement":
+                measurement = value
+            elif name in self.tag_columns:
+                tags[name] = value
+            else:
+                fields[name] = float(value)
+        check_series(measurement, tags, fields)
+        return f"{series_prefix(measurement, tags)} {field_set(fields)} {ts}"
+
+
+def make_parser(fmt, precision="ns", measurement=None, tag_columns=()):
+    if precision not in PRECISION_NS:
+        raise PushError(422, f"precision must be one of {sorted(PRECISION_NS)}")
+    if fmt == CSV:
+        return CsvParser(precision, measurement, tag_columns)
+    if fmt == NDJSON:
+        return NdjsonParser(precision)
+    return LineProtocolParser(precision)
+
+
+class PushStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "points": 0, "invalid_lines": 0, "throttled": 0, "bytes": 0}
+
+    def add(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                self._stats[k] += v
+
+    def snapshot(self):
+        with self._lock:
+            s = dict(self._stats)
+        # CPU seconds of this process, so load generators can report points per core
+        s["process_cpu_s"] = round(time.process_time(), 3)
+        return s
+
+
+class PushIntake:
+    """
+    Turns a streamed request body into validated line protocol for the writer.
+    The body is decompressed and split into lines incrementally, so memory stays
+    at one batch of lines regardless of the request size. Parsed batches are
+    submitted without blocking; a full writer queue aborts the request (429).
+    """
+
+    def __init__(self, submit, parser, batch_lines=PUSH_BATCH_LINES, max_body=PUSH_MAX_BODY_BYTES,
+                 max_line=PUSH_MAX_LINE_BYTES, max_errors=PUSH_MAX_ERRORS, encoding=None):
+        self.submit = submit
+        self.parser = parser
+        self.batch_lines = batch_lines
+        self.max_body = max_body
+        self.max_line = max_line
+        self.max_errors = max_errors
+        if encoding in (None, "", "identity"):
+            self._inflate = None
+        elif encoding == "gzip":
+            self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._inflate = zlib.decompressobj()
+        else:
+            raise PushError(415, f"Unsupported Content-Encoding '{encoding}'")
+        self._tail = b""
+        self._pending = []
+        self.body_bytes = 0
+        self.line_no = 0
+        self.points = 0
+        self.invalid = 0
+        self.errors = []
+
+    def feed(self, chunk):
+        """Takes the next raw body chunk; returns False once the writer refused a batch."""
+        if self._inflate is not None:
+            # Output is capped, so a small gzip bomb cannot inflate beyond the body limit
+            chunk = self._decompress(self._inflate.decompress, chunk, self.max_body - self.body_bytes + 1)
+        self.body_bytes += len(chunk)
+        if self.body_bytes > self.max_body:
+            raise PushError(413, f"Body larger than {self.max_body} bytes")
+        data = self._tail + chunk
+        lines = data.split(b"\n")
+        self._tail = lines.pop()
+        if len(self._tail) > self.max_line:
+            raise PushError(413, f"Line {self.line_no + len(lines) + 1} longer than {self.max_line} bytes")
+        self._pending.extend(lines)
+        if len(self._pending) >= self.batch_lines:
+            return self._flush()
+        return True
+
+    def finish(self):
+        if self._inflate is not None:
+            self._tail += self._decompress(self._inflate.flush)
+            if not self._inflate.eof:
+                raise PushError(400, f"Compressed body is truncated after {self.points} accepted points")
+        if self._tail:
+            self._pending.append(self._tail)
+            self._tail = b""
+        return self._flush()
+
+    @staticmethod
+    def _decompress(step, *args):
+        try:
+            return step(*args)
+        except zlib.error as e:
+            raise PushError(400, f"Body is not valid compressed data: {e}")
+
+    def _flush(self):
+        now_ns = time.time_ns()
+        out = []
+        parse = self.parser.parse
+        for raw in self._pending:
+            self.line_no += 1
+            line = raw.decode("utf-8", "replace").strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                if self.parser.header(line):
+                    continue
+                out.append(parse(line, now_ns))
+            except PushError:
+                raise
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                self.invalid += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({"line": self.line_no, "error": str(e) or type(e).__name__})
+        self._pending = []
+        if out:
+            if not self.submit(out):
+                return False
+            self.points += len(out)
+        return True
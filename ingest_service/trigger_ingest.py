@@ -5,19 +5,28 @@ import asyncio
 
 # Ensure ingest_service is in path
 sys.path.append(os.path.join(os.getcwd(), 'ingest_service'))
+# Repo root for the shared `common` package
+sys.path.append(os.getcwd())
 
 # Set env vars if needed (defaults are usually localhost:8086)
 # os.environ["INFLUX_URL"] = "http://localhost:8086"
 
 try:
-    from main import startup_event
+    from main import startup_event, ingest_runner, ingest_manifest
 except ImportError:
     # Try importing as package
-    from ingest_service.main import startup_event
+    from ingest_service.main import startup_event, ingest_runner, ingest_manifest
 
 async def main():
+    if "--force" in sys.argv:
+        # Forget what was ingested so every file is written again
+        print("Resetting ingest manifest...")
+        ingest_manifest.reset()
     print("Triggering startup_event manually...")
     await startup_event()
+    # Ingest runs in the background, wait for it before exiting
+    ingest_runner.wait()
+    print(ingest_runner.status())
     print("Finished startup_event.")
 
 if __name__ == "__main__":
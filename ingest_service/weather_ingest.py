@@ -0,0 +1,164 @@
+import os
+import json
+import math
+import asyncio
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from batch_ingest import series_prefix
+
+# "openmeteo" (default) or "stub" (synthetic clear-sky data, no network)
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "openmeteo")
+# Klagenfurt coordinates
+WEATHER_LATITUDE = float(os.getenv("WEATHER_LATITUDE", 46.6247))
+WEATHER_LONGITUDE = float(os.getenv("WEATHER_LONGITUDE", 14.3053))
+WEATHER_LOCATION = os.getenv("WEATHER_LOCATION", "Klagenfurt")
+# One API call per interval, for all users
+WEATHER_INGEST_INTERVAL = float(os.getenv("WEATHER_INGEST_INTERVAL", 3600))
+WEATHER_RETRY_SECONDS = float(os.getenv("WEATHER_RETRY_SECONDS", 300))
+# History fetched when the bucket has no weather data yet (Open-Meteo allows up to 92)
+WEATHER_BACKFILL_DAYS = int(os.getenv("WEATHER_BACKFILL_DAYS", 14))
+# Forecast days written ahead; the optimizer uses them as PV input
+WEATHER_FORECAST_DAYS = int(os.getenv("WEATHER_FORECAST_DAYS", 2))
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", 10))
+
+MEASUREMENT = "weather"
+# Open-Meteo hourly variable -> field name
+FIELDS = ["shortwave_radiation", "temperature_2m"]
+MAX_PAST_DAYS = 92
+
+
+def fetch_open_meteo(past_days, forecast_days):
+    """Hourly rows [(datetime utc, {field: value})] from the Open-Meteo forecast API."""
+    url = (
+        "https://api.open-meteo.com/v1/forecast"
+        f"?latitude={WEATHER_LATITUDE}&longitude={WEATHER_LONGITUDE}"
+        f"&hourly={','.join(FIELDS)}&past_days={past_days}&forecast_days={forecast_days}&timezone=UTC"
+    )
+    with urllib.request.urlopen(url, timeout=WEATHER_TIMEOUT_SECONDS) as response:
+        hourly = json.load(response).get("hourly", {})
+    rows = []
+    for i, t in enumerate(hourly.get("time", [])):
+        values = {f: hourly.get(f, [None] * (i + 1))[i] for f in FIELDS}
+        rows.append((datetime.fromisoformat(t).replace(tzinfo=timezone.utc), values))
+    return rows
+
+
+def fetch_stub(past_days, forecast_days):
+    """Clear-sky day (800 W/m² at noon) for offline development."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=past_days)
+    rows = []
+    for h in range((past_days + forecast_days) * 24):
+        t = start + timedelta(hours=h)
+        irr = max(0.0, math.sin(math.pi * (t.hour - 6) / 12)) * 800 if 6 <= t.hour <= 18 else 0.0
+        temp = 12 + 6 * math.sin(math.pi * (t.hour - 9) / 12)
+        rows.append((t, {"shortwave_radiation": round(irr, 1), "temperature_2m": round(temp, 1)}))
+    return rows
+
+
+FETCHERS = {"openmeteo": fetch_open_meteo, "stub": fetch_stub}
+
+
+class WeatherIngestor:
+    """
+    Writes hourly irradiance and temperature to the "weather" measurement.
+
+    On the first run it backfills from the newest stored hour (or WEATHER_BACKFILL_DAYS
+    on an empty bucket); after that every run fetches the last day plus the forecast.
+    Rows are de-duplicated twice: hours whose values did not change since the last
+    write are skipped, and re-written hours (forecast replaced by newer model data)
+    land on the same series and timestamp, so InfluxDB overwrites instead of duplicating.
+    """
+
+    def __init__(self, write, last_timestamp=None, fetch=None, interval=WEATHER_INGEST_INTERVAL,
+                 backfill_days=WEATHER_BACKFILL_DAYS, forecast_days=WEATHER_FORECAST_DAYS):
+        self.write = write
+        self.last_timestamp = last_timestamp
+        self.fetch = fetch or FETCHERS[WEATHER_PROVIDER]
+        self.interval = interval
+        self.backfill_days = backfill_days
+        self.forecast_days = forecast_days
+        self.tags = {"location": WEATHER_LOCATION}
+        self._written = {}       # hour -> values last written
+        self._first_run = True
+        self._task = None
+        self._status = {"runs": 0, "rows_fetched": 0, "rows_written": 0, "rows_unchanged": 0,
+                        "last_run": None, "last_past_days": None, "last_error": None}
+
+    def _past_days(self):
+        if not self._first_run:
+            return 1
+        newest = None
+        if self.last_timestamp is not None:
+            try:
+                newest = self.last_timestamp(MEASUREMENT)
+            except Exception as e:
+                print(f"Weather ingest: could not read newest stored hour ({e}), backfilling")
+        if newest is None:
+            return self.backfill_days
+        # Stored hours up to forecast_days before the newest one may still be forecasts
+        gap = datetime.now(timezone.utc) - newest
+        return max(1, min(MAX_PAST_DAYS, math.ceil(gap / timedelta(days=1)) + self.forecast_days))
+
+    def to_lines(self, rows):
+        prefix = series_prefix(MEASUREMENT, self.tags)
+        lines = []
+        for t, values in rows:
+            fields = ",".join(f"{k}={float(v)}" for k, v in values.items() if v is not None)
+            if fields:
+                lines.append(f"{prefix} {fields} {int(t.timestamp()) * 10**9}")
+        return lines
+
+    def run_once(self):
+        """Fetches and writes one round. Returns the number of rows written."""
+        past_days = self._past_days()
+        rows = self.fetch(past_days, self.forecast_days)
+        changed = [(t, v) for t, v in rows if self._written.get(t) != v]
+        lines = self.to_lines(changed)
+        for t, v in changed:
+            self._written[t] = v
+        if lines:
+            self.write(lines, on_done=lambda count, error: self._forget(changed) if error else None)
+        # Only the window re-fetched by regular runs needs to be remembered
+        horizon = datetime.now(timezone.utc) - timedelta(days=2)
+        self._written = {t: v for t, v in self._written.items() if t >= horizon}
+        self._first_run = False
+        self._status.update(
+            runs=self._status["runs"] + 1,
+            rows_fetched=self._status["rows_fetched"] + len(rows),
+            rows_written=self._status["rows_written"] + len(lines),
+            rows_unchanged=self._status["rows_unchanged"] + len(rows) - len(changed),
+            last_run=datetime.now(timezone.utc).isoformat(),
+            last_past_days=past_days,
+            last_error=None,
+        )
+        print(f"Weather ingest: {len(lines)} of {len(rows)} hours written (past_days={past_days})")
+        return len(lines)
+
+    def _forget(self, rows):
+        # The writer gave up on these hours, write them again next run
+        for t, v in rows:
+            if self._written.get(t) == v:
+                self._written.pop(t, None)
+
+    async def run_forever(self):
+        while True:
+            try:
+                # urllib and the writer may block, keep them off the event loop
+                await asyncio.to_thread(self.run_once)
+                delay = self.interval
+            except Exception as e:
+                self._status["last_error"] = str(e)
+                print(f"Weather ingest failed: {e}")
+                delay = WEATHER_RETRY_SECONDS
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    def status(self):
+        s = dict(self._status)
+        s["provider"] = WEATHER_PROVIDER
+        s["interval_seconds"] = self.interval
+        return s
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime
+import numpy as np
+
+# Backtest of the load/PV forecast models on the hourly history CSVs.
+# Fits every model on the data before the test period and reports the error on
+# the held-out period plus fit time and latency of one 96-slot (24h @ 15m) forecast.
+#   python backtest.py --test-days 365
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from forecast import heuristic_pv, random_load, slot_times  # noqa: E402
+from forecasting import MODELS, SERIES, load_history, make_model  # noqa: E402
+
+
+def errors(actual, predicted):
+    diff = predicted - actual
+    mae = float(np.mean(np.abs(diff)))
+    return {
+        "mae": mae,
+        "rmse": float(np.sqrt(np.mean(diff ** 2))),
+        # MAE relative to the mean level, comparable between series
+        "nmae_pct": 100 * mae / float(np.mean(np.abs(actual))),
+    }
+
+
+def baselines(series, train_values, test_times, test_values, lagged):
+    """Forecasts used before the models: random load / triangle PV, and day-ahead persistence."""
+    if series == "load":
+        old = random_load(test_times, np.random.default_rng(0))
+        old_name = "random_uniform"
+    else:
+        old = heuristic_pv(test_times, np.percentile(train_values, 99.9))
+        old_name = "triangle"
+    return [(old_name, old, None), ("persistence_24h", lagged, None)]
+
+
+def time_forecast(model, runs):
+    times = slot_times(datetime(2027, 6, 1), 24, 15)
+    model.predict(times)
+    latencies = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        model.predict(times)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the forecast models on the history CSVs")
+    parser.add_argument("--data-dir", default=None, help="History directory (default HISTORY_DATA_DIR)")
+    parser.add_argument("--test-days", type=int, default=365, help="Held-out period at the end of the history")
+    parser.add_argument("--runs", type=int, default=200, help="Repetitions for the inference timing")
+    args = parser.parse_args()
+
+    for series in SERIES:
+        times, values = load_history(series, args.data_dir)
+        split = times[-1] - np.timedelta64(args.test_days, "D")
+        train, test = times <= split, times > split
+        # Value 24 hours earlier for the persistence baseline
+        lag_idx = np.searchsorted(times, times[test] - np.timedelta64(24, "h"))
+        lagged = values[np.clip(lag_idx, 0, len(values) - 1)]
+        test_times, test_values = times[test], values[test]
+        print(f"\n{series}: train {train.sum()} h until {split}, test {test.sum()} h")
+        print(f"{'model':<18}{'MAE':>9}{'RMSE':>9}{'nMAE %':>9}{'fit ms':>9}{'96-slot ms':>12}")
+
+        rows = baselines(series, values[train], test_times, test_values, lagged)
+        for name in MODELS:
+            model = make_model(series, name)
+            t0 = time.perf_counter()
+            # Same mid-hour alignment as forecasting.get_model
+            model.fit(times[train] + np.timedelta64(30, "m"), values[train])
+            fit_ms = (time.perf_counter() - t0) * 1000
+            rows.append((name, model.predict(test_times + np.timedelta64(30, "m")), (fit_ms, time_forecast(model, args.runs))))
+
+        for name, predicted, timing in rows:
+            e = errors(test_values, predicted)
+            fit_ms, infer_ms = (f"{timing[0]:.1f}", f"{timing[1]:.3f}") if timing else ("-", "-")
+            print(f"{name:<18}{e['mae']:>9.3f}{e['rmse']:>9.3f}{e['nmae_pct']:>9.1f}{fit_ms:>9}{infer_ms:>12}")
+
+
+if __name__ == "__main__":
+    main()
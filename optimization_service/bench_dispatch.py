@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import numpy as np
+from datetime import datetime
+
+# Solve-time benchmark of the LP dispatch for 24h and 7d horizons.
+# Uses the heuristic PV/load profile and a synthetic day/night price curve,
+# so it runs without InfluxDB.
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from forecast import build_soc_profile  # noqa: E402
+from dispatch import BatteryParams, solve_dispatch  # noqa: E402
+
+CASES = [(24, 15), (24, 5), (168, 15)]
+
+
+def synthetic_prices(times):
+    hour = (times.astype("int64") // (3600 * 10**9)) % 24
+    return 100 + 40 * np.sin((hour - 13) / 24 * 2 * np.pi) + np.where((hour >= 17) & (hour <= 20), 60, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LP dispatch solve time")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--budget-ms", type=float, default=200.0, help="Latency budget to check p95 against")
+    args = parser.parse_args()
+
+    battery = BatteryParams()
+    rng = np.random.default_rng(0)
+    for horizon_hours, resolution_minutes in CASES:
+        profile = build_soc_profile(datetime(2026, 6, 1), horizon_hours, resolution_minutes, rng=rng)
+        prices = synthetic_prices(profile["time"])
+        latencies = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            plan = solve_dispatch(profile["pv_forecast"], profile["load_forecast"], prices, battery,
+                                  dt_hours=resolution_minutes / 60)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        verdict = "OK" if p95 <= args.budget_ms else "OVER BUDGET"
+        print(f"{horizon_hours:>4}h @ {resolution_minutes:>2}m  {len(prices):>5} slots  p50 {p50:7.2f} ms  "
+              f"p95 {p95:7.2f} ms  [{verdict}]  cost {plan['cost_eur']:.2f} EUR "
+              f"(no battery {plan['baseline_cost_eur']:.2f} EUR)")
+
+
+if __name__ == "__main__":
+    main()
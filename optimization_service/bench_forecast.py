@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Latency benchmark of the /forecast/soc_profile endpoint function for several
+# horizon/resolution combinations. Run from the repo root or the service folder.
+# Without --influx the writer's send is replaced by a no-op so only the request
+# path (build profile, serialize, enqueue, response) is measured.
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from influx_client import writer  # noqa: E402
+
+CASES = [(24, 15), (24, 5), (168, 15), (168, 5)]
+
+
+def bench(horizon_hours, resolution_minutes, runs):
+    latencies = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = main.generate_soc_forecast(horizon_hours=horizon_hours, resolution_minutes=resolution_minutes)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    points = len(result["data"])
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{horizon_hours:>4}h @ {resolution_minutes:>2}m  {points:>5} points  "
+          f"p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  ({p50 * 1000 / points:6.2f} us/point)")
+
+
+def main_():
+    parser = argparse.ArgumentParser(description="Benchmark SoC forecast endpoint latency")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--influx", action="store_true", help="Really write to InfluxDB (needs a running instance)")
+    args = parser.parse_args()
+
+    if not args.influx:
+        writer.send = lambda records: None
+
+    for horizon_hours, resolution_minutes in CASES:
+        bench(horizon_hours, resolution_minutes, args.runs)
+
+    t0 = time.perf_counter()
+    writer.flush()
+    stats = writer.stats()
+    print(f"writer flushed in {(time.perf_counter() - t0) * 1000:.1f} ms: "
+          f"{stats['written']} written, {stats['flushes']} flushes, avg flush {stats['avg_flush_ms']} ms")
+
+
+if __name__ == "__main__":
+    main_()
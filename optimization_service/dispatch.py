@@ -0,0 +1,139 @@
+import time
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
+
+
+class BatteryParams(BaseModel):
+    capacity_kwh: float = Field(10.0, gt=0)
+    max_charge_kw: float = Field(5.0, ge=0)
+    max_discharge_kw: float = Field(5.0, ge=0)
+    charge_efficiency: float = Field(0.95, gt=0, le=1)
+    discharge_efficiency: float = Field(0.95, gt=0, le=1)
+    soc_min_percent: float = Field(10.0, ge=0, le=100)
+    soc_max_percent: float = Field(90.0, ge=0, le=100)
+    initial_soc_percent: float = Field(50.0, ge=0, le=100)
+    # Battery must end the horizon at least as full as it started (no "free" energy)
+    keep_final_soc: bool = True
+    # Feed-in revenue as a fraction of the spot price (0 = export is worth nothing)
+    export_price_factor: float = Field(0.0, ge=0, le=1)
+    # Grid connection limits
+    grid_import_limit_kw: float = Field(50.0, gt=0)
+    grid_export_limit_kw: float = Field(50.0, gt=0)
+
+    @model_validator(mode="after")
+    def check_soc_bounds(self):
+        if self.soc_min_percent > self.soc_max_percent:
+            raise ValueError("soc_min_percent must not exceed soc_max_percent")
+        return self
+
+
+class DispatchError(Exception):
+    pass
+
+
+# Tiny cost on battery throughput so the LP never charges and discharges in the same slot
+# (unless a negative price pays for the conversion losses)
+THROUGHPUT_PENALTY = 1e-6
+
+
+def _net_cost(grid_kw, price, dt_hours, export_factor):
+    # Billed on the net flow at the connection point
+    return float(np.sum(price * dt_hours * (np.maximum(grid_kw, 0) - export_factor * np.maximum(-grid_kw, 0))))
+
+
+def solve_dispatch(pv_kw, load_kw, price_eur_mwh, battery: BatteryParams, dt_hours: float, time_limit: float | None = None):
+    """
+    Cost-minimal battery schedule as a linear program (HiGHS via scipy).
+
+    Per slot t the variables are charge c, discharge d, grid import g, export e,
+    curtailed PV k (kW) and the end-of-slot energy content s (kWh):
+        pv - k - load - c + d + g - e = 0
+        s_t = s_{t-1} + eta_c * c * dt - d * dt / eta_d
+    minimizing sum(price * dt * (g - export_factor * e)).
+
+    At a price <= 0 export earns nothing, so it is closed and surplus PV is
+    curtailed instead; otherwise importing and exporting in the same slot would
+    collect the negative price on energy that only passes through. k is 0 elsewhere.
+
+    Returns a dict of numpy arrays plus cost and solver timing.
+    """
+    # scipy.optimize costs ~250 ms to import; only the first dispatch pays it
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    pv = np.asarray(pv_kw, dtype=float)
+    load = np.asarray(load_kw, dtype=float)
+    price = np.asarray(price_eur_mwh, dtype=float) / 1000.0  # EUR/kWh
+    n = len(pv)
+    if not (len(load) == len(price) == n) or n == 0:
+        raise DispatchError("pv, load and price must have the same non-zero length")
+
+    b = battery
+    s0 = b.capacity_kwh * b.initial_soc_percent / 100
+    s_min = b.capacity_kwh * b.soc_min_percent / 100
+    s_max = b.capacity_kwh * b.soc_max_percent / 100
+
+    # Variable layout: [c | d | g | e | s | k], each of length n
+    C, D, G, E, S, K = (slice(i * n, (i + 1) * n) for i in range(6))
+    eye = sparse.identity(n, format="csr")
+    zero = sparse.csr_matrix((n, n))
+
+    # Energy balance per slot
+    balance = sparse.hstack([-eye, eye, eye, -eye, zero, -eye])
+    # Storage dynamics: s_t - s_{t-1} - eta_c*dt*c_t + dt/eta_d*d_t = 0 (s_{-1} = s0)
+    shift = sparse.identity(n, format="csr") - sparse.eye(n, k=-1, format="csr")
+    storage = sparse.hstack([
+        -b.charge_efficiency * dt_hours * eye,
+        (dt_hours / b.discharge_efficiency) * eye,
+        zero, zero, shift, zero,
+    ])
+    A_eq = sparse.vstack([balance, storage], format="csr")
+    b_eq = np.concatenate([load - pv, np.r_[s0, np.zeros(n - 1)]])
+
+    cost = np.concatenate([
+        np.full(n, THROUGHPUT_PENALTY),
+        np.full(n, THROUGHPUT_PENALTY),
+        price * dt_hours,
+        -b.export_price_factor * price * dt_hours,
+        np.zeros(n),
+        np.zeros(n),
+    ])
+
+    s_bounds = [(s_min, s_max)] * n
+    if b.keep_final_soc:
+        s_bounds[-1] = (max(s_min, min(s0, s_max)), s_max)
+    closed = price <= 0
+    bounds = (
+        [(0, b.max_charge_kw)] * n
+        + [(0, b.max_discharge_kw)] * n
+        + [(0, b.grid_import_limit_kw)] * n
+        + [(0, 0 if c else b.grid_export_limit_kw) for c in closed]
+        + s_bounds
+        + [(0, max(p, 0) if c else 0) for p, c in zip(pv, closed)]
+    )
+
+    options = {"time_limit": time_limit} if time_limit else {}
+    t0 = time.perf_counter()
+    res = linprog(cost, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs", options=options)
+    solve_ms = (time.perf_counter() - t0) * 1000
+    if res.status != 0:
+        raise DispatchError(f"LP not solved: {res.message}")
+
+    x = res.x
+    grid = x[G] - x[E]
+    energy_cost = _net_cost(grid, price, dt_hours, b.export_price_factor)
+    # Reference: same PV/load without a battery, curtailing where export is closed
+    net = load - pv
+    baseline_cost = _net_cost(np.where(closed, np.maximum(net, 0), net), price, dt_hours, b.export_price_factor)
+    return {
+        "charge_kw": x[C],
+        "discharge_kw": x[D],
+        "grid_kw": grid,
+        "import_kw": x[G],
+        "export_kw": x[E],
+        "curtailed_kw": x[K],
+        "soc": x[S] / b.capacity_kwh * 100,
+        "cost_eur": energy_cost,
+        "baseline_cost_eur": baseline_cost,
+        "solve_time_ms": solve_ms,
+    }
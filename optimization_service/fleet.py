@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import uuid
+import zlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from pydantic import BaseModel, Field, model_validator
+
+from forecast import align_start, slot_times, heuristic_pv, random_load, to_line_protocol
+from dispatch import BatteryParams, DispatchError, solve_dispatch
+
+# Worker processes for fleet runs (default: all cores)
+FLEET_WORKERS = int(os.getenv("FLEET_WORKERS", os.cpu_count() or 2))
+# Sites whose plans are collected into one bulk write
+FLEET_WRITE_BATCH = int(os.getenv("FLEET_WRITE_BATCH", 100))
+# "spawn" keeps the workers independent of the server's threads (writer, uvicorn)
+FLEET_MP_START = os.getenv("FLEET_MP_START", "spawn")
+# Flat price (EUR/MWh) when no price source is given
+FLEET_DEFAULT_PRICE = float(os.getenv("DEFAULT_PRICE_EUR_MWH", 100.0))
+
+
+class SiteConfig(BaseModel):
+    # Becomes the site tag of the written plans
+    site_id: str = Field(min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_.:-]+$")
+    battery: BatteryParams = BatteryParams()
+    pv_peak_kw: float = Field(5.0, ge=0)
+    load_scale: float = Field(1.0, ge=0)
+
+
+class FleetRequest(BaseModel):
+    sites: list[SiteConfig] = Field(min_length=1)
+    horizon_hours: int = Field(24, ge=1, le=168)
+    resolution_minutes: int = Field(15, ge=1, le=60)
+
+    @model_validator(mode="after")
+    def check_unique_sites(self):
+        # Results are keyed by site_id, a repeated one would overwrite the other
+        seen, duplicates = set(), set()
+        for site in self.sites:
+            (duplicates if site.site_id in seen else seen).add(site.site_id)
+        if duplicates:
+            raise ValueError(f"duplicate site_id: {', '.join(sorted(duplicates))}")
+        return self
+
+
+# --- worker side ---
+
+_shared = {}
+
+
+def _init_worker(times, prices, pv_per_kwp, load, dt_hours):
+    # Horizon inputs are the same for every site, send them once per worker
+    _shared.update(times=times, prices=prices, pv_per_kwp=pv_per_kwp, load=load, dt_hours=dt_hours)
+
+
+def solve_site(site: dict):
+    """Solves one site. Runs in a worker process, so it only takes/returns plain data."""
+    cfg = SiteConfig(**site)
+    times = _shared["times"]
+    pv = _shared["pv_per_kwp"] * cfg.pv_peak_kw
+    if _shared["load"] is not None:
+        load = _shared["load"] * cfg.load_scale
+    else:
+        # Stable per-site load pattern
+        rng = np.random.default_rng(zlib.crc32(cfg.site_id.encode()))
+        load = random_load(times, rng) * cfg.load_scale
+    try:
+        plan = solve_dispatch(pv, load, _shared["prices"], cfg.battery, _shared["dt_hours"])
+    except DispatchError as e:
+        return {"site_id": cfg.site_id, "error": str(e)}
+    return {
+        "site_id": cfg.site_id,
+        "soc": plan["soc"],
+        "charge_kw": plan["charge_kw"],
+        "discharge_kw": plan["discharge_kw"],
+        "grid_kw": plan["grid_kw"],
+        "cost_eur": plan["cost_eur"],
+        "baseline_cost_eur": plan["baseline_cost_eur"],
+        "solve_time_ms": plan["solve_time_ms"],
+    }
+
+
+# --- job runner ---
+
+class FleetJob:
+    def __init__(self, sites, horizon_hours=24, resolution_minutes=15, workers=FLEET_WORKERS):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.sites = sites
+        self.horizon_hours = horizon_hours
+        self.resolution_minutes = resolution_minutes
+        self.workers = max(1, workers)
+        self.state = "queued"
+        self.error = None
+        self.results = {}
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def run(self, write=None, prices_for=None, pv_for=None, load_for=None):
+        """
+        Solves all sites on a process pool. write(lines) receives the plans in bulk,
+        prices_for(times) supplies the price curve (default: flat FLEET_DEFAULT_PRICE),
+        pv_for(times) the PV output per kWp (default: triangle heuristic) and
+        load_for(times) the load shape scaled per site (default: random per site).
+        """
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            times = slot_times(align_start(datetime.utcnow(), self.resolution_minutes),
+                               self.horizon_hours, self.resolution_minutes)
+            prices = prices_for(times) if prices_for else np.full(len(times), FLEET_DEFAULT_PRICE)
+            pv_per_kwp = pv_for(times) if pv_for else heuristic_pv(times, 1.0)
+            load = load_for(times) if load_for else None
+            dt_hours = self.resolution_minutes / 60
+            site_dicts = [s.model_dump() if isinstance(s, BaseModel) else dict(s) for s in self.sites]
+            chunksize = max(1, len(site_dicts) // (self.workers * 8))
+
+            pending = []
+            ctx = multiprocessing.get_context(FLEET_MP_START)
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                     initializer=_init_worker, initargs=(times, prices, pv_per_kwp, load, dt_hours)) as pool:
+                for result in pool.map(solve_site, site_dicts, chunksize=chunksize):
+                    self._record(result)
+                    if "error" not in result:
+                        pending.append(result)
+                    if write and len(pending) >= FLEET_WRITE_BATCH:
+                        write(self._lines(times, pending))
+                        pending = []
+            if write and pending:
+                write(self._lines(times, pending))
+            self.state = "done"
+        except Exception as e:
+            self.state = "error"
+            self.error = str(e)
+            print(f"Fleet job {self.job_id} failed: {e}")
+        self.finished_at = time.time()
+
+    @staticmethod
+    def _lines(times, results):
+        lines = []
+        for r in results:
+            lines.extend(to_line_protocol(
+                times,
+                measurement="forecast_soc",
+                tags={"algorithm": "lp_dispatch", "site": r["site_id"]},
+                fields={"soc_percent": r["soc"], "charge_kw": r["charge_kw"],
+                        "discharge_kw": r["discharge_kw"], "grid_kw": r["grid_kw"]},
+            ))
+        return lines
+
+    def _record(self, result):
+        with self._lock:
+            self.results[result["site_id"]] = {
+                k: result[k] for k in ("solve_time_ms", "cost_eur", "baseline_cost_eur", "error") if k in result
+            }
+
+    def start(self, write=None, prices_for=None, pv_for=None, load_for=None):
+        self._thread = threading.Thread(target=self.run, args=(write, prices_for, pv_for, load_for), daemon=True,
+                                        name=f"fleet-{self.job_id}")
+        self._thread.start()
+
+    def status(self, include_sites=True):
+        with self._lock:
+            results = dict(self.results)
+        solve_times = sorted(r["solve_time_ms"] for r in results.values() if "solve_time_ms" in r)
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        status = {
+            "job_id": self.job_id,
+            "state": self.state,
+            "error": self.error,
+            "workers": self.workers,
+            "sites_total": len(self.sites),
+            "sites_done": len(results),
+            "sites_failed": sum(1 for r in results.values() if "error" in r),
+            "elapsed_sec": round(elapsed, 3),
+            "sites_per_sec": round(len(results) / elapsed, 2) if elapsed else 0.0,
+            "solve_time_ms_p50": round(solve_times[len(solve_times) // 2], 3) if solve_times else None,
+            "solve_time_ms_max": round(solve_times[-1], 3) if solve_times else None,
+        }
+        if include_sites:
+            status["sites"] = results
+        return status
+
+
+# Jobs of this process, by id (oldest forgotten beyond FLEET_KEEP_JOBS)
+FLEET_KEEP_JOBS = int(os.getenv("FLEET_KEEP_JOBS", 50))
+jobs = {}
+
+
+def submit_job(request: FleetRequest, write=None, prices_for=None, pv_for=None, load_for=None):
+    job = FleetJob(request.sites, request.horizon_hours, request.resolution_minutes)
+    jobs[job.job_id] = job
+    while len(jobs) > FLEET_KEEP_JOBS:
+        jobs.pop(next(iter(jobs)))
+    job.start(write, prices_for, pv_for, load_for)
+    return job
+
+
+def main():
+    # Nightly run / benchmark: python fleet.py --sites 1000 --workers 8 [--write]
+    parser = argparse.ArgumentParser(description="Run the dispatch optimization for a fleet of sites")
+    parser.add_argument("--sites", type=int, default=200, help="Number of synthetic sites")
+    parser.add_argument("--workers", type=int, default=FLEET_WORKERS)
+    parser.add_argument("--horizon-hours", type=int, default=24)
+    parser.add_argument("--resolution-minutes", type=int, default=15)
+    parser.add_argument("--write", action="store_true", help="Write plans and use stored prices and irradiance (needs InfluxDB)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    sites = [
+        SiteConfig(
+            site_id=f"site-{i:05d}",
+            battery=BatteryParams(capacity_kwh=float(rng.choice([5, 10, 15])), initial_soc_percent=float(rng.uniform(20, 80))),
+            pv_peak_kw=float(rng.uniform(3, 10)),
+            load_scale=float(rng.uniform(0.5, 2.0)),
+        )
+        for i in range(args.sites)
+    ]
+    job = FleetJob(sites, args.horizon_hours, args.resolution_minutes, args.workers)
+
+    write = prices_for = pv_for = None
+    from forecasting import load_forecast_or_random
+    if args.write:
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from influx_client import write_points, writer
+        from prices import load_prices
+        from weather import load_pv_per_kwp
+        write, prices_for, pv_for = write_points, load_prices, load_pv_per_kwp
+
+    job.run(write, prices_for, pv_for, load_forecast_or_random)
+    if args.write:
+        writer.flush()
+    s = job.status(include_sites=False)
+    print(f"{s['sites_done']} sites ({s['sites_failed']} failed) on {s['workers']} workers in {s['elapsed_sec']}s "
+          f"-> {s['sites_per_sec']} sites/sec, solve p50 {s['solve_time_ms_p50']} ms, max {s['solve_time_ms_max']} ms")
+
+
+if __name__ == "__main__":
+    main()
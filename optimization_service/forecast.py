@@ -0,0 +1,129 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+
+NS_PER_HOUR = 3600 * 10**9
+
+
+def align_start(now: datetime, resolution_minutes: int) -> datetime:
+    """Next slot boundary after now (e.g. next quarter hour)."""
+    start_time = now.replace(second=0, microsecond=0)
+    remainder = start_time.minute % resolution_minutes
+    return start_time + timedelta(minutes=(resolution_minutes - remainder))
+
+
+def slot_times(start_time: datetime, horizon_hours: float, resolution_minutes: int) -> np.ndarray:
+    """datetime64[ns] array of slot start times."""
+    slots = int(round(horizon_hours * 60 / resolution_minutes))
+    start = np.datetime64(start_time.replace(tzinfo=None), "ns")
+    return start + np.arange(slots) * np.timedelta64(resolution_minutes, "m")
+
+
+def heuristic_pv(times: np.ndarray, peak_kw: float = 5.0) -> np.ndarray:
+    # Mock PV: triangle peaking at 12:00, zero outside 06:00-18:00
+    hour = (times.astype("int64") // NS_PER_HOUR) % 24
+    pv = np.maximum(0.0, peak_kw * (1 - np.abs(hour - 12) / 6))
+    return np.where((hour >= 6) & (hour <= 18), pv, 0.0)
+
+
+def irradiance_pv(times: np.ndarray, sample_times, irradiance, peak_kw: float = 5.0,
+                  performance_ratio: float = 0.8, fallback=None) -> np.ndarray:
+    """
+    PV power from hourly irradiance (W/m², mean over the preceding hour):
+    pv = irradiance / 1000 * peak_kw * performance_ratio, interpolated to the slot times.
+    Slots outside the sampled period take fallback (default: heuristic_pv).
+    """
+    pv = heuristic_pv(times, peak_kw) if fallback is None else np.asarray(fallback, dtype=float)
+    if len(sample_times) < 2:
+        return pv
+    # Hourly means belong to the middle of their hour
+    stamps = np.array([to_datetime64(t) for t in sample_times]) - np.timedelta64(30, "m")
+    values = np.asarray(irradiance, dtype=float)
+    order = np.argsort(stamps)
+    stamps, values = stamps[order].astype("int64"), values[order]
+    x = times.astype("int64")
+    covered = (x >= stamps[0]) & (x <= stamps[-1])
+    measured = np.maximum(0.0, np.interp(x, stamps, values)) / 1000 * peak_kw * performance_ratio
+    return np.where(covered, measured, pv)
+
+
+def random_load(times: np.ndarray, rng=None) -> np.ndarray:
+    rng = rng or np.random.default_rng()
+    return rng.uniform(0.5, 2.0, size=len(times))
+
+
+def simulate_soc(net_power_kw: np.ndarray, dt_hours: float, capacity_kwh: float, initial_soc: float = 50.0) -> np.ndarray:
+    """SoC walk in percent, clipped to 0..100 after every slot."""
+    delta = net_power_kw * dt_hours / capacity_kwh * 100
+    walk = initial_soc + np.cumsum(delta)
+    if ((walk >= 0) & (walk <= 100)).all() or (delta >= 0).all() or (delta <= 0).all():
+        # Never saturates, or saturates for good: clipping the cumulative sum is exact
+        return np.clip(walk, 0, 100)
+    # Saturation depends on the path, walk it on plain floats
+    soc = np.empty_like(delta)
+    current = initial_soc
+    for i, d in enumerate(delta.tolist()):
+        current = min(100.0, max(0.0, current + d))
+        soc[i] = current
+    return soc
+
+
+def build_soc_profile(start_time: datetime, horizon_hours: float = 24, resolution_minutes: int = 15,
+                      capacity_kwh: float = 10.0, initial_soc: float = 50.0, rng=None, pv_for=None,
+                      load_for=None) -> dict:
+    """
+    Builds the whole forecast at once. pv_for(times) and load_for(times) supply the
+    PV and load forecasts; defaults are the triangle heuristic and random load.
+    Returns numpy arrays: time, pv_forecast, load_forecast, soc.
+    """
+    times = slot_times(start_time, horizon_hours, resolution_minutes)
+    pv = pv_for(times) if pv_for else heuristic_pv(times)
+    load = load_for(times) if load_for else random_load(times, rng)
+    soc = simulate_soc(pv - load, resolution_minutes / 60, capacity_kwh, initial_soc)
+    return {"time": times, "pv_forecast": pv, "load_forecast": load, "soc": soc}
+
+
+def to_datetime64(t) -> np.datetime64:
+    """Naive UTC datetime64[ns] from a (possibly tz-aware) datetime."""
+    if getattr(t, "tzinfo", None) is not None:
+        t = t.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(t, "ns")
+
+
+def step_align(times: np.ndarray, sample_times, sample_values, default: float) -> np.ndarray:
+    """
+    Holds each sample (e.g. an hourly price) until the next one and reads it at the slot times.
+    Slots before the first sample take the first value; without samples everything is default.
+    """
+    if len(sample_times) == 0:
+        return np.full(len(times), float(default))
+    stamps = np.array([to_datetime64(t) for t in sample_times])
+    values = np.asarray(sample_values, dtype=float)
+    order = np.argsort(stamps)
+    idx = np.searchsorted(stamps[order], times, side="right") - 1
+    return values[order][np.clip(idx, 0, len(values) - 1)]
+
+
+def _escape(value) -> str:
+    # Line protocol escaping for measurement names, tag keys and tag values
+    return str(value).replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def to_line_protocol(times: np.ndarray, measurement: str, tags: dict, fields: dict) -> list:
+    """Line protocol for a set of equally long field arrays, one line per slot."""
+    prefix = _escape(measurement) + "".join(f",{_escape(k)}={_escape(tags[k])}" for k in sorted(tags))
+    ts = times.astype("int64").astype(str)
+    columns = [np.char.add(f"{name}=", np.asarray(values, dtype=float).astype(str)) for name, values in fields.items()]
+    field_set = columns[0]
+    for col in columns[1:]:
+        field_set = np.char.add(np.char.add(field_set, ","), col)
+    return np.char.add(np.char.add(prefix + " ", np.char.add(field_set, " ")), ts).tolist()
+
+
+def profile_records(profile: dict) -> list:
+    """JSON friendly list of slots (same shape as the original endpoint response)."""
+    stamps = np.datetime_as_string(profile["time"], unit="s")
+    return [
+        {"timestamp": t, "soc": s, "pv_forecast": p, "load_forecast": l}
+        for t, s, p, l in zip(stamps.tolist(), profile["soc"].tolist(),
+                              profile["pv_forecast"].tolist(), profile["load_forecast"].tolist())
+    ]
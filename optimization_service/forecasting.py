@@ -0,0 +1,240 @@
+import os
+import glob
+import time
+import hashlib
+import threading
+import numpy as np
+
+# Hourly history CSVs (same layout as ingest_service/data)
+HISTORY_DATA_DIR = os.getenv(
+    "HISTORY_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ingest_service", "data"),
+)
+# Fitted models, one file per series/model/data version
+FORECAST_MODEL_DIR = os.getenv(
+    "FORECAST_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".models")
+)
+# Model used by the endpoints: "ridge" or "seasonal"
+FORECAST_LOAD_MODEL = os.getenv("FORECAST_LOAD_MODEL", "ridge")
+FORECAST_PV_MODEL = os.getenv("FORECAST_PV_MODEL", "ridge")
+RIDGE_ALPHA = float(os.getenv("RIDGE_ALPHA", 1.0))
+
+# series -> (subdirectory, value column)
+SERIES = {
+    "load": ("consumption", "consumption_kwh"),
+    "pv": ("pv", "production_kw"),
+}
+
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_DAY = 24 * NS_PER_HOUR
+DAYS_PER_YEAR = 365.2425
+
+
+def history_files(series, data_dir=None):
+    subdir, _ = SERIES[series]
+    return sorted(glob.glob(os.path.join(data_dir or HISTORY_DATA_DIR, subdir, "*.csv")))
+
+
+def data_version(series, data_dir=None):
+    """Changes whenever a history file is added, removed or modified."""
+    h = hashlib.sha1()
+    for path in history_files(series, data_dir):
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:16]
+
+
+def load_history(series, data_dir=None):
+    """(times, values): datetime64[ns] (UTC, naive) and float arrays, sorted, one row per hour."""
+    import pandas as pd
+    _, column = SERIES[series]
+    files = history_files(series, data_dir)
+    if not files:
+        raise FileNotFoundError(f"No history CSVs for '{series}' in {data_dir or HISTORY_DATA_DIR}")
+    df = pd.concat([pd.read_csv(f, usecols=["datetime", column]) for f in files], ignore_index=True)
+    df["datetime"] = pd.to_datetime(df["datetime"], utc=True, format="ISO8601")
+    df = df.dropna().drop_duplicates("datetime").sort_values("datetime")
+    times = df["datetime"].dt.tz_localize(None).to_numpy("datetime64[ns]")
+    return times, df[column].to_numpy(dtype=float)
+
+
+def _calendar(times):
+    """Fractional hour of day, day of year (0..365) and weekend flag for datetime64[ns] times."""
+    ns = times.astype("datetime64[ns]").astype("int64")
+    hour = (ns % NS_PER_DAY) / NS_PER_HOUR
+    days = times.astype("datetime64[D]")
+    doy = (days - days.astype("datetime64[Y]")).astype("int64").astype(float)
+    # 1970-01-01 was a Thursday
+    weekday = (ns // NS_PER_DAY + 3) % 7
+    return hour, doy, (weekday >= 5).astype(float)
+
+
+class SeasonalProfile:
+    """Mean value per (month, weekday/weekend, hour of day)."""
+    name = "seasonal"
+
+    def fit(self, times, values):
+        hour, _, weekend = _calendar(times)
+        month = times.astype("datetime64[M]").astype("int64") % 12
+        idx = self._index(month, weekend, hour)
+        sums = np.bincount(idx, weights=values, minlength=12 * 2 * 24)
+        counts = np.bincount(idx, minlength=12 * 2 * 24)
+        # Empty cells (short histories) take the overall mean
+        self.table = np.where(counts > 0, sums / np.maximum(counts, 1), values.mean())
+        return self
+
+    @staticmethod
+    def _index(month, weekend, hour):
+        return (month * 2 + weekend.astype("int64")) * 24 + np.floor(hour).astype("int64") % 24
+
+    def predict(self, times):
+        hour, _, weekend = _calendar(times)
+        month = times.astype("datetime64[M]").astype("int64") % 12
+        return self.table[self._index(month, weekend, hour)]
+
+    def to_arrays(self):
+        return {"table": self.table}
+
+    def from_arrays(self, arrays):
+        self.table = arrays["table"]
+        return self
+
+
+class HarmonicRidge:
+    """
+    Ridge regression on Fourier terms of hour of day and day of year, their
+    products (daily shape changing with the season) and a weekend flag.
+    Fitting is one linear solve; prediction is a matrix-vector product.
+    """
+    name = "ridge"
+
+    def __init__(self, alpha=RIDGE_ALPHA, daily=4, yearly=2, non_negative=False):
+        self.alpha = alpha
+        self.daily = daily
+        self.yearly = yearly
+        self.non_negative = non_negative
+
+    def features(self, times):
+        hour, doy, weekend = _calendar(times)
+        d = [f(2 * np.pi * k * hour / 24) for k in range(1, self.daily + 1) for f in (np.sin, np.cos)]
+        y = [f(2 * np.pi * k * doy / DAYS_PER_YEAR) for k in range(1, self.yearly + 1) for f in (np.sin, np.cos)]
+        cols = [np.ones_like(hour), weekend] + d + y
+        cols += [a * b for a in d for b in y]
+        cols += [weekend * a for a in d]
+        return np.column_stack(cols)
+
+    def fit(self, times, values):
+        X = self.features(times)
+        penalty = self.alpha * np.eye(X.shape[1])
+        penalty[0, 0] = 0.0   # intercept is not shrunk
+        self.coef = np.linalg.solve(X.T @ X + penalty, X.T @ values)
+        return self
+
+    def predict(self, times):
+        pred = self.features(times) @ self.coef
+        return np.maximum(pred, 0.0) if self.non_negative else pred
+
+    def to_arrays(self):
+        return {"coef": self.coef}
+
+    def from_arrays(self, arrays):
+        self.coef = arrays["coef"]
+        return self
+
+
+def make_model(series, name):
+    if name == "seasonal":
+        return SeasonalProfile()
+    if name == "ridge":
+        # PV has many more daily harmonics (sharp sunrise/sunset) and cannot be negative
+        return HarmonicRidge(daily=6, non_negative=True) if series == "pv" else HarmonicRidge()
+    raise ValueError(f"Unknown forecast model '{name}', expected 'ridge' or 'seasonal'")
+
+
+MODELS = ["seasonal", "ridge"]
+
+# (series, name, version) -> fitted model, per process
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(series, name, data_dir=None, model_dir=None):
+    """
+    Fitted model for a series, loaded from the disk cache or trained on the
+    history CSVs (and cached) when the data changed since the last fit.
+    """
+    version = data_version(series, data_dir)
+    key = (series, name, version)
+    model = _models.get(key)
+    if model is None:
+        # Concurrent first requests fit once
+        with _models_lock:
+            model = _models.get(key) or _load_or_fit(series, name, version, data_dir, model_dir)
+            _models[key] = model
+    return model
+
+
+def _load_or_fit(series, name, version, data_dir, model_dir):
+    model = make_model(series, name)
+    model_dir = model_dir or FORECAST_MODEL_DIR
+    path = os.path.join(model_dir, f"{series}_{name}_{version}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            arrays = dict(cached)
+    else:
+        t0 = time.perf_counter()
+        times, values = load_history(series, data_dir)
+        # Hourly values are means over the hour, fit them at the middle of it
+        arrays = model.fit(times + np.timedelta64(30, "m"), values).to_arrays()
+        # Installed PV power of the history, used to scale to other systems
+        arrays["peak"] = np.array(np.percentile(values, 99.9))
+        os.makedirs(model_dir, exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+        print(f"Fitted {name} {series} model on {len(values)} hours in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    model.from_arrays(arrays)
+    model.peak = float(arrays["peak"])
+    return model
+
+
+def forecast_load(times, model=None):
+    """Household load (kW) for the slot times."""
+    return get_model("load", model or FORECAST_LOAD_MODEL).predict(times)
+
+
+def forecast_pv_per_kwp(times, model=None):
+    """PV output per kWp for the slot times, learned from the PV history."""
+    m = get_model("pv", model or FORECAST_PV_MODEL)
+    return np.clip(m.predict(times) / m.peak, 0.0, 1.0)
+
+
+def load_forecast_or_random(times):
+    """Model load forecast; the old random load if no history is available."""
+    try:
+        return forecast_load(times)
+    except Exception as e:
+        print(f"Load forecast unavailable, using random load: {e}")
+        from forecast import random_load
+        return random_load(times)
+
+
+def warm_up():
+    """Loads (or fits) the configured models so the first request does not pay for it."""
+    for series, name in (("load", FORECAST_LOAD_MODEL), ("pv", FORECAST_PV_MODEL)):
+        try:
+            get_model(series, name)
+        except Exception as e:
+            print(f"Forecast model {name}/{series} not available: {e}")
+
+
+def model_info():
+    info = {}
+    for series in SERIES:
+        files = history_files(series)
+        info[series] = {
+            "model": FORECAST_LOAD_MODEL if series == "load" else FORECAST_PV_MODEL,
+            "files": len(files),
+            "data_version": data_version(series) if files else None,
+        }
+    return info
@@ -1,17 +1,21 @@
 import os
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from common.batch_writer import BatchingWriter
+from common.invalidation import InvalidationNotifier
+from common.spool import make_spool
+from common.storage import make_storage
 
-# Configuration
-INFLUX_URL = os.getenv("INFLUX_URL", "http://localhost:8086")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN", "my-super-secret-auth-token")
-INFLUX_ORG = os.getenv("INFLUX_ORG", "myorg")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "hems_data")
+# InfluxDB or the embedded SQLite store (STORAGE_BACKEND); connects on first use
+storage = make_storage()
 
-client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-write_api = client.write_api(write_options=SYNCHRONOUS)
+# All writes go through the background batching writer; after each flush
+# api_service is told which measurements changed so it can drop cached results.
+# Batches storage does not take during an outage wait in an on-disk spool
+spool = make_spool(os.path.dirname(os.path.abspath(__file__)), name="optimization-spool")
+writer = BatchingWriter(storage.write, name="optimization-writer", on_flush=InvalidationNotifier("optimization_service"),
+                        spool=spool, probe=storage.ping)
 
 def write_forecast(measurement: str, tags: dict, fields: dict, timestamp=None):
+    from influxdb_client import Point, WritePrecision
     point = Point(measurement)
     for k, v in tags.items():
         point = point.tag(k, v)
@@ -19,5 +23,16 @@ def write_forecast(measurement: str, tags: dict, fields: dict, timestamp=None):
         point = point.field(k, v)
     if timestamp:
         point = point.time(timestamp, WritePrecision.NS)
-    
-    write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+
+    return writer.submit([point])
+
+def write_points(points: list, on_done=None):
+    return writer.submit(points, on_done=on_done)
+
+def query_field(measurement: str, field: str, start: str, stop: str):
+    """(timestamps, values) of one field between two RFC3339 times, sorted by time."""
+    df = storage.query_range(measurement, start, stop, fields=[field])
+    if field not in df.columns:
+        return [], []
+    df = df[df[field].notna()]
+    return df["_time"].tolist(), df[field].tolist()
@@ -1,84 +1,153 @@
 import os
-import random
-from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from influx_client import write_forecast
+import importlib
+from contextlib import asynccontextmanager
+from datetime import datetime
+import numpy as np
+from typing import Annotated
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from influx_client import write_points, writer, storage
+from forecast import align_start, build_soc_profile, to_line_protocol, profile_records
+from prices import load_prices
+from weather import load_pv, load_pv_per_kwp
+import forecasting
+from dispatch import BatteryParams, DispatchError, solve_dispatch
+import fleet
+from common.health import Readiness
+from common.security import verify_token
 
-app = FastAPI()
+# Solver time limit for one dispatch (seconds)
+DISPATCH_TIME_LIMIT = float(os.getenv("DISPATCH_TIME_LIMIT", 2.0))
 
-# Security
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretjwtkeyforlocaldev")
-ALGORITHM = "HS256"
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="http://localhost:8003/token")
+readiness = Readiness("optimization_service")
+readiness.check("storage", storage.ping)
 
-def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    return username
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Replays points spooled during an earlier storage outage
+    writer.start()
+
+    # Fit or load the forecast models and import the solver before the first request
+    # needs them, in the background so the service is live right away
+    readiness.warm_up("forecast_models", forecasting.warm_up)
+    readiness.warm_up("solver", lambda: importlib.import_module("scipy.optimize"))
+
+    yield
+
+    # Flush whatever is still buffered
+    writer.close(timeout=10)
+    storage.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/health/live")
+def liveness():
+    return readiness.live()
+
+@app.get("/health/ready")
+async def readiness_probe():
+    ready, details = await readiness.ready()
+    return JSONResponse(details, status_code=200 if ready else 503)
+
+@app.get("/writer/stats", dependencies=[Depends(verify_token)])
+def writer_stats():
+    return writer.stats()
+
+@app.get("/forecast/models", dependencies=[Depends(verify_token)])
+def forecast_models():
+    return forecasting.model_info()
 
 @app.get("/forecast/soc_profile", dependencies=[Depends(verify_token)])
-def generate_soc_forecast():
+def generate_soc_forecast(
+    horizon_hours: Annotated[int, Query(ge=1, le=168)] = 24,
+    resolution_minutes: Annotated[int, Query(ge=1, le=60)] = 15,
+):
     """
-    Generates a 24h SoC forecast (15m resolution) and writes to InfluxDB.
-    Returns the generated profile.
+    Generates a SoC forecast (default 24h at 15m resolution) and writes it to InfluxDB
+    in one batched write. Returns the generated profile.
     """
-    now = datetime.utcnow()
-    # Align to next 15m
-    start_time = now.replace(second=0, microsecond=0)
-    minutes = start_time.minute
-    remainder = minutes % 15
-    start_time += timedelta(minutes=(15 - remainder))
-
-    forecast_points = []
-    
+    start_time = align_start(datetime.utcnow(), resolution_minutes)
+
     # Simple simulation logic:
     # Start SoC = 50%
-    # PV bell curve during day, Consumption pseudo-random
+    # PV from the stored irradiance forecast, Consumption from the model fitted on the history
     # SoC change = (PV - Cons) * Factor
-    
-    current_soc = 50.0
-    capacity_kwh = 10.0 # 10kWh battery
-    
-    for i in range(4 * 24): # 96 points (24h * 4 quarters)
-        forecast_time = start_time + timedelta(minutes=15 * i)
-        hour = forecast_time.hour
-        
-        # Mock PV: Peak at 12:00, zero at night
-        if 6 <= hour <= 18:
-            pv_gen = max(0, 5.0 * (1 - abs(hour - 12) / 6)) # Simple triangle shape
-        else:
-            pv_gen = 0.0
-            
-        consumption = random.uniform(0.5, 2.0)
-        
-        net_power = pv_gen - consumption # kW
-        # Energy in 15m = Power * 0.25h
-        energy_change = net_power * 0.25
-        
-        # Update SoC
-        soc_change_percent = (energy_change / capacity_kwh) * 100
-        current_soc = max(0, min(100, current_soc + soc_change_percent))
-        
-        # Write to InfluxDB "forecast_soc"
-        write_forecast(
-            measurement="forecast_soc",
-            tags={"algorithm": "simple_heuristic"},
-            fields={"soc_percent": float(current_soc)},
-            timestamp=forecast_time
-        )
-        
-        forecast_points.append({
-            "timestamp": forecast_time.isoformat(),
-            "soc": current_soc,
-            "pv_forecast": pv_gen,
-            "load_forecast": consumption
-        })
-        
-    return {"message": "Forecast generated and stored", "data": forecast_points}
+    profile = build_soc_profile(start_time, horizon_hours, resolution_minutes, capacity_kwh=10.0, initial_soc=50.0,
+                                pv_for=load_pv, load_for=forecasting.load_forecast_or_random)
+
+    # Write to InfluxDB "forecast_soc", all slots at once
+    write_points(to_line_protocol(
+        profile["time"],
+        measurement="forecast_soc",
+        tags={"algorithm": "simple_heuristic"},
+        fields={"soc_percent": profile["soc"]},
+    ))
+
+    return {"message": "Forecast generated and stored", "data": profile_records(profile)}
+
+@app.post("/forecast/dispatch", dependencies=[Depends(verify_token)])
+def optimize_dispatch(
+    battery: BatteryParams | None = None,
+    horizon_hours: Annotated[int, Query(ge=1, le=168)] = 24,
+    resolution_minutes: Annotated[int, Query(ge=1, le=60)] = 15,
+):
+    """
+    Cost-minimal battery charge/discharge plan (LP) for the given battery,
+    using PV/load forecasts and the stored market prices.
+    Written to "forecast_soc" with algorithm=lp_dispatch.
+    """
+    battery = battery or BatteryParams()
+    start_time = align_start(datetime.utcnow(), resolution_minutes)
+    profile = build_soc_profile(start_time, horizon_hours, resolution_minutes, battery.capacity_kwh,
+                                battery.initial_soc_percent, pv_for=load_pv,
+                                load_for=forecasting.load_forecast_or_random)
+    times = profile["time"]
+    prices = load_prices(times)
+
+    try:
+        plan = solve_dispatch(profile["pv_forecast"], profile["load_forecast"], prices, battery,
+                              dt_hours=resolution_minutes / 60, time_limit=DISPATCH_TIME_LIMIT)
+    except DispatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    write_points(to_line_protocol(
+        times,
+        measurement="forecast_soc",
+        tags={"algorithm": "lp_dispatch"},
+        fields={"soc_percent": plan["soc"], "charge_kw": plan["charge_kw"],
+                "discharge_kw": plan["discharge_kw"], "grid_kw": plan["grid_kw"]},
+    ))
+
+    stamps = np.datetime_as_string(times, unit="s").tolist()
+    data = [
+        {"timestamp": t, "soc": s, "charge_kw": c, "discharge_kw": d, "grid_kw": g,
+         "pv_forecast": p, "load_forecast": l, "price_eur_mwh": pr}
+        for t, s, c, d, g, p, l, pr in zip(
+            stamps, plan["soc"].tolist(), plan["charge_kw"].tolist(), plan["discharge_kw"].tolist(),
+            plan["grid_kw"].tolist(), profile["pv_forecast"].tolist(), profile["load_forecast"].tolist(), prices.tolist())
+    ]
+    return {
+        "message": "Dispatch optimized and stored",
+        "algorithm": "lp_dispatch",
+        "cost_eur": plan["cost_eur"],
+        "baseline_cost_eur": plan["baseline_cost_eur"],
+        "solve_time_ms": plan["solve_time_ms"],
+        "data": data,
+    }
+
+@app.post("/forecast/fleet", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(verify_token)])
+def optimize_fleet(request: fleet.FleetRequest):
+    """
+    Starts a dispatch optimization for many sites on a process pool.
+    Plans are written in bulk with a site tag; poll /forecast/fleet/{job_id} for progress.
+    """
+    job = fleet.submit_job(request, write=write_points, prices_for=load_prices, pv_for=load_pv_per_kwp,
+                           load_for=forecasting.load_forecast_or_random)
+    return {"job_id": job.job_id, "sites": len(request.sites)}
+
+@app.get("/forecast/fleet/{job_id}", dependencies=[Depends(verify_token)])
+def fleet_status(job_id: str, include_sites: bool = False):
+    job = fleet.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown job")
+    return job.status(include_sites=include_sites)
@@ -0,0 +1,19 @@
+import os
+import numpy as np
+from influx_client import query_field
+from forecast import step_align
+
+# Used when no market prices are stored for the forecast horizon
+DEFAULT_PRICE_EUR_MWH = float(os.getenv("DEFAULT_PRICE_EUR_MWH", 100.0))
+
+
+def load_prices(times):
+    """market_prices for the slot times, hourly values held per slot."""
+    start = (times[0] - np.timedelta64(1, "h")).astype("datetime64[s]")
+    stop = (times[-1] + np.timedelta64(1, "h")).astype("datetime64[s]")
+    try:
+        sample_times, sample_values = query_field("market_prices", "price_eur_mwh", f"{start}Z", f"{stop}Z")
+    except Exception as e:
+        print(f"Price query failed, using default price: {e}")
+        sample_times, sample_values = [], []
+    return step_align(times, sample_times, sample_values, DEFAULT_PRICE_EUR_MWH)
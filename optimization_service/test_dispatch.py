@@ -0,0 +1,38 @@
+import numpy as np
+
+from dispatch import BatteryParams, solve_dispatch
+
+TOL = 1e-6
+
+
+def net_cost(plan, price, dt_hours, export_factor=0.0):
+    grid = plan["grid_kw"]
+    return float(np.sum(price / 1000 * dt_hours * (np.maximum(grid, 0) - export_factor * np.maximum(-grid, 0))))
+
+
+def test_negative_prices_fill_the_battery_from_the_grid():
+    battery = BatteryParams()
+    price = np.full(8, -20.0)
+    plan = solve_dispatch(np.zeros(8), np.ones(8), price, battery, 1.0)
+
+    assert plan["charge_kw"].sum() > 0
+    assert abs(plan["soc"].max() - battery.soc_max_percent) < TOL
+    # Never importing and exporting in the same slot
+    assert np.all(np.minimum(plan["import_kw"], plan["export_kw"]) <= TOL)
+    assert np.all(plan["grid_kw"] <= battery.grid_import_limit_kw + TOL)
+    assert abs(plan["cost_eur"] - net_cost(plan, price, 1.0)) < TOL
+    assert plan["cost_eur"] < plan["baseline_cost_eur"] < 0
+
+
+def test_negative_prices_with_export_revenue():
+    battery = BatteryParams(export_price_factor=1.0, grid_import_limit_kw=10, grid_export_limit_kw=4)
+    price = np.r_[np.full(4, -20.0), np.full(4, 80.0)]
+    plan = solve_dispatch(np.full(8, 3.0), np.ones(8), price, battery, 1.0)
+
+    assert np.all(plan["grid_kw"] <= 10 + TOL)
+    assert np.all(plan["grid_kw"] >= -4 - TOL)
+    # Surplus PV is stored or curtailed while export costs money, sold once it pays
+    assert np.all(plan["grid_kw"][:4] >= -TOL)
+    assert plan["discharge_kw"][4:].sum() > 0
+    assert abs(plan["cost_eur"] - net_cost(plan, price, 1.0, 1.0)) < TOL
+    assert plan["cost_eur"] < plan["baseline_cost_eur"]
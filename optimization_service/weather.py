@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from influx_client import query_field
+from forecast import irradiance_pv, heuristic_pv
+from forecasting import forecast_pv_per_kwp
+
+# Default PV system used by the single-site endpoints
+PV_PEAK_KW = float(os.getenv("PV_PEAK_KW", 5.0))
+# Losses from inverter, temperature, soiling, orientation
+PV_PERFORMANCE_RATIO = float(os.getenv("PV_PERFORMANCE_RATIO", 0.8))
+
+
+def load_pv_per_kwp(times):
+    """
+    PV output per kWp for the slot times from the stored hourly irradiance
+    ("weather" measurement, written by the ingest service). Slots without
+    irradiance data use the model learned from the PV history, or the
+    triangle heuristic if there is no history either.
+    """
+    start = (times[0] - np.timedelta64(2, "h")).astype("datetime64[s]")
+    stop = (times[-1] + np.timedelta64(2, "h")).astype("datetime64[s]")
+    try:
+        sample_times, sample_values = query_field("weather", "shortwave_radiation", f"{start}Z", f"{stop}Z")
+    except Exception as e:
+        print(f"Irradiance query failed, using heuristic PV: {e}")
+        sample_times, sample_values = [], []
+    try:
+        fallback = forecast_pv_per_kwp(times)
+    except Exception as e:
+        print(f"PV model unavailable, using heuristic PV: {e}")
+        fallback = heuristic_pv(times, 1.0)
+    return irradiance_pv(times, sample_times, sample_values, 1.0, PV_PERFORMANCE_RATIO, fallback)
+
+
+def load_pv(times, peak_kw=PV_PEAK_KW):
+    return load_pv_per_kwp(times) * peak_kw